@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APIClient, APIRequestFactory
 
 from commcare_connect.opportunity.models import OpportunityClaimLimit
@@ -18,6 +19,7 @@ from commcare_connect.users.tests.factories import (
     ProgramManagerOrgWithUsersFactory,
     UserFactory,
 )
+from config import celery_app
 
 
 @pytest.fixture(autouse=True)
@@ -25,6 +27,20 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def celery_eager():
+    """Run celery tasks, including groups and chords, synchronously in the test."""
+    always_eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = always_eager
+
+
 @pytest.fixture()
 def api_rf() -> APIRequestFactory:
     """APIRequestFactory instance"""
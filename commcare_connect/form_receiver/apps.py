@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FormReceiverAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "commcare_connect.form_receiver"
+
+    def ready(self):
+        import commcare_connect.form_receiver.signals  # noqa: F401
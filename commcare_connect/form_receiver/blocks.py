@@ -0,0 +1,26 @@
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+
+CONNECT_BLOCK_NAMES = ("module", "assessment", "deliver")
+
+
+def get_connect_blocks(form: dict) -> dict[str, list[dict]]:
+    """Find all the Connect blocks (learn modules, assessments and deliver units) in a form
+    with a single traversal of the form data.
+
+    Blocks of each type are returned in document order, the same order as a ``$..<name>``
+    JSONPath query would return them in."""
+    blocks = {name: [] for name in CONNECT_BLOCK_NAMES}
+    stack = [form]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for name in CONNECT_BLOCK_NAMES:
+                block = node.get(name)
+                if isinstance(block, dict) and block.get("@xmlns") == CCC_LEARN_XMLNS:
+                    blocks[name].append(block)
+            children = node.values()
+        else:
+            children = node
+        # reversed so that children are visited in document order
+        stack.extend(reversed([child for child in children if isinstance(child, (dict, list))]))
+    return blocks
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from commcare_connect.form_receiver.replay import create_replay_forms, replay_forms
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic forms for a new opportunity and replay them through the form processor, "
+        "reporting throughput, latency and queries per form. All generated data is rolled back when done "
+        "unless --keep is used, in which case the attachment downloads of the visits are also enqueued."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of users submitting forms")
+        parser.add_argument("--forms", type=int, default=10, help="Number of deliver forms per user")
+        parser.add_argument("--deliver-units", type=int, default=2, help="Number of deliver units per form")
+        parser.add_argument("--learn-modules", type=int, default=3, help="Number of learn modules per user")
+        parser.add_argument("--attachments", type=int, default=1, help="Number of attachments per deliver form")
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Number of threads processing forms (requires --keep)"
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the generated data in the database instead of rolling it back (requires DEBUG)",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if options["keep"] and not settings.DEBUG:
+            raise CommandError("--keep writes synthetic data to the database and can only be used with DEBUG on")
+        if concurrency != 1 and not options["keep"]:
+            raise CommandError("--concurrency can only be used with --keep")
+
+        if options["keep"]:
+            result = self._replay(options)
+        else:
+            # the attachment downloads are only enqueued on commit, so they are skipped too
+            with transaction.atomic():
+                result = self._replay(options)
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"Forms:              {result.forms} ({result.errors} processing errors)")
+        self.stdout.write(f"Concurrency:        {concurrency}")
+        self.stdout.write(f"Throughput:         {result.forms_per_second:.1f} forms/sec")
+        self.stdout.write(f"Latency p50:        {result.p50 * 1000:.1f} ms")
+        self.stdout.write(f"Latency p99:        {result.p99 * 1000:.1f} ms")
+        self.stdout.write(f"Queries per form:   {result.queries_per_form:.1f}")
+
+    def _replay(self, options):
+        form_jsons = create_replay_forms(
+            users=options["users"],
+            deliver_forms_per_user=options["forms"],
+            deliver_units_per_form=options["deliver_units"],
+            learn_modules=options["learn_modules"],
+            attachments_per_form=options["attachments"],
+        )
+        return replay_forms(form_jsons, options["concurrency"])
@@ -0,0 +1,105 @@
+"""Per-stage timings for form processing.
+
+``record_form_processing`` collects the duration and number of database queries of each
+``stage`` run while a form is processed and exports them as histograms, tagged with the stage
+and the opportunity the form was processed for. A stage that runs more than once for a form
+is exported as a single sample with the total of its runs::
+
+    with record_form_processing():
+        with stage("user_lookup"):
+            user = get_user(xform)
+        set_opportunity(opportunity)
+
+Stages run outside of ``record_form_processing`` are not recorded.
+"""
+import dataclasses
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+
+from commcare_connect.utils import metrics
+
+DURATION_METRIC = "form_receiver.stage.duration"
+QUERIES_METRIC = "form_receiver.stage.queries"
+TOTAL_STAGE = "total"
+
+
+@dataclasses.dataclass
+class StageTiming:
+    name: str
+    duration: float
+    queries: int
+
+
+@dataclasses.dataclass
+class FormProcessingTimer:
+    stages: list[StageTiming] = dataclasses.field(default_factory=list)
+    opportunity_id: int | None = None
+
+    def totals(self) -> list[StageTiming]:
+        """The timings of each stage, summed over all the times the stage was run for the form."""
+        totals = {}
+        for timing in self.stages:
+            total = totals.setdefault(timing.name, StageTiming(timing.name, 0, 0))
+            total.duration += timing.duration
+            total.queries += timing.queries
+        return list(totals.values())
+
+    def emit(self):
+        for timing in self.totals():
+            tags = {"stage": timing.name, "opportunity": self.opportunity_id or "none"}
+            metrics.histogram(DURATION_METRIC, round(timing.duration * 1000, 3), tags)
+            metrics.histogram(QUERIES_METRIC, timing.queries, tags)
+
+
+_current_timer: ContextVar[FormProcessingTimer | None] = ContextVar("form_processing_timer", default=None)
+
+
+@contextmanager
+def record_form_processing():
+    """Record the stages of processing a single form and export them when it completes."""
+    timer = FormProcessingTimer()
+    token = _current_timer.set(timer)
+    try:
+        with _measure(timer, TOTAL_STAGE):
+            yield timer
+    finally:
+        _current_timer.reset(token)
+        timer.emit()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of processing the current form."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with _measure(timer, name):
+        yield
+
+
+def set_opportunity(opportunity):
+    """Tag the metrics of the current form with the opportunity it is processed for."""
+    timer = _current_timer.get()
+    if timer is not None and timer.opportunity_id is None:
+        timer.opportunity_id = opportunity.id
+
+
+@contextmanager
+def _measure(timer: FormProcessingTimer, name: str):
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield
+    finally:
+        timer.stages.append(StageTiming(name, time.perf_counter() - start, queries))
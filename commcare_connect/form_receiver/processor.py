@@ -1,13 +1,17 @@
+import dataclasses
 import datetime
+from collections import ChainMap
+from functools import reduce
+from operator import or_
 
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Q
 from django.utils.timezone import now
-from geopy.distance import distance
-from jsonpath_ng import JSONPathError
-from jsonpath_ng.ext import parse
 
-from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+from commcare_connect.cache import quickcache
 from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.metrics import record_form_processing, set_opportunity, stage
+from commcare_connect.form_receiver.ruleset import get_verification_ruleset
 from commcare_connect.form_receiver.serializers import XForm
 from commcare_connect.opportunity.models import (
     Assessment,
@@ -16,136 +20,401 @@ from commcare_connect.opportunity.models import (
     CompletedWork,
     CompletedWorkStatus,
     DeliverUnit,
-    DeliverUnitFlagRules,
-    FormJsonValidationRules,
     LearnModule,
     Opportunity,
     OpportunityAccess,
     OpportunityClaim,
     OpportunityClaimLimit,
-    OpportunityVerificationFlags,
     UserVisit,
     VisitReviewStatus,
     VisitValidationStatus,
+    filter_nearby_visits,
+    get_visit_counts,
 )
 from commcare_connect.opportunity.tasks import download_user_visit_attachments
-from commcare_connect.users.models import User
-
-LEARN_MODULE_JSONPATH = parse("$..module")
-ASSESSMENT_JSONPATH = parse("$..assessment")
-DELIVER_UNIT_JSONPATH = parse("$..deliver")
+from commcare_connect.users.models import ConnectIDUserLink, User
+from commcare_connect.utils.geo import parse_location, points_within_radius
 
 
 def process_xform(xform: XForm):
     """Process a form received from CommCare HQ."""
-    app = get_app(xform.domain, xform.app_id)
-    user = get_user(xform)
+    with record_form_processing():
+        with stage("app_lookup"):
+            app = get_app(xform.domain, xform.app_id)
+        with stage("user_lookup"):
+            user = get_user(xform)
+
+        with stage("opportunity_lookup"):
+            opportunity = get_opportunity(deliver_app=app)
+        if opportunity:
+            set_opportunity(opportunity)
+            process_deliver_form(user, xform, app, opportunity)
+
+        with stage("opportunity_lookup"):
+            opportunity = get_opportunity(learn_app=app)
+        if opportunity:
+            set_opportunity(opportunity)
+            process_learn_form(user, xform, app, opportunity)
+
+
+def process_xforms(xforms: list[XForm]) -> dict[str, ProcessingError]:
+    """Process a batch of forms received from CommCare HQ.
+
+    Apps, users, opportunities and accesses are resolved once for the whole batch and learn
+    records are persisted with ``bulk_create``. Deliver units are still processed one form at a
+    time since the visit limits and duplicate checks depend on the visits that came before them.
+
+    Each form is processed in its own savepoint so that a form that can't be processed does not
+    prevent the rest of the batch from being saved.
+
+    :returns: A mapping of form ID to the error raised while processing that form."""
+    lookups = BatchLookups.for_xforms(xforms)
+    completed_module_keys = set(
+        CompletedModule.objects.filter(opportunity_access__in=lookups.accesses.values()).values_list(
+            "opportunity_access_id", "module_id"
+        )
+    )
+    assessment_keys = set(
+        Assessment.objects.filter(xform_id__in=[xform.id for xform in xforms]).values_list(
+            "opportunity_access_id", "app_id", "xform_id"
+        )
+    )
+    completed_modules = []
+    assessments = []
+    errors = {}
+    for xform in xforms:
+        # learn modules created for the form are only shared with the rest of the batch once its
+        # savepoint is committed, since they are rolled back with it
+        learn_modules = ChainMap({}, lookups.learn_modules)
+        try:
+            with record_form_processing(), transaction.atomic():
+                form_modules, form_assessments = _process_batch_xform(
+                    xform, lookups, completed_module_keys, assessment_keys, learn_modules
+                )
+        except ProcessingError as e:
+            errors[xform.id] = e
+            continue
+
+        lookups.learn_modules.update(learn_modules.maps[0])
+        completed_modules.extend(form_modules)
+        completed_module_keys.update((module.opportunity_access_id, module.module_id) for module in form_modules)
+        assessments.extend(form_assessments)
+        assessment_keys.update(
+            (assessment.opportunity_access_id, assessment.app_id, assessment.xform_id)
+            for assessment in form_assessments
+        )
 
-    opportunity = get_opportunity(deliver_app=app)
-    if opportunity:
-        process_deliver_form(user, xform, app, opportunity)
+    CompletedModule.objects.bulk_create(completed_modules)
+    Assessment.objects.bulk_create(assessments)
+    return errors
 
-    opportunity = get_opportunity(learn_app=app)
+
+def _process_batch_xform(
+    xform: XForm,
+    lookups: "BatchLookups",
+    completed_module_keys: set,
+    assessment_keys: set,
+    learn_modules: ChainMap[tuple[int, str], LearnModule],
+) -> tuple[list[CompletedModule], list[Assessment]]:
+    app = lookups.get_app(xform.domain, xform.app_id)
+    user = lookups.get_user(xform)
+
+    opportunity = lookups.get_opportunity(deliver_app=app)
     if opportunity:
-        process_learn_form(user, xform, app, opportunity)
+        set_opportunity(opportunity)
+        deliver_blocks = xform.connect_blocks["deliver"]
+        if deliver_blocks:
+            access = lookups.get_access(user, opportunity)
+            for deliver_unit_block in deliver_blocks:
+                process_deliver_unit(user, xform, app, opportunity, deliver_unit_block, access=access)
+
+    completed_modules = []
+    assessments = []
+    opportunity = lookups.get_opportunity(learn_app=app)
+    if opportunity:
+        set_opportunity(opportunity)
+        module_blocks = xform.connect_blocks["module"]
+        assessment_blocks = xform.connect_blocks["assessment"]
+        if not (module_blocks or assessment_blocks):
+            return completed_modules, assessments
+        access = lookups.get_access(user, opportunity)
+        if module_blocks:
+            modules = get_or_create_learn_modules(app, module_blocks, learn_modules)
+            completed_module_ids = {
+                module_id for access_id, module_id in completed_module_keys if access_id == access.id
+            }
+            completed_modules = build_completed_modules(
+                user, xform, opportunity, access, module_blocks, modules, completed_module_ids
+            )
+
+        assessment = build_assessment(
+            user,
+            xform,
+            app,
+            opportunity,
+            access,
+            assessment_blocks,
+            exists=(access.id, app.id, xform.id) in assessment_keys,
+        )
+        if assessment:
+            assessments.append(assessment)
+    return completed_modules, assessments
+
+
+@dataclasses.dataclass
+class BatchLookups:
+    """Apps, users, opportunities and accesses for a batch of forms, each loaded with a single query."""
+
+    apps: dict[tuple[str, str], CommCareApp]
+    users: dict[str, User]
+    opportunities: list[Opportunity]
+    accesses: dict[tuple[int, int], OpportunityAccess]
+    learn_modules: dict[tuple[int, str], LearnModule]
+
+    @classmethod
+    def for_xforms(cls, xforms: list[XForm]):
+        app_keys = {(xform.domain, xform.app_id) for xform in xforms}
+        apps = {}
+        if app_keys:
+            app_filter = reduce(or_, [Q(cc_domain=domain, cc_app_id=app_id) for domain, app_id in app_keys])
+            apps = {(app.cc_domain, app.cc_app_id): app for app in CommCareApp.objects.filter(app_filter)}
+
+        users = {}
+        user_links = ConnectIDUserLink.objects.filter(
+            commcare_username__in={_get_commcare_username(xform) for xform in xforms}
+        ).select_related("user")
+        for link in user_links:
+            users.setdefault(link.commcare_username, link.user)
+
+        opportunities = list(
+            Opportunity.objects.filter(active=True, end_date__gte=now().date()).filter(
+                Q(learn_app__in=apps.values()) | Q(deliver_app__in=apps.values())
+            )
+        )
+        accesses = {
+            (access.user_id, access.opportunity_id): access
+            for access in OpportunityAccess.objects.filter(user__in=users.values(), opportunity__in=opportunities)
+        }
+        learn_modules = {
+            (module.app_id, module.slug): module
+            for module in LearnModule.objects.filter(
+                app__in=[opp.learn_app_id for opp in opportunities],
+                slug__in={block["@id"] for xform in xforms for block in xform.connect_blocks["module"]},
+            )
+        }
+        return cls(apps=apps, users=users, opportunities=opportunities, accesses=accesses, learn_modules=learn_modules)
+
+    def get_app(self, domain, app_id):
+        app = self.apps.get((domain, app_id))
+        if not app:
+            raise ProcessingError(f"CommCare app {app_id} not found.")
+        return app
+
+    def get_user(self, xform: XForm):
+        cc_username = _get_commcare_username(xform)
+        user = self.users.get(cc_username)
+        if not user:
+            raise ProcessingError(f"Commcare User {cc_username} not found")
+        return user
+
+    def get_opportunity(self, *, learn_app=None, deliver_app=None):
+        if learn_app:
+            opportunities = [opp for opp in self.opportunities if opp.learn_app_id == learn_app.id]
+        else:
+            opportunities = [opp for opp in self.opportunities if opp.deliver_app_id == deliver_app.id]
+        if len(opportunities) > 1:
+            app = learn_app or deliver_app
+            raise ProcessingError(f"Multiple active opportunities found for CommCare app {app.cc_app_id}.")
+        return opportunities[0] if opportunities else None
+
+    def get_access(self, user: User, opportunity: Opportunity):
+        access = self.accesses.get((user.id, opportunity.id))
+        if not access:
+            raise ProcessingError(f"User {user.username} does not have access to the opportunity")
+        return access
 
 
 def process_learn_form(user, xform: XForm, app: CommCareApp, opportunity: Opportunity):
     processors = [
-        (LEARN_MODULE_JSONPATH, process_learn_modules),
-        (ASSESSMENT_JSONPATH, process_assessments),
+        ("module", process_learn_modules),
+        ("assessment", process_assessments),
     ]
-    for jsonpath, processor in processors:
-        try:
-            matches = [match.value for match in jsonpath.find(xform.form) if match.value["@xmlns"] == CCC_LEARN_XMLNS]
-            if matches:
-                processor(user, xform, app, opportunity, matches)
-        except JSONPathError as e:
-            raise ProcessingError from e
-
-
-def get_or_create_learn_module(app, module_data):
-    module, _ = LearnModule.objects.get_or_create(
-        app=app,
-        slug=module_data["@id"],
-        defaults=dict(
-            name=module_data["name"],
-            description=module_data["description"],
-            time_estimate=module_data["time_estimate"],
-        ),
-    )
-    return module
-
-
-def process_learn_modules(user: User, xform: XForm, app: CommCareApp, opportunity: Opportunity, blocks: list[dict]):
+    access = None
+    for block_name, processor in processors:
+        matches = xform.connect_blocks[block_name]
+        if matches:
+            if access is None:
+                access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
+            with stage(f"learn_{block_name}"):
+                processor(user, xform, app, opportunity, matches, access=access)
+
+
+def get_or_create_learn_modules(
+    app: CommCareApp, blocks: list[dict], loaded_modules: dict[tuple[int, str], LearnModule] = None
+) -> dict[str, LearnModule]:
+    """Get the app's learn modules for the module blocks of a form, keyed by slug, creating any
+    that don't exist yet.
+
+    :param loaded_modules: Modules that have already been loaded, keyed by ``(app_id, slug)``.
+        Modules that are loaded or created are added to it."""
+    loaded_modules = {} if loaded_modules is None else loaded_modules
+    slugs = {block["@id"] for block in blocks}
+    missing = {slug for slug in slugs if (app.id, slug) not in loaded_modules}
+    if missing:
+        for module in LearnModule.objects.filter(app=app, slug__in=missing):
+            loaded_modules.setdefault((app.id, module.slug), module)
+    new_modules = {}
+    for block in blocks:
+        slug = block["@id"]
+        if (app.id, slug) not in loaded_modules and slug not in new_modules:
+            new_modules[slug] = LearnModule(
+                app=app,
+                slug=slug,
+                name=block["name"],
+                description=block["description"],
+                time_estimate=block["time_estimate"],
+            )
+    if new_modules:
+        LearnModule.objects.bulk_create(new_modules.values(), ignore_conflicts=True)
+        # modules created concurrently by another form are skipped, so load the modules for their ids
+        for module in LearnModule.objects.filter(app=app, slug__in=new_modules):
+            loaded_modules[(app.id, module.slug)] = module
+    return {slug: loaded_modules[(app.id, slug)] for slug in slugs}
+
+
+def process_learn_modules(
+    user: User,
+    xform: XForm,
+    app: CommCareApp,
+    opportunity: Opportunity,
+    blocks: list[dict],
+    access: OpportunityAccess = None,
+):
     """Process learn modules from a form received from CommCare HQ.
 
     :param user: The user who submitted the form.
     :param xform: The deserialized form object.
     :param app: The CommCare app the form belongs to.
     :param opportunity: The opportunity the app belongs to.
-    :param blocks: A list of learn module form blocks."""
-    access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
-    for module_data in blocks:
-        module = get_or_create_learn_module(app, module_data)
-        completed_module, created = CompletedModule.objects.get_or_create(
-            user=user,
-            module=module,
-            opportunity=opportunity,
-            opportunity_access=access,
-            defaults={
-                "xform_id": xform.id,
-                "date": xform.received_on,
-                "duration": xform.metadata.duration,
-                "app_build_id": xform.build_id,
-                "app_build_version": xform.metadata.app_build_version,
-            },
-        )
-
-        if not created:
+    :param blocks: A list of learn module form blocks.
+    :param access: The user's access to the opportunity, if it has already been loaded."""
+    if access is None:
+        access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
+    modules = get_or_create_learn_modules(app, blocks)
+    completed_module_ids = set(
+        CompletedModule.objects.filter(
+            user=user, opportunity=opportunity, opportunity_access=access, module__in=modules.values()
+        ).values_list("module_id", flat=True)
+    )
+    completed_modules = build_completed_modules(
+        user, xform, opportunity, access, blocks, modules, completed_module_ids
+    )
+    CompletedModule.objects.bulk_create(completed_modules)
+
+
+def build_completed_modules(
+    user: User,
+    xform: XForm,
+    opportunity: Opportunity,
+    access: OpportunityAccess,
+    blocks: list[dict],
+    modules: dict[str, LearnModule],
+    completed_module_ids: set[int],
+) -> list[CompletedModule]:
+    """Build the completed modules for the module blocks of a form.
+
+    :param modules: The learn modules for the blocks, see ``get_or_create_learn_modules``.
+    :param completed_module_ids: IDs of the modules the user has already completed.
+    :raises ProcessingError: if any of the modules has already been completed."""
+    completed_modules = []
+    completed_module_ids = set(completed_module_ids)
+    for block in blocks:
+        module = modules[block["@id"]]
+        if module.id in completed_module_ids:
             raise ProcessingError("Learn Module is already completed")
+        completed_module_ids.add(module.id)
+        completed_modules.append(
+            CompletedModule(
+                user=user,
+                module=module,
+                opportunity=opportunity,
+                opportunity_access=access,
+                xform_id=xform.id,
+                date=xform.received_on,
+                duration=xform.metadata.duration,
+                app_build_id=xform.build_id,
+                app_build_version=xform.metadata.app_build_version,
+            )
+        )
+    return completed_modules
 
 
-def process_assessments(user, xform: XForm, app: CommCareApp, opportunity: Opportunity, blocks: list[dict]):
+def process_assessments(
+    user,
+    xform: XForm,
+    app: CommCareApp,
+    opportunity: Opportunity,
+    blocks: list[dict],
+    access: OpportunityAccess = None,
+):
     """Process assessments from a form received from CommCare HQ.
 
     :param user: The user who submitted the form.
     :param xform: The deserialized form object.
     :param app: The CommCare app the form belongs to.
     :param opportunity: The opportunity the app belongs to.
-    :param blocks: A list of assessment form blocks."""
+    :param blocks: A list of assessment form blocks.
+    :param access: The user's access to the opportunity, if it has already been loaded."""
+    if access is None:
+        access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
+    exists = Assessment.objects.filter(
+        user=user, app=app, opportunity=opportunity, opportunity_access=access, xform_id=xform.id
+    ).exists()
+    assessment = build_assessment(user, xform, app, opportunity, access, blocks, exists)
+    if assessment:
+        assessment.save()
+
+
+def build_assessment(
+    user: User,
+    xform: XForm,
+    app: CommCareApp,
+    opportunity: Opportunity,
+    access: OpportunityAccess,
+    blocks: list[dict],
+    exists: bool,
+) -> Assessment | None:
+    """Build the assessment for the assessment blocks of a form. Only one assessment is recorded per
+    form, so this returns ``None`` if there are no blocks or if the form's assessment already exists.
+
+    :raises ProcessingError: if any of the scores is not an integer."""
+    scores = []
     for assessment_data in blocks:
         try:
-            score = int(assessment_data["user_score"])
+            scores.append(int(assessment_data["user_score"]))
         except ValueError:
             raise ProcessingError("User score must be an integer")
-        # TODO: should this move to the opportunity to allow better re-use of the app?
-        passing_score = app.passing_score
-        access = OpportunityAccess.objects.get(user=user, opportunity=opportunity)
-        assessment, created = Assessment.objects.get_or_create(
-            user=user,
-            app=app,
-            opportunity=opportunity,
-            opportunity_access=access,
-            xform_id=xform.id,
-            defaults={
-                "date": xform.received_on,
-                "score": score,
-                "passing_score": passing_score,
-                "passed": score >= passing_score,
-                "app_build_id": xform.build_id,
-                "app_build_version": xform.metadata.app_build_version,
-            },
-        )
-
-        if not created:
-            return ProcessingError("Learn Assessment is already completed")
+    if not scores or exists:
+        return None
+    # TODO: should this move to the opportunity to allow better re-use of the app?
+    passing_score = app.passing_score
+    return Assessment(
+        user=user,
+        app=app,
+        opportunity=opportunity,
+        opportunity_access=access,
+        xform_id=xform.id,
+        date=xform.received_on,
+        score=scores[0],
+        passing_score=passing_score,
+        passed=scores[0] >= passing_score,
+        app_build_id=xform.build_id,
+        app_build_version=xform.metadata.app_build_version,
+    )
 
 
 def process_deliver_form(user, xform: XForm, app: CommCareApp, opportunity: Opportunity):
-    matches = [
-        match.value for match in DELIVER_UNIT_JSONPATH.find(xform.form) if match.value["@xmlns"] == CCC_LEARN_XMLNS
-    ]
+    matches = xform.connect_blocks["deliver"]
     if matches:
         for deliver_unit_block in matches:
             process_deliver_unit(user, xform, app, opportunity, deliver_unit_block)
@@ -153,95 +422,51 @@ def process_deliver_form(user, xform: XForm, app: CommCareApp, opportunity: Oppo
 
 def clean_form_submission(access: OpportunityAccess, user_visit: UserVisit, xform: XForm) -> list[list[str]]:
     flags = []
-    opportunity_flags, _ = OpportunityVerificationFlags.objects.get_or_create(opportunity=user_visit.opportunity)
-    if opportunity_flags.duplicate:
+    ruleset = get_verification_ruleset(user_visit.opportunity_id, user_visit.deliver_unit_id)
+    if ruleset.duplicate:
         if user_visit.status == VisitValidationStatus.duplicate:
             flags.append(["duplicate", "A beneficiary with the same identifier already exists"])
     else:
         user_visit.status = VisitValidationStatus.pending
-    if opportunity_flags.gps and user_visit.location is None:
+    if ruleset.gps and user_visit.location is None:
         flags.append(["gps", "GPS data is missing"])
-    if opportunity_flags.location > 0 and user_visit.location:
-        user_visits = (
-            UserVisit.objects.filter(opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit)
-            .exclude(Q(status=VisitValidationStatus.trial) | Q(entity_id=user_visit.entity_id))
-            .values("location")
-        )
-        cur_lat, cur_lon, *_ = user_visit.location.split(" ")
-        for visit in user_visits:
-            if visit.get("location") is None:
-                continue
-            lat, lon, *_ = visit["location"].split(" ")
-            dist = distance((lat, lon), (cur_lat, cur_lon))
-            if dist.m <= opportunity_flags.location:
-                flags.append(["location", "Visit location is too close to another visit"])
-                break
-    if opportunity_flags.catchment_areas:
-        areas = access.catchmentarea_set.filter(active=True)
+    location = parse_location(user_visit.location)
+    if ruleset.location > 0 and location:
+        user_visits = UserVisit.objects.filter(
+            opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit
+        ).exclude(Q(status=VisitValidationStatus.trial) | Q(entity_id=user_visit.entity_id))
+        user_visits = filter_nearby_visits(user_visits, location.latitude, location.longitude, ruleset.location)
+        points = list(user_visits.values_list("latitude", "longitude"))
+        lats, lons = zip(*points) if points else ((), ())
+        if len(points_within_radius(location.latitude, location.longitude, lats, lons, ruleset.location)):
+            flags.append(["location", "Visit location is too close to another visit"])
+    if ruleset.catchment_areas and location:
+        areas = list(access.catchmentarea_set.filter(active=True).values_list("latitude", "longitude", "radius"))
         if areas:
-            cur_lat, cur_lon, *_ = xform.metadata.location.split(" ")
-            within_catchment = False
-            for area in areas:
-                dist = distance((area.latitude, area.longitude), (cur_lat, cur_lon))
-                if dist.meters < area.radius:
-                    within_catchment = True
-                    break
-            if not within_catchment:
+            lats, lons, radii = zip(*areas)
+            if not len(points_within_radius(location.latitude, location.longitude, lats, lons, radii)):
                 flags.append(["catchment", "Visit outside worker catchment areas"])
-    if (
-        opportunity_flags.form_submission_start
-        and opportunity_flags.form_submission_start > xform.metadata.timeStart.time()
-    ):
-        flags.append(["form_submission_period", "Form was submitted before the start time"])
-    if (
-        opportunity_flags.form_submission_end
-        and opportunity_flags.form_submission_end < xform.metadata.timeStart.time()
-    ):
-        flags.append(["form_submission_period", "Form was submitted after the end time"])
-
-    deliver_unit_flags = DeliverUnitFlagRules.objects.filter(
-        opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit
-    ).first()
-    if deliver_unit_flags is not None:
-        if deliver_unit_flags.check_attachments:
-            attachments = user_visit.form_json.get("attachments", {})
-            attachments.pop("form.xml", None)
-            if len(attachments) == 0:
-                flags.append(["attachment_missing", "Form was submitted without attachements."])
-
-        if deliver_unit_flags.duration > 0 and xform.metadata.duration < datetime.timedelta(
-            minutes=deliver_unit_flags.duration
-        ):
-            flags.append(["duration", "The form was completed too quickly."])
-
-    form_json_rules = FormJsonValidationRules.objects.filter(
-        opportunity=user_visit.opportunity, deliver_unit=user_visit.deliver_unit
-    )
-    for form_json_rule in form_json_rules:
-        json_path = parse(f"$.{form_json_rule.question_path}")
-        matches = [
-            match.value
-            for match in json_path.find(user_visit.form_json)
-            if match.value == form_json_rule.question_value
-        ]
-        if not matches:
-            flags.append(["form_value_not_found", f"Form does not satisfy {form_json_rule.name} validation rule."])
+    flags.extend(ruleset.check_form(user_visit.form_json, xform))
     return flags
 
 
-def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Opportunity, deliver_unit_block: dict):
-    deliver_unit = get_or_create_deliver_unit(app, deliver_unit_block)
-    access = OpportunityAccess.objects.get(opportunity=opportunity, user=user)
-    counts = (
-        UserVisit.objects.filter(opportunity_access=access, deliver_unit=deliver_unit)
-        .exclude(status__in=[VisitValidationStatus.over_limit, VisitValidationStatus.trial])
-        .aggregate(
-            daily=Count("pk", filter=Q(visit_date__date=xform.metadata.timeStart)),
-            total=Count("*"),
-            entity=Count("pk", filter=Q(entity_id=deliver_unit_block.get("entity_id"), deliver_unit=deliver_unit)),
+def process_deliver_unit(
+    user,
+    xform: XForm,
+    app: CommCareApp,
+    opportunity: Opportunity,
+    deliver_unit_block: dict,
+    access: OpportunityAccess = None,
+):
+    with stage("deliver_unit_lookup"):
+        deliver_unit = get_or_create_deliver_unit(app, deliver_unit_block)
+        if access is None:
+            access = OpportunityAccess.objects.get(opportunity=opportunity, user=user)
+    with stage("limit_counts"):
+        counts = get_visit_counts(
+            access.id, deliver_unit.id, xform.metadata.timeStart, deliver_unit_block.get("entity_id")
         )
-    )
-    claim = OpportunityClaim.objects.get(opportunity_access=access)
+        claim = OpportunityClaim.objects.get(opportunity_access=access)
     entity_id = deliver_unit_block.get("entity_id")
     entity_name = deliver_unit_block.get("entity_name")
     user_visit = UserVisit(
@@ -263,18 +488,20 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
         completed_work = None
         user_visit.status = VisitValidationStatus.trial
     else:
-        completed_work, _ = CompletedWork.objects.get_or_create(
-            opportunity_access=access,
-            entity_id=entity_id,
-            payment_unit=deliver_unit.payment_unit,
-            defaults={
-                "entity_name": entity_name,
-            },
-        )
-        user_visit.completed_work = completed_work
-        claim_limit = OpportunityClaimLimit.objects.get(
-            opportunity_claim=claim, payment_unit=completed_work.payment_unit
-        )
+        with stage("completed_work_lookup"):
+            completed_work, _ = CompletedWork.objects.get_or_create(
+                opportunity_access=access,
+                entity_id=entity_id,
+                payment_unit=deliver_unit.payment_unit,
+                defaults={
+                    "entity_name": entity_name,
+                },
+            )
+            user_visit.completed_work = completed_work
+        with stage("limit_counts"):
+            claim_limit = OpportunityClaimLimit.objects.get(
+                opportunity_claim=claim, payment_unit=completed_work.payment_unit
+            )
         if (
             counts["daily"] >= deliver_unit.payment_unit.max_daily
             or counts["total"] >= claim_limit.max_visits
@@ -286,7 +513,8 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
                 completed_work_needs_save = True
         elif counts["entity"] > 0:
             user_visit.status = VisitValidationStatus.duplicate
-    flags = clean_form_submission(access, user_visit, xform)
+    with stage("verification_flags"):
+        flags = clean_form_submission(access, user_visit, xform)
     if access.suspended:
         flags.append(["user_suspended", "This user is suspended from the opportunity."])
         user_visit.status = VisitValidationStatus.rejected
@@ -301,17 +529,20 @@ def process_deliver_unit(user, xform: XForm, app: CommCareApp, opportunity: Oppo
     ):
         user_visit.status = VisitValidationStatus.approved
         user_visit.review_status = VisitReviewStatus.agree
-    user_visit.save()
-    if (
-        completed_work is not None
-        and completed_work.completed_count > 0
-        and completed_work.status == CompletedWorkStatus.incomplete
-    ):
-        completed_work.status = CompletedWorkStatus.pending
-        completed_work_needs_save = True
-    if completed_work_needs_save:
-        completed_work.save()
-    download_user_visit_attachments.delay(user_visit.id)
+    with stage("visit_save"):
+        user_visit.save()
+    with stage("completed_work_update"):
+        if (
+            completed_work is not None
+            and completed_work.completed_count > 0
+            and completed_work.status == CompletedWorkStatus.incomplete
+        ):
+            completed_work.status = CompletedWorkStatus.pending
+            completed_work_needs_save = True
+        if completed_work_needs_save:
+            completed_work.save()
+    with stage("attachment_enqueue"):
+        transaction.on_commit(lambda: download_user_visit_attachments.delay(user_visit.id))
 
 
 def get_or_create_deliver_unit(app, unit_data):
@@ -329,36 +560,52 @@ def get_opportunity(*, learn_app=None, deliver_app=None):
     if not learn_app and not deliver_app:
         raise ValueError("One of learn_app or deliver_app must be provided")
 
-    kwargs = {}
-    if learn_app:
-        kwargs = {"learn_app": learn_app}
     if deliver_app:
-        kwargs = {"deliver_app": deliver_app}
-
-    try:
-        return Opportunity.objects.get(active=True, end_date__gte=now().date(), **kwargs)
-    except Opportunity.DoesNotExist:
-        pass
-    except Opportunity.MultipleObjectsReturned:
-        app = learn_app or deliver_app
+        app, app_type = deliver_app, "deliver"
+    else:
+        app, app_type = learn_app, "learn"
+
+    today = now().date()
+    opportunities = [
+        opp for opp in get_active_opportunities_for_app(app.id, app_type) if opp.end_date and opp.end_date >= today
+    ]
+    if len(opportunities) > 1:
         raise ProcessingError(f"Multiple active opportunities found for CommCare app {app.cc_app_id}.")
+    return opportunities[0] if opportunities else None
+
+
+@quickcache(vary_on=["app_id", "app_type"], timeout=60 * 60)
+def get_active_opportunities_for_app(app_id: int, app_type: str) -> list[Opportunity]:
+    """Active opportunities that use the app as their learn or deliver app (``app_type``).
+    The cache is cleared when an opportunity is saved or deleted (see ``form_receiver.signals``)."""
+    return list(Opportunity.objects.filter(active=True, **{f"{app_type}_app_id": app_id}))
 
 
 def get_app(domain, app_id):
-    app = CommCareApp.objects.filter(cc_domain=domain, cc_app_id=app_id).first()
+    app = get_app_by_cc_app_id(domain, app_id)
     if not app:
         raise ProcessingError(f"CommCare app {app_id} not found.")
     return app
 
 
+@quickcache(vary_on=["domain", "app_id"], timeout=60 * 60)
+def get_app_by_cc_app_id(domain, app_id) -> CommCareApp | None:
+    return CommCareApp.objects.filter(cc_domain=domain, cc_app_id=app_id).first()
+
+
 def get_user(xform: XForm):
     cc_username = _get_commcare_username(xform)
-    user = User.objects.filter(connectiduserlink__commcare_username=cc_username).first()
+    user = get_user_by_commcare_username(cc_username)
     if not user:
         raise ProcessingError(f"Commcare User {cc_username} not found")
     return user
 
 
+@quickcache(vary_on=["cc_username"], timeout=60 * 60)
+def get_user_by_commcare_username(cc_username) -> User | None:
+    return User.objects.filter(connectiduserlink__commcare_username=cc_username).first()
+
+
 def _get_commcare_username(xform: XForm):
     username = xform.metadata.username
     if "@" in username:
@@ -0,0 +1,272 @@
+import dataclasses
+import datetime
+import queue
+import random
+import threading
+import time
+from uuid import uuid4
+
+import numpy as np
+from django.db import connection, transaction
+
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.processor import process_xform
+from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.opportunity.models import (
+    CommCareApp,
+    DeliverUnit,
+    HQApiKey,
+    LearnModule,
+    Opportunity,
+    OpportunityAccess,
+    OpportunityClaim,
+    OpportunityClaimLimit,
+    OpportunityVerificationFlags,
+    PaymentUnit,
+)
+from commcare_connect.organization.models import Organization
+from commcare_connect.users.models import ConnectIDUserLink, User
+
+# visits are spread around this point so that some of them trigger the location flag
+CENTER = (-13.9626, 33.7741)
+
+
+@dataclasses.dataclass
+class ReplayResult:
+    latencies: list[float]
+    queries: list[int]
+    errors: int
+    duration: float
+
+    @property
+    def forms(self):
+        return len(self.latencies)
+
+    @property
+    def forms_per_second(self):
+        return self.forms / self.duration if self.duration else 0
+
+    @property
+    def p50(self):
+        return float(np.percentile(self.latencies, 50)) if self.latencies else 0
+
+    @property
+    def p99(self):
+        return float(np.percentile(self.latencies, 99)) if self.latencies else 0
+
+    @property
+    def queries_per_form(self):
+        return sum(self.queries) / self.forms if self.forms else 0
+
+
+def create_replay_forms(
+    users=10, deliver_forms_per_user=10, deliver_units_per_form=2, learn_modules=3, attachments_per_form=1
+) -> list[dict]:
+    """Create an opportunity with users that have claimed it, and a mix of learn module,
+    assessment and deliver forms submitted by those users.
+
+    Deliver forms contain ``deliver_units_per_form`` deliver unit blocks, GPS locations near
+    ``CENTER`` and attachment metadata. Forms are returned in submission order."""
+    suffix = uuid4().hex[:12]
+    organization = Organization.objects.create(name=f"Replay {suffix}")
+    learn_app, deliver_app = (
+        CommCareApp.objects.create(
+            organization=organization,
+            cc_domain=f"replay-{suffix}",
+            cc_app_id=uuid4().hex,
+            name=f"Replay {app_type} app",
+            description="Synthetic app for replaying forms",
+            passing_score=50,
+        )
+        for app_type in ("learn", "deliver")
+    )
+    api_user = User.objects.create(username=f"replay-api-{suffix}", email=f"replay-api-{suffix}@example.com")
+    max_total = deliver_forms_per_user * 2
+    opportunity = Opportunity.objects.create(
+        organization=organization,
+        name=f"Replay {suffix}",
+        description="Synthetic opportunity for replaying forms",
+        learn_app=learn_app,
+        deliver_app=deliver_app,
+        start_date=datetime.date.today() - datetime.timedelta(days=30),
+        end_date=datetime.date.today() + datetime.timedelta(days=30),
+        total_budget=users * max_total,
+        api_key=HQApiKey.objects.create(api_key=uuid4().hex, user=api_user),
+    )
+    OpportunityVerificationFlags.objects.create(opportunity=opportunity)
+    payment_unit = PaymentUnit.objects.create(
+        opportunity=opportunity,
+        name="Replay payment unit",
+        description="Synthetic payment unit for replaying forms",
+        amount=1,
+        max_daily=deliver_forms_per_user,
+        max_total=max_total,
+    )
+    deliver_units = [
+        DeliverUnit.objects.create(
+            app=deliver_app, slug=f"deliver-{i}", name=f"Deliver unit {i}", payment_unit=payment_unit
+        )
+        for i in range(deliver_units_per_form)
+    ]
+    modules = [
+        LearnModule.objects.create(
+            app=learn_app, slug=f"module-{i}", name=f"Module {i}", description="Synthetic module", time_estimate=1
+        )
+        for i in range(learn_modules)
+    ]
+
+    forms = []
+    for _ in range(users):
+        user = User.objects.create(username=f"replay-{uuid4().hex[:12]}", name="Replay user")
+        ConnectIDUserLink.objects.create(
+            user=user, commcare_username=f"{user.username}@{deliver_app.cc_domain}.commcarehq.org"
+        )
+        access = OpportunityAccess.objects.create(user=user, opportunity=opportunity, accepted=True)
+        claim = OpportunityClaim.objects.create(
+            opportunity_access=access, end_date=datetime.date.today() + datetime.timedelta(days=30)
+        )
+        OpportunityClaimLimit.create_claim_limits(opportunity, claim)
+
+        for module in modules:
+            forms.append(_get_form_json(learn_app, user, _get_module_block(module)))
+        forms.append(_get_form_json(learn_app, user, _get_assessment_block()))
+        for _ in range(deliver_forms_per_user):
+            form_block = {
+                f"visit_{i}": _get_deliver_unit_block(deliver_unit) for i, deliver_unit in enumerate(deliver_units)
+            }
+            forms.append(_get_form_json(deliver_app, user, form_block, attachments=attachments_per_form, gps=True))
+    return forms
+
+
+def _get_module_block(module):
+    return {
+        "module": {
+            "@xmlns": CCC_LEARN_XMLNS,
+            "@id": module.slug,
+            "name": module.name,
+            "description": module.description,
+            "time_estimate": str(module.time_estimate),
+        }
+    }
+
+
+def _get_assessment_block():
+    return {
+        "assessment": {
+            "@xmlns": CCC_LEARN_XMLNS,
+            "@id": f"assessment-{uuid4().hex[:8]}",
+            "user_score": str(random.randint(0, 100)),
+        }
+    }
+
+
+def _get_deliver_unit_block(deliver_unit):
+    return {
+        "deliver": {
+            "@xmlns": CCC_LEARN_XMLNS,
+            "@id": deliver_unit.slug,
+            "name": deliver_unit.name,
+            "entity_id": str(uuid4()),
+            "entity_name": f"Entity {random.randint(1, 1000)}",
+        }
+    }
+
+
+def _get_form_json(app, user, form_block, attachments=0, gps=False):
+    form_id = str(uuid4())
+    time_start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=random.randint(5, 600))
+    location = None
+    if gps:
+        latitude = CENTER[0] + random.uniform(-0.01, 0.01)
+        longitude = CENTER[1] + random.uniform(-0.01, 0.01)
+        location = f"{latitude} {longitude} 0 {random.randint(3, 30)}"
+    metadata = {
+        "instanceID": form_id,
+        "app_build_version": 1,
+        "username": user.username,
+        "timeStart": time_start.isoformat(),
+        "timeEnd": (time_start + datetime.timedelta(minutes=random.randint(1, 20))).isoformat(),
+        "location": location,
+    }
+    form_json = {
+        "domain": app.cc_domain,
+        "id": form_id,
+        "app_id": app.cc_app_id,
+        "build_id": uuid4().hex,
+        "received_on": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "form": {"@xmlns": f"http://openrosa.org/formdesigner/{uuid4()}", "meta": metadata, **form_block},
+        "metadata": metadata,
+        "attachments": {"form.xml": {"content_type": "text/xml", "length": 1000}},
+    }
+    for i in range(attachments):
+        form_json["attachments"][f"photo_{i}.jpg"] = {
+            "content_type": "image/jpeg",
+            "length": random.randint(50_000, 500_000),
+            "url": f"https://www.commcarehq.org/a/{app.cc_domain}/api/form/attachment/{form_id}/photo_{i}.jpg",
+        }
+    return form_json
+
+
+def replay_forms(form_jsons: list[dict], concurrency=1) -> ReplayResult:
+    """Process forms through ``process_xform``, each in its own transaction, using
+    ``concurrency`` threads. With a concurrency of 1 the forms are processed in the calling thread
+    (and so in its transaction, if any)."""
+    forms = queue.SimpleQueue()
+    for form_json in form_jsons:
+        forms.put(form_json)
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        while True:
+            try:
+                form_json = forms.get_nowait()
+            except queue.Empty:
+                return
+            latency, query_count, error = _process_form(form_json)
+            with lock:
+                latencies.append(latency)
+                queries.append(query_count)
+                errors += error
+
+    def thread_worker():
+        try:
+            worker()
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=thread_worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return ReplayResult(latencies, queries, errors, time.perf_counter() - start)
+
+
+def _process_form(form_json):
+    query_count = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    error = False
+    start = time.perf_counter()
+    with connection.execute_wrapper(count_queries):
+        serializer = XFormSerializer(data=form_json)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                process_xform(serializer.save())
+        except ProcessingError:
+            error = True
+    return time.perf_counter() - start, query_count, error
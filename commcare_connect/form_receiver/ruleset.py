@@ -0,0 +1,139 @@
+import dataclasses
+import datetime
+from functools import cached_property
+from uuid import uuid4
+
+from django.core.cache import cache
+from jsonpath_ng.ext import parse
+
+from commcare_connect.form_receiver.serializers import XForm
+from commcare_connect.opportunity.models import (
+    DeliverUnitFlagRules,
+    FormJsonValidationRules,
+    OpportunityVerificationFlags,
+)
+
+RULESET_CACHE_TIMEOUT = 24 * 60 * 60
+# rulesets cached in this process, keyed by (opportunity_id, deliver_unit_id)
+_local_rulesets: dict[tuple[int, int], tuple[str, "VerificationRuleset"]] = {}
+_MAX_LOCAL_RULESETS = 1000
+
+
+@dataclasses.dataclass(frozen=True)
+class FormJsonRule:
+    name: str
+    question_path: str
+    question_value: str
+
+    @cached_property
+    def jsonpath(self):
+        return parse(f"$.{self.question_path}")
+
+    def matches(self, form_json: dict) -> bool:
+        return any(match.value == self.question_value for match in self.jsonpath.find(form_json))
+
+
+@dataclasses.dataclass(frozen=True)
+class VerificationRuleset:
+    """The verification flag settings for an opportunity and deliver unit, combined from
+    ``OpportunityVerificationFlags``, ``DeliverUnitFlagRules`` and ``FormJsonValidationRules``."""
+
+    duplicate: bool
+    gps: bool
+    location: int
+    catchment_areas: bool
+    form_submission_start: datetime.time | None
+    form_submission_end: datetime.time | None
+    check_attachments: bool
+    duration: int
+    form_json_rules: tuple[FormJsonRule, ...]
+
+    @classmethod
+    def from_db(cls, opportunity_id: int, deliver_unit_id: int):
+        opportunity_flags, _ = OpportunityVerificationFlags.objects.get_or_create(opportunity_id=opportunity_id)
+        deliver_unit_flags = DeliverUnitFlagRules.objects.filter(
+            opportunity_id=opportunity_id, deliver_unit_id=deliver_unit_id
+        ).first()
+        form_json_rules = FormJsonValidationRules.objects.filter(
+            opportunity_id=opportunity_id, deliver_unit=deliver_unit_id
+        ).order_by("pk")
+        return cls(
+            duplicate=opportunity_flags.duplicate,
+            gps=opportunity_flags.gps,
+            location=opportunity_flags.location,
+            catchment_areas=opportunity_flags.catchment_areas,
+            form_submission_start=opportunity_flags.form_submission_start,
+            form_submission_end=opportunity_flags.form_submission_end,
+            check_attachments=deliver_unit_flags.check_attachments if deliver_unit_flags else False,
+            duration=deliver_unit_flags.duration if deliver_unit_flags else 0,
+            form_json_rules=tuple(
+                FormJsonRule(name=rule.name, question_path=rule.question_path, question_value=rule.question_value)
+                for rule in form_json_rules
+            ),
+        )
+
+    def check_form(self, form_json: dict, xform: XForm) -> list[list[str]]:
+        """Evaluate the rules that only depend on the form itself and return the flags raised."""
+        flags = []
+        if self.form_submission_start and self.form_submission_start > xform.metadata.timeStart.time():
+            flags.append(["form_submission_period", "Form was submitted before the start time"])
+        if self.form_submission_end and self.form_submission_end < xform.metadata.timeStart.time():
+            flags.append(["form_submission_period", "Form was submitted after the end time"])
+
+        if self.check_attachments:
+            attachments = [name for name in form_json.get("attachments", {}) if name != "form.xml"]
+            if len(attachments) == 0:
+                flags.append(["attachment_missing", "Form was submitted without attachements."])
+        if self.duration > 0 and xform.metadata.duration < datetime.timedelta(minutes=self.duration):
+            flags.append(["duration", "The form was completed too quickly."])
+
+        for rule in self.form_json_rules:
+            if not rule.matches(form_json):
+                flags.append(["form_value_not_found", f"Form does not satisfy {rule.name} validation rule."])
+        return flags
+
+
+def get_verification_ruleset(opportunity_id: int, deliver_unit_id: int) -> VerificationRuleset:
+    """Get the verification ruleset for an opportunity and deliver unit.
+
+    Rulesets are cached in process and in the shared cache, keyed by a per-opportunity version
+    that is changed whenever any of the opportunity's rules are edited (see
+    ``invalidate_verification_ruleset``)."""
+    version = _get_ruleset_version(opportunity_id)
+    if version is None:
+        # the shared cache is unavailable, so there is no way to know if a cached ruleset is current
+        return VerificationRuleset.from_db(opportunity_id, deliver_unit_id)
+
+    key = (opportunity_id, deliver_unit_id)
+    local = _local_rulesets.get(key)
+    if local and local[0] == version:
+        return local[1]
+
+    cache_key = f"verification-ruleset:{opportunity_id}:{deliver_unit_id}:{version}"
+    ruleset = cache.get(cache_key)
+    if ruleset is None:
+        ruleset = VerificationRuleset.from_db(opportunity_id, deliver_unit_id)
+        cache.set(cache_key, ruleset, RULESET_CACHE_TIMEOUT)
+
+    if len(_local_rulesets) >= _MAX_LOCAL_RULESETS:
+        _local_rulesets.clear()
+    _local_rulesets[key] = (version, ruleset)
+    return ruleset
+
+
+def invalidate_verification_ruleset(opportunity_id: int):
+    """Invalidate the cached rulesets for all deliver units of an opportunity."""
+    cache.set(_version_key(opportunity_id), uuid4().hex, None)
+
+
+def _get_ruleset_version(opportunity_id: int) -> str | None:
+    key = _version_key(opportunity_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _version_key(opportunity_id: int) -> str:
+    return f"verification-ruleset-version:{opportunity_id}"
@@ -1,8 +1,11 @@
 import dataclasses
 from datetime import datetime
+from functools import cached_property
 
 from rest_framework import serializers
 
+from commcare_connect.form_receiver.blocks import get_connect_blocks
+
 
 @dataclasses.dataclass
 class XFormMetadata:
@@ -32,6 +35,10 @@ class XForm:
     def xmlns(self):
         return self.form.get("@xmlns")
 
+    @cached_property
+    def connect_blocks(self) -> dict[str, list[dict]]:
+        return get_connect_blocks(self.form)
+
 
 class XFormMetadataSerializer(serializers.Serializer):
     timeStart = serializers.DateTimeField(required=True)
@@ -41,6 +48,11 @@ class XFormMetadataSerializer(serializers.Serializer):
     location = serializers.CharField(allow_null=True)
 
 
+class XFormListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return [_build_xform(attrs, raw_form) for attrs, raw_form in zip(validated_data, self.initial_data)]
+
+
 class XFormSerializer(serializers.Serializer):
     domain = serializers.CharField(required=True)
     id = serializers.CharField(required=True)
@@ -50,6 +62,13 @@ class XFormSerializer(serializers.Serializer):
     form = serializers.DictField(required=True)
     metadata = XFormMetadataSerializer(required=True)
 
+    class Meta:
+        list_serializer_class = XFormListSerializer
+
     def create(self, validated_data):
-        metadata = XFormMetadata(**validated_data.pop("metadata"))
-        return XForm(metadata=metadata, raw_form=self.initial_data, **validated_data)
+        return _build_xform(validated_data, self.initial_data)
+
+
+def _build_xform(validated_data, raw_form):
+    metadata = XFormMetadata(**validated_data.pop("metadata"))
+    return XForm(metadata=metadata, raw_form=raw_form, **validated_data)
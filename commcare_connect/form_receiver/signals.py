@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from commcare_connect.form_receiver.processor import (
+    get_active_opportunities_for_app,
+    get_app_by_cc_app_id,
+    get_user_by_commcare_username,
+)
+from commcare_connect.form_receiver.ruleset import invalidate_verification_ruleset
+from commcare_connect.opportunity.models import (
+    CommCareApp,
+    DeliverUnitFlagRules,
+    FormJsonValidationRules,
+    Opportunity,
+    OpportunityVerificationFlags,
+)
+from commcare_connect.program.models import ManagedOpportunity
+from commcare_connect.users.models import ConnectIDUserLink
+
+
+@receiver(post_save, sender=OpportunityVerificationFlags)
+@receiver(post_delete, sender=OpportunityVerificationFlags)
+@receiver(post_save, sender=DeliverUnitFlagRules)
+@receiver(post_delete, sender=DeliverUnitFlagRules)
+@receiver(post_save, sender=FormJsonValidationRules)
+@receiver(post_delete, sender=FormJsonValidationRules)
+def invalidate_ruleset_on_change(sender, instance, **kwargs):
+    _now_and_on_commit(invalidate_verification_ruleset, instance.opportunity_id)
+
+
+@receiver(m2m_changed, sender=FormJsonValidationRules.deliver_unit.through)
+def invalidate_ruleset_on_deliver_units_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        _now_and_on_commit(invalidate_verification_ruleset, instance.opportunity_id)
+    elif pk_set:
+        for opportunity_id in set(
+            FormJsonValidationRules.objects.filter(pk__in=pk_set).values_list("opportunity_id", flat=True)
+        ):
+            _now_and_on_commit(invalidate_verification_ruleset, opportunity_id)
+
+
+@receiver(post_save, sender=CommCareApp)
+@receiver(post_delete, sender=CommCareApp)
+def clear_app_cache(sender, instance, **kwargs):
+    _now_and_on_commit(get_app_by_cc_app_id.clear, instance.cc_domain, instance.cc_app_id)
+
+
+@receiver(post_save, sender=ConnectIDUserLink)
+@receiver(post_delete, sender=ConnectIDUserLink)
+def clear_user_cache(sender, instance, **kwargs):
+    _now_and_on_commit(get_user_by_commcare_username.clear, instance.commcare_username)
+
+
+@receiver(pre_save, sender=Opportunity)
+@receiver(pre_save, sender=ManagedOpportunity)
+def clear_previous_opportunity_apps_cache(sender, instance, **kwargs):
+    if instance.pk:
+        # clear the cache of the apps the opportunity used before this save in case they have changed
+        previous = Opportunity.objects.filter(pk=instance.pk).values("learn_app_id", "deliver_app_id").first()
+        if previous:
+            _clear_opportunity_cache(previous["learn_app_id"], previous["deliver_app_id"])
+
+
+@receiver(post_save, sender=Opportunity)
+@receiver(post_delete, sender=Opportunity)
+@receiver(post_save, sender=ManagedOpportunity)
+@receiver(post_delete, sender=ManagedOpportunity)
+def clear_opportunity_cache(sender, instance, **kwargs):
+    _clear_opportunity_cache(instance.learn_app_id, instance.deliver_app_id)
+
+
+def _clear_opportunity_cache(learn_app_id, deliver_app_id):
+    _now_and_on_commit(get_active_opportunities_for_app.clear, learn_app_id, "learn")
+    _now_and_on_commit(get_active_opportunities_for_app.clear, deliver_app_id, "deliver")
+
+
+def _now_and_on_commit(func, *args):
+    """Call func now and again once the transaction is committed so that anything cached
+    from the old state in the meantime is not reused."""
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
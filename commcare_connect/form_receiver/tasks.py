@@ -0,0 +1,69 @@
+import logging
+
+from django.db import connection, transaction
+
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.processor import process_xform, process_xforms
+from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.opportunity.models import Assessment, CompletedModule, UserVisit
+from config import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(acks_late=True)
+def process_xform_task(form_json: dict):
+    """Process a form that was queued by the receiver endpoint.
+
+    The task is idempotent on the form ID so that redelivered messages (e.g. after a
+    worker crash) do not create duplicate records."""
+    serializer = XFormSerializer(data=form_json)
+    serializer.is_valid(raise_exception=True)
+    xform = serializer.save()
+
+    with transaction.atomic():
+        _lock_xforms([xform.id])
+        if get_processed_xform_ids([xform.id]):
+            logger.info("Skipping form %s, already processed", xform.id)
+            return
+
+        try:
+            with transaction.atomic():
+                process_xform(xform)
+        except ProcessingError as e:
+            logger.warning("Unable to process form %s: %s", xform.id, e.detail)
+
+
+@celery_app.task(acks_late=True)
+def process_xform_batch_task(form_jsons: list[dict]):
+    """Process a batch of forms that was queued by the batch receiver endpoint.
+
+    Forms that have already been processed are skipped, as in ``process_xform_task``."""
+    serializer = XFormSerializer(data=form_jsons, many=True)
+    serializer.is_valid(raise_exception=True)
+    xforms = serializer.save()
+
+    with transaction.atomic():
+        _lock_xforms([xform.id for xform in xforms])
+        processed = get_processed_xform_ids([xform.id for xform in xforms])
+        if processed:
+            logger.info("Skipping %s forms, already processed", len(processed))
+        errors = process_xforms([xform for xform in xforms if xform.id not in processed])
+
+    for xform_id, error in errors.items():
+        logger.warning("Unable to process form %s: %s", xform_id, error.detail)
+
+
+def _lock_xforms(xform_ids: list[str]):
+    """Serialize concurrent deliveries of the same forms for the rest of the transaction.
+    Locks are taken in a consistent order to avoid deadlocks between overlapping batches."""
+    with connection.cursor() as cursor:
+        for xform_id in sorted(set(xform_ids)):
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [xform_id])
+
+
+def get_processed_xform_ids(xform_ids: list[str]) -> set[str]:
+    processed = set()
+    for model in (UserVisit, CompletedModule, Assessment):
+        processed.update(model.objects.filter(xform_id__in=xform_ids).values_list("xform_id", flat=True))
+    return processed
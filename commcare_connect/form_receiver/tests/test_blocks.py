@@ -0,0 +1,78 @@
+import random
+
+import pytest
+from jsonpath_ng.ext import parse
+
+from commcare_connect.form_receiver.blocks import CONNECT_BLOCK_NAMES, get_connect_blocks
+from commcare_connect.form_receiver.const import CCC_LEARN_XMLNS
+from commcare_connect.form_receiver.tests.xforms import (
+    AssessmentStubFactory,
+    DeliverUnitStubFactory,
+    LearnModuleJsonFactory,
+    get_form_json,
+)
+
+JSONPATHS = {name: parse(f"$..{name}") for name in CONNECT_BLOCK_NAMES}
+
+
+def get_connect_blocks_jsonpath(form):
+    """The JSONPath implementation that get_connect_blocks replaced"""
+    return {
+        name: [match.value for match in jsonpath.find(form) if match.value["@xmlns"] == CCC_LEARN_XMLNS]
+        for name, jsonpath in JSONPATHS.items()
+    }
+
+
+def test_get_connect_blocks():
+    module = LearnModuleJsonFactory().json
+    assessment = AssessmentStubFactory().json
+    deliver = DeliverUnitStubFactory().json
+    form = get_form_json(form_block={**module, "group": {"repeat": [assessment, {"question": "1", **deliver}]}})[
+        "form"
+    ]
+    assert get_connect_blocks(form) == {
+        "module": [module["module"]],
+        "assessment": [assessment["assessment"]],
+        "deliver": [deliver["deliver"]],
+    }
+
+
+def test_get_connect_blocks_ignores_other_namespaces():
+    deliver = DeliverUnitStubFactory().json
+    deliver["deliver"]["@xmlns"] = "http://openrosa.org/formdesigner/other"
+    form = {"deliver": "not a block", "group": deliver}
+    assert get_connect_blocks(form) == {"module": [], "assessment": [], "deliver": []}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_get_connect_blocks_matches_jsonpath(seed):
+    form = _make_large_form(random.Random(seed), depth=5, breadth=4)
+    assert get_connect_blocks(form) == get_connect_blocks_jsonpath(form)
+
+
+@pytest.mark.parametrize(
+    "extractor", [get_connect_blocks, get_connect_blocks_jsonpath], ids=["single_pass", "jsonpath"]
+)
+def test_benchmark_connect_block_extraction(benchmark, extractor):
+    form = _make_large_form(random.Random(0), depth=5, breadth=4)
+    blocks = benchmark.pedantic(extractor, args=(form,), rounds=5, iterations=1)
+    assert blocks["deliver"]
+
+
+def _make_large_form(rng, depth, breadth):
+    """Build a form with nested groups and repeat groups containing Connect blocks at every level."""
+    node = {f"question_{i}": str(rng.random()) for i in range(breadth * 2)}
+    node["@xmlns"] = "http://openrosa.org/formdesigner/form"
+    if rng.random() < 0.3:
+        node["deliver"] = {"@xmlns": CCC_LEARN_XMLNS, "@id": f"deliver_{rng.random()}", "entity_id": "1"}
+    if rng.random() < 0.1:
+        node["module"] = {"@xmlns": CCC_LEARN_XMLNS, "@id": f"module_{rng.random()}"}
+    if rng.random() < 0.1:
+        node["assessment"] = {"@xmlns": CCC_LEARN_XMLNS, "@id": f"assessment_{rng.random()}", "user_score": "1"}
+    if depth > 0:
+        for i in range(breadth):
+            if rng.random() < 0.5:
+                node[f"repeat_{i}"] = [_make_large_form(rng, depth - 1, breadth // 2 or 1) for _ in range(2)]
+            else:
+                node[f"group_{i}"] = _make_large_form(rng, depth - 1, breadth)
+    return node
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.processor import get_app, get_opportunity, get_user
+from commcare_connect.form_receiver.tests.xforms import get_form_model
+from commcare_connect.opportunity.models import Opportunity
+from commcare_connect.opportunity.tests.factories import CommCareAppFactory, OpportunityFactory
+from commcare_connect.program.tests.factories import ManagedOpportunityFactory
+from commcare_connect.users.tests.factories import ConnectIdUserLinkFactory, MobileUserFactory
+
+
+@pytest.mark.django_db
+def test_get_app_cached(django_assert_num_queries):
+    app = CommCareAppFactory()
+    assert get_app(app.cc_domain, app.cc_app_id) == app
+    with django_assert_num_queries(0):
+        assert get_app(app.cc_domain, app.cc_app_id) == app
+
+
+@pytest.mark.django_db
+def test_get_app_cache_cleared_on_save():
+    with pytest.raises(ProcessingError):
+        get_app("domain", "app_id")
+    app = CommCareAppFactory(cc_domain="domain", cc_app_id="app_id")
+    assert get_app("domain", "app_id") == app
+
+    app.delete()
+    with pytest.raises(ProcessingError):
+        get_app("domain", "app_id")
+
+
+@pytest.mark.django_db
+def test_get_user_cache_cleared_on_link_change(django_assert_num_queries):
+    xform = get_form_model()
+    with pytest.raises(ProcessingError):
+        get_user(xform)
+
+    user = MobileUserFactory()
+    link = ConnectIdUserLinkFactory(user=user, commcare_username=f"test@{xform.domain}.commcarehq.org")
+    assert get_user(xform) == user
+    with django_assert_num_queries(0):
+        assert get_user(xform) == user
+
+    link.delete()
+    with pytest.raises(ProcessingError):
+        get_user(xform)
+
+
+@pytest.mark.django_db
+def test_get_opportunity_cached(opportunity: Opportunity, django_assert_num_queries):
+    assert get_opportunity(learn_app=opportunity.learn_app) == opportunity
+    assert get_opportunity(deliver_app=opportunity.deliver_app) == opportunity
+    with django_assert_num_queries(0):
+        assert get_opportunity(learn_app=opportunity.learn_app) == opportunity
+        assert get_opportunity(deliver_app=opportunity.deliver_app) == opportunity
+
+
+@pytest.mark.django_db
+def test_get_opportunity_cache_cleared_on_save(opportunity: Opportunity):
+    assert get_opportunity(deliver_app=opportunity.deliver_app) == opportunity
+
+    opportunity.end_date = datetime.date.today() - datetime.timedelta(days=1)
+    opportunity.save()
+    assert get_opportunity(deliver_app=opportunity.deliver_app) is None
+
+    opportunity.end_date = datetime.date.today()
+    opportunity.save()
+    new_app = CommCareAppFactory()
+    old_app = opportunity.deliver_app
+    assert get_opportunity(deliver_app=new_app) is None
+    opportunity.deliver_app = new_app
+    opportunity.save()
+    assert get_opportunity(deliver_app=new_app) == opportunity
+    assert get_opportunity(deliver_app=old_app) is None
+
+
+@pytest.mark.django_db
+def test_get_opportunity_multiple():
+    opportunity = ManagedOpportunityFactory(end_date=datetime.date.today())
+    assert get_opportunity(learn_app=opportunity.learn_app).pk == opportunity.pk
+
+    OpportunityFactory(learn_app=opportunity.learn_app, end_date=datetime.date.today())
+    with pytest.raises(ProcessingError, match="Multiple active opportunities"):
+        get_opportunity(learn_app=opportunity.learn_app)
+
+    opportunity.active = False
+    opportunity.save()
+    assert get_opportunity(learn_app=opportunity.learn_app).pk != opportunity.pk
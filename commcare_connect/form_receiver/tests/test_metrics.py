@@ -0,0 +1,62 @@
+import pytest
+
+from commcare_connect.form_receiver.metrics import DURATION_METRIC, QUERIES_METRIC, TOTAL_STAGE
+from commcare_connect.form_receiver.processor import process_xform
+from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.form_receiver.tests.test_receiver_integration import _create_opp_and_form_json
+from commcare_connect.opportunity.models import Opportunity
+from commcare_connect.users.models import User
+from commcare_connect.utils.metrics import MetricsBackend, StatsdMetricsBackend
+
+
+class RecordingMetricsBackend(MetricsBackend):
+    recorded = []
+
+    def histogram(self, name, value, tags=None):
+        self.recorded.append((name, value, tags))
+
+
+@pytest.fixture
+def recorded_metrics(settings):
+    settings.METRICS_BACKEND = "commcare_connect.form_receiver.tests.test_metrics.RecordingMetricsBackend"
+    RecordingMetricsBackend.recorded = []
+    return RecordingMetricsBackend.recorded
+
+
+@pytest.mark.django_db
+def test_process_xform_stage_metrics(user_with_connectid_link: User, opportunity: Opportunity, recorded_metrics):
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    serializer = XFormSerializer(data=form_json)
+    serializer.is_valid(raise_exception=True)
+    process_xform(serializer.save())
+
+    duration_stages = [tags["stage"] for name, value, tags in recorded_metrics if name == DURATION_METRIC]
+    # opportunity_lookup runs for both the deliver and the learn app, but is recorded once per form
+    assert len(duration_stages) == len(set(duration_stages))
+    durations = {tags["stage"]: value for name, value, tags in recorded_metrics if name == DURATION_METRIC}
+    queries = {tags["stage"]: value for name, value, tags in recorded_metrics if name == QUERIES_METRIC}
+    assert {
+        TOTAL_STAGE,
+        "app_lookup",
+        "user_lookup",
+        "opportunity_lookup",
+        "limit_counts",
+        "verification_flags",
+        "visit_save",
+        "attachment_enqueue",
+    } <= set(durations)
+    assert all(tags["opportunity"] == opportunity.id for _, _, tags in recorded_metrics)
+    assert queries["visit_save"] > 0
+    assert queries[TOTAL_STAGE] >= queries["visit_save"] + queries["limit_counts"]
+
+
+def test_statsd_format(settings):
+    settings.STATSD_PREFIX = "connect"
+    backend = StatsdMetricsBackend()
+    line = backend.format("form.duration", 1.5, "h", {"stage": "total", "opportunity": 1})
+    assert line == "connect.form.duration:1.5|h|#stage:total,opportunity:1"
+
+
+def test_metrics_backend_is_abstract():
+    with pytest.raises(TypeError):
+        MetricsBackend()
@@ -1,17 +1,30 @@
 from contextlib import ExitStack, contextmanager
 from unittest import mock
 
-from commcare_connect.form_receiver.processor import process_deliver_form, process_learn_form
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from commcare_connect.form_receiver.exceptions import ProcessingError
+from commcare_connect.form_receiver.processor import (
+    process_deliver_form,
+    process_learn_form,
+    process_learn_modules,
+)
 from commcare_connect.form_receiver.tests.xforms import (
     AssessmentStubFactory,
     DeliverUnitStubFactory,
     LearnModuleJsonFactory,
     get_form_model,
 )
+from commcare_connect.opportunity.models import CompletedModule, LearnModule, Opportunity
+from commcare_connect.opportunity.tests.factories import LearnModuleFactory
+from commcare_connect.users.models import User
 
 LEARN_PROCESSOR_PATCHES = [
     "commcare_connect.form_receiver.processor.process_learn_modules",
     "commcare_connect.form_receiver.processor.process_assessments",
+    "commcare_connect.form_receiver.processor.OpportunityAccess",
 ]
 
 
@@ -24,7 +37,7 @@ def test_process_learn_form_no_matching_blocks():
 def test_process_learn_module():
     learn_module = LearnModuleJsonFactory().json
     xform = get_form_model(form_block=learn_module)
-    with patch_multiple(*LEARN_PROCESSOR_PATCHES) as [process_learn_module, process_assessment]:
+    with patch_multiple(*LEARN_PROCESSOR_PATCHES) as [process_learn_module, process_assessment, _]:
         process_learn_form(None, xform, None, None)
     assert process_learn_module.call_count == 1
     assert process_assessment.call_count == 0
@@ -33,7 +46,7 @@ def test_process_learn_module():
 def test_process_assessment():
     assessment = AssessmentStubFactory().json
     xform = get_form_model(form_block=assessment)
-    with patch_multiple(*LEARN_PROCESSOR_PATCHES) as [process_learn_module, process_assessment]:
+    with patch_multiple(*LEARN_PROCESSOR_PATCHES) as [process_learn_module, process_assessment, _]:
         process_learn_form(None, xform, None, None)
     assert process_learn_module.call_count == 0
     assert process_assessment.call_count == 1
@@ -54,6 +67,55 @@ def test_process_deliver_form_no_matches():
     assert process_deliver_unit.call_count == 0
 
 
+@pytest.mark.django_db
+def test_process_learn_modules_queries(mobile_user: User, opportunity: Opportunity):
+    app = opportunity.learn_app
+    existing = LearnModuleFactory(app=app)
+
+    def process(module_count):
+        blocks = [LearnModuleJsonFactory(id=existing.slug).json["module"]] + [
+            LearnModuleJsonFactory().json["module"] for _ in range(module_count - 1)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            process_learn_modules(mobile_user, get_form_model(), app, opportunity, blocks)
+        CompletedModule.objects.all().delete()
+        return len(queries)
+
+    # the number of queries doesn't depend on the number of modules
+    assert process(2) == process(6)
+    assert LearnModule.objects.filter(app=app).count() == 1 + 1 + 5
+
+
+@pytest.mark.django_db
+def test_process_learn_modules_already_completed(mobile_user: User, opportunity: Opportunity):
+    blocks = [LearnModuleJsonFactory().json["module"]]
+    process_learn_modules(mobile_user, get_form_model(), opportunity.learn_app, opportunity, blocks)
+    with pytest.raises(ProcessingError, match="already completed"):
+        process_learn_modules(mobile_user, get_form_model(), opportunity.learn_app, opportunity, blocks)
+    assert CompletedModule.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_process_learn_modules_created_concurrently(mobile_user: User, opportunity: Opportunity):
+    app = opportunity.learn_app
+    blocks = [LearnModuleJsonFactory().json["module"]]
+    original_filter = LearnModule.objects.filter
+
+    def filter_and_create_concurrently(*args, **kwargs):
+        # another form creates the module after it has been looked up
+        patched_filter.side_effect = original_filter
+        module = LearnModuleFactory(app=app, slug=blocks[0]["@id"])
+        return original_filter(*args, **kwargs).exclude(pk=module.pk)
+
+    with mock.patch.object(
+        LearnModule.objects, "filter", side_effect=filter_and_create_concurrently
+    ) as patched_filter:
+        process_learn_modules(mobile_user, get_form_model(), app, opportunity, blocks)
+
+    module = LearnModule.objects.get(app=app)
+    assert CompletedModule.objects.get().module == module
+
+
 @contextmanager
 def patch_multiple(*args):
     with ExitStack() as stack:
@@ -0,0 +1,143 @@
+from uuid import uuid4
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from commcare_connect.form_receiver.processor import process_xform, process_xforms
+from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.form_receiver.tests.test_receiver_endpoint import add_credentials
+from commcare_connect.form_receiver.tests.xforms import (
+    AssessmentStubFactory,
+    DeliverUnitStubFactory,
+    LearnModuleJsonFactory,
+    get_form_json,
+)
+from commcare_connect.opportunity.models import Assessment, CompletedModule, Opportunity, UserVisit
+from commcare_connect.opportunity.tests.factories import DeliverUnitFactory
+from commcare_connect.users.models import User
+
+
+@pytest.mark.django_db
+def test_batch_receiver_learn_forms(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    forms = [_learn_form_json(opportunity, LearnModuleJsonFactory().json) for _ in range(3)]
+    forms.append(_learn_form_json(opportunity, AssessmentStubFactory(score=opportunity.learn_app.passing_score).json))
+
+    response = make_batch_request(api_client, forms, mobile_user_with_connect_link)
+    assert response.data == {"errors": {}}
+    assert CompletedModule.objects.filter(user=mobile_user_with_connect_link).count() == 3
+    assessment = Assessment.objects.get(user=mobile_user_with_connect_link)
+    assert assessment.xform_id == forms[-1]["id"]
+    assert assessment.passed
+
+
+@pytest.mark.django_db
+def test_batch_receiver_deliver_forms(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=opportunity.paymentunit_set.first())
+    forms = [
+        get_form_json(
+            form_block=DeliverUnitStubFactory(id=deliver_unit.slug).json,
+            domain=deliver_unit.app.cc_domain,
+            app_id=deliver_unit.app.cc_app_id,
+            id=str(uuid4()),
+        )
+        for _ in range(2)
+    ]
+
+    response = make_batch_request(api_client, forms, mobile_user_with_connect_link)
+    assert response.data == {"errors": {}}
+    assert set(UserVisit.objects.values_list("xform_id", flat=True)) == {form["id"] for form in forms}
+
+
+@pytest.mark.django_db
+def test_batch_receiver_partial_failure(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    module = LearnModuleJsonFactory().json
+    valid = _learn_form_json(opportunity, module)
+    unknown_app = get_form_json(form_block=LearnModuleJsonFactory().json, id=str(uuid4()))
+    duplicate = _learn_form_json(opportunity, module)
+
+    response = make_batch_request(api_client, [valid, unknown_app, duplicate], mobile_user_with_connect_link)
+    assert set(response.data["errors"]) == {unknown_app["id"], duplicate["id"]}
+    assert response.data["errors"][duplicate["id"]] == "Learn Module is already completed"
+    assert list(CompletedModule.objects.values_list("xform_id", flat=True)) == [valid["id"]]
+
+
+@pytest.mark.django_db
+def test_batch_receiver_failed_form_new_module(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    module = LearnModuleJsonFactory().json
+    # the module is created for the invalid form and then rolled back with it
+    invalid = _learn_form_json(opportunity, {**module, **AssessmentStubFactory(score="invalid").json})
+    valid = _learn_form_json(opportunity, module)
+
+    response = make_batch_request(api_client, [invalid, valid], mobile_user_with_connect_link)
+    assert response.data == {"errors": {invalid["id"]: "User score must be an integer"}}
+    completed_module = CompletedModule.objects.get()
+    assert completed_module.xform_id == valid["id"]
+    assert completed_module.module.slug == module["module"]["@id"]
+
+
+@pytest.mark.django_db
+def test_batch_receiver_uses_fewer_queries(
+    mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
+):
+    add_credentials(api_client, mobile_user_with_connect_link)
+    with CaptureQueriesContext(connection) as single:
+        for _ in range(5):
+            form_json = _learn_form_json(opportunity, LearnModuleJsonFactory().json)
+            api_client.post("/api/receiver/", data=form_json, format="json")
+
+    forms = [_learn_form_json(opportunity, LearnModuleJsonFactory().json) for _ in range(5)]
+    with CaptureQueriesContext(connection) as batch:
+        api_client.post("/api/receiver/batch/", data=forms, format="json")
+
+    assert CompletedModule.objects.count() == 10
+    assert len(batch.captured_queries) < len(single.captured_queries)
+
+
+@pytest.mark.django_db
+def test_batch_receiver_validation(user: User, api_client: APIClient):
+    add_credentials(api_client, user)
+    response = api_client.post("/api/receiver/batch/", data=[get_form_json(), {"foo": "bar"}], format="json")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("app_attr", ["learn_app", "deliver_app"])
+def test_batch_matches_single_form_without_blocks(user_with_connectid_link: User, opportunity: Opportunity, app_attr):
+    # the user has no access to the opportunity, which is only needed to process connect blocks
+    app = getattr(opportunity, app_attr)
+    form_json = get_form_json(domain=app.cc_domain, app_id=app.cc_app_id, id=str(uuid4()))
+
+    process_xform(_get_xform(form_json))
+    assert process_xforms([_get_xform(form_json)]) == {}
+
+
+def _learn_form_json(opportunity, form_block):
+    return get_form_json(
+        form_block=form_block,
+        domain=opportunity.learn_app.cc_domain,
+        app_id=opportunity.learn_app.cc_app_id,
+        id=str(uuid4()),
+    )
+
+
+def make_batch_request(api_client, forms, user, expected_status_code=200):
+    add_credentials(api_client, user)
+    response = api_client.post("/api/receiver/batch/", data=forms, format="json")
+    assert response.status_code == expected_status_code, response.data
+    return response
+
+
+def _get_xform(form_json):
+    serializer = XFormSerializer(data=form_json)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
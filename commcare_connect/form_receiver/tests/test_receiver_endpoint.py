@@ -40,6 +40,20 @@ def test_process_xform_error(user: User, api_client: APIClient):
     assert response.data == {"detail": "oops, something went wrong"}
 
 
+def test_form_receiver_async(user: User, api_client: APIClient, settings):
+    settings.FORM_RECEIVER_ASYNC = True
+    add_credentials(api_client, user)
+    form_json = get_form_json()
+    with (
+        mock.patch("commcare_connect.form_receiver.views.process_xform") as process_xform,
+        mock.patch("commcare_connect.form_receiver.views.process_xform_task") as process_xform_task,
+    ):
+        response = api_client.post("/api/receiver/", data=form_json, format="json")
+    assert response.status_code == 202
+    assert not process_xform.called
+    process_xform_task.delay.assert_called_once_with(form_json)
+
+
 def add_credentials(api_client: APIClient, user: User):
     token, _ = user.oauth2_provider_accesstoken.get_or_create(
         token="token",
@@ -1,5 +1,6 @@
 import datetime
 from copy import deepcopy
+from unittest import mock
 from uuid import uuid4
 
 import pytest
@@ -34,6 +35,7 @@ from commcare_connect.opportunity.tests.factories import (
     OpportunityAccessFactory,
     OpportunityClaimFactory,
     PaymentUnitFactory,
+    UserVisitFactory,
 )
 from commcare_connect.opportunity.visit_import import update_payment_accrued
 from commcare_connect.users.models import User
@@ -130,6 +132,30 @@ def test_receiver_deliver_form(mobile_user_with_connect_link: User, api_client:
     assert visit.entity_name == stub.entity_name
 
 
+@pytest.mark.django_db
+def test_receiver_deliver_form_enqueues_attachments_on_commit(
+    mobile_user_with_connect_link: User,
+    api_client: APIClient,
+    opportunity: Opportunity,
+    django_capture_on_commit_callbacks,
+):
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=opportunity.paymentunit_set.first())
+    form_json = get_form_json(
+        form_block=DeliverUnitStubFactory(id=deliver_unit.slug).json,
+        domain=deliver_unit.app.cc_domain,
+        app_id=deliver_unit.app.cc_app_id,
+    )
+    with mock.patch("commcare_connect.form_receiver.processor.download_user_visit_attachments") as download_task:
+        with django_capture_on_commit_callbacks() as callbacks:
+            make_request(api_client, form_json, mobile_user_with_connect_link)
+        download_task.delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+    visit = UserVisit.objects.get(user=mobile_user_with_connect_link)
+    download_task.delay.assert_called_once_with(visit.id)
+
+
 def _create_opp_and_form_json(
     opportunity,
     user,
@@ -384,6 +410,7 @@ def test_auto_approve_payments_rejected_visit(
     assert access.payment_accrued == completed_work.payment_accrued
 
 
+@pytest.mark.usefixtures("celery_eager")
 def test_auto_approve_payments_approved_visit_task(
     user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity
 ):
@@ -405,6 +432,7 @@ def test_auto_approve_payments_approved_visit_task(
     assert access.payment_accrued == completed_work.payment_accrued
 
 
+@pytest.mark.usefixtures("celery_eager")
 def test_auto_approve_payments_rejected_visit_task(
     user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity
 ):
@@ -523,6 +551,38 @@ def test_reciever_verification_flags_duration(
     assert ["duration", "The form was completed too quickly."] in visit.flag_reason.get("flags", [])
 
 
+@pytest.mark.parametrize(
+    "other_location, flagged",
+    [
+        ("20.0906 40.0932 0 0", True),  # ~40m away
+        ("20.0902 40.0941 0 0", True),  # ~93m away, in a different grid cell
+        ("20.0919 40.0932 0 0", False),  # ~190m away
+        ("20.1 40.1 0 0", False),
+    ],
+)
+def test_reciever_verification_flags_location(
+    user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity, other_location, flagged
+):
+    verification_flags = OpportunityVerificationFlags.objects.get(opportunity=opportunity)
+    verification_flags.location = 100
+    verification_flags.save()
+
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    deliver_unit = opportunity.deliver_app.deliver_units.first()
+    UserVisitFactory(
+        opportunity=opportunity,
+        deliver_unit=deliver_unit,
+        status=VisitValidationStatus.approved,
+        location=other_location,
+    )
+    form_json["metadata"]["location"] = "20.090209 40.09320 20 40"
+    make_request(api_client, form_json, user_with_connectid_link)
+    visit = UserVisit.objects.get(user=user_with_connectid_link)
+    assert visit.flagged == flagged
+    if flagged:
+        assert ["location", "Visit location is too close to another visit"] in visit.flag_reason["flags"]
+
+
 def test_reciever_verification_flags_check_attachments(
     user_with_connectid_link: User, api_client: APIClient, opportunity: Opportunity
 ):
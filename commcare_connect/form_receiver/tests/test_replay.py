@@ -0,0 +1,63 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+from commcare_connect.form_receiver.replay import create_replay_forms, replay_forms
+from commcare_connect.opportunity.models import Assessment, CompletedModule, UserVisit
+
+
+@pytest.mark.django_db
+def test_replay_forms():
+    forms = create_replay_forms(users=2, deliver_forms_per_user=3, deliver_units_per_form=2, learn_modules=2)
+    result = replay_forms(forms)
+    assert result.forms == len(forms) == 2 * (2 + 1 + 3)
+    assert result.errors == 0
+    assert result.queries_per_form > 0
+    assert result.p50 <= result.p99
+    assert UserVisit.objects.count() == 2 * 3 * 2
+    assert CompletedModule.objects.count() == 2 * 2
+    assert Assessment.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replay_forms_concurrently():
+    forms = create_replay_forms(users=2, deliver_forms_per_user=2, deliver_units_per_form=1, learn_modules=1)
+    result = replay_forms(forms, concurrency=2)
+    assert result.forms == len(forms)
+    assert result.errors == 0
+    assert UserVisit.objects.count() == 2 * 2
+
+
+@pytest.mark.django_db
+def test_replay_forms_command_rollback(capsys):
+    call_command("replay_forms", users=1, forms=2)
+    assert "forms/sec" in capsys.readouterr().out
+    assert not UserVisit.objects.exists()
+
+
+@pytest.mark.django_db
+def test_replay_forms_command_keep(settings):
+    with pytest.raises(CommandError):
+        call_command("replay_forms", users=1, forms=2, keep=True)
+    with pytest.raises(CommandError):
+        call_command("replay_forms", users=1, forms=2, concurrency=2)
+
+    settings.DEBUG = True
+    call_command("replay_forms", users=1, forms=2, deliver_units=1, keep=True)
+    assert UserVisit.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_benchmark_replay_forms(benchmark):
+    def setup():
+        return (create_replay_forms(users=2, deliver_forms_per_user=5),), {}
+
+    result = benchmark.pedantic(replay_forms, setup=setup, rounds=3)
+    benchmark.extra_info.update(
+        {
+            "forms_per_second": result.forms_per_second,
+            "p50_ms": result.p50 * 1000,
+            "p99_ms": result.p99 * 1000,
+            "queries_per_form": result.queries_per_form,
+        }
+    )
+    assert result.errors == 0
@@ -0,0 +1,79 @@
+import pytest
+
+from commcare_connect.form_receiver.ruleset import get_verification_ruleset
+from commcare_connect.form_receiver.tests.xforms import get_form_model
+from commcare_connect.opportunity.models import Opportunity, OpportunityVerificationFlags
+from commcare_connect.opportunity.tests.factories import (
+    DeliverUnitFactory,
+    DeliverUnitFlagRulesFactory,
+    FormJsonValidationRulesFactory,
+)
+
+
+@pytest.fixture
+def deliver_unit(opportunity):
+    return DeliverUnitFactory(app=opportunity.deliver_app)
+
+
+@pytest.mark.django_db
+def test_ruleset_is_cached(opportunity: Opportunity, deliver_unit, django_assert_num_queries):
+    ruleset = get_verification_ruleset(opportunity.id, deliver_unit.id)
+    with django_assert_num_queries(0):
+        assert get_verification_ruleset(opportunity.id, deliver_unit.id) is ruleset
+
+
+@pytest.mark.django_db
+def test_ruleset_invalidated_on_flags_change(opportunity: Opportunity, deliver_unit):
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).location == 10
+
+    flags = OpportunityVerificationFlags.objects.get(opportunity=opportunity)
+    flags.location = 50
+    flags.save()
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).location == 50
+
+
+@pytest.mark.django_db
+def test_ruleset_invalidated_on_deliver_unit_rules_change(opportunity: Opportunity, deliver_unit):
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).duration == 0
+
+    rules = DeliverUnitFlagRulesFactory(opportunity=opportunity, deliver_unit=deliver_unit, duration=5)
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).duration == 5
+
+    rules.delete()
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).duration == 0
+
+
+@pytest.mark.django_db
+def test_ruleset_invalidated_on_form_json_rules_change(opportunity: Opportunity, deliver_unit):
+    rule = FormJsonValidationRulesFactory(opportunity=opportunity, question_path="$.form.value", question_value="1")
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).form_json_rules == ()
+
+    rule.deliver_unit.add(deliver_unit)
+    [compiled_rule] = get_verification_ruleset(opportunity.id, deliver_unit.id).form_json_rules
+    assert compiled_rule.question_path == "$.form.value"
+
+    deliver_unit.formjsonvalidationrules_set.remove(rule)
+    assert get_verification_ruleset(opportunity.id, deliver_unit.id).form_json_rules == ()
+
+
+@pytest.mark.django_db
+def test_ruleset_check_form(opportunity: Opportunity, deliver_unit):
+    DeliverUnitFlagRulesFactory(opportunity=opportunity, deliver_unit=deliver_unit, check_attachments=True)
+    rule = FormJsonValidationRulesFactory(opportunity=opportunity, question_path="$.form.value", question_value="1")
+    rule.deliver_unit.add(deliver_unit)
+    ruleset = get_verification_ruleset(opportunity.id, deliver_unit.id)
+
+    attachments = {
+        "form.xml": {"content_type": "text/xml", "length": 1000},
+        "photo.jpg": {"content_type": "image/jpeg", "length": 1000},
+    }
+    xform = get_form_model(form_block={"value": "1"}, attachments=attachments)
+    assert ruleset.check_form(xform.raw_form, xform) == []
+
+    xform = get_form_model(form_block={"value": "2"}, attachments={"form.xml": attachments["form.xml"]})
+    assert ruleset.check_form(xform.raw_form, xform) == [
+        ["attachment_missing", "Form was submitted without attachements."],
+        ["form_value_not_found", f"Form does not satisfy {rule.name} validation rule."],
+    ]
+    # the form itself is not modified
+    assert "form.xml" in xform.raw_form["attachments"]
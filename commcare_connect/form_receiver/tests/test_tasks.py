@@ -0,0 +1,30 @@
+import pytest
+
+from commcare_connect.form_receiver.tasks import process_xform_task
+from commcare_connect.form_receiver.tests.test_receiver_integration import _create_opp_and_form_json
+from commcare_connect.opportunity.models import Opportunity, UserVisit
+from commcare_connect.users.models import User
+
+
+@pytest.mark.django_db
+def test_process_xform_task(user_with_connectid_link: User, opportunity: Opportunity):
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    process_xform_task(form_json)
+    assert UserVisit.objects.filter(xform_id=form_json["id"]).count() == 1
+
+
+@pytest.mark.django_db
+def test_process_xform_task_is_idempotent(user_with_connectid_link: User, opportunity: Opportunity):
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    process_xform_task(form_json)
+    process_xform_task(form_json)
+    assert UserVisit.objects.filter(xform_id=form_json["id"]).count() == 1
+
+
+@pytest.mark.django_db
+def test_process_xform_task_processing_error(user_with_connectid_link: User, opportunity: Opportunity):
+    form_json = _create_opp_and_form_json(opportunity, user=user_with_connectid_link)
+    form_json["app_id"] = "unknown"
+    # processing errors are logged rather than retried
+    process_xform_task(form_json)
+    assert not UserVisit.objects.exists()
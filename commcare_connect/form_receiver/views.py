@@ -1,10 +1,12 @@
+from django.conf import settings
 from oauth2_provider.contrib.rest_framework import OAuth2Authentication, TokenHasReadWriteScope
 from rest_framework import parsers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from commcare_connect.form_receiver.processor import process_xform
+from commcare_connect.form_receiver.processor import process_xform, process_xforms
 from commcare_connect.form_receiver.serializers import XFormSerializer
+from commcare_connect.form_receiver.tasks import process_xform_batch_task, process_xform_task
 
 
 class FormReceiver(APIView):
@@ -15,6 +17,33 @@ class FormReceiver(APIView):
     def post(self, request):
         serializer = XFormSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        if settings.FORM_RECEIVER_ASYNC:
+            process_xform_task.delay(request.data)
+            return Response(status=status.HTTP_202_ACCEPTED)
+
         xform = serializer.save()
         process_xform(xform)
         return Response(status=status.HTTP_200_OK)
+
+
+class FormBatchReceiver(APIView):
+    """Receive a list of forms and process them as a single batch.
+
+    Forms that can't be processed are reported in the response rather than failing the whole batch."""
+
+    parser_classes = [parsers.JSONParser]
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [TokenHasReadWriteScope]
+
+    def post(self, request):
+        serializer = XFormSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if settings.FORM_RECEIVER_ASYNC:
+            process_xform_batch_task.delay(request.data)
+            return Response(status=status.HTTP_202_ACCEPTED)
+
+        xforms = serializer.save()
+        errors = process_xforms(xforms)
+        return Response(
+            {"errors": {xform_id: error.detail for xform_id, error in errors.items()}}, status=status.HTTP_200_OK
+        )
@@ -6,9 +6,12 @@ from commcare_connect.opportunity.models import (
     CommCareApp,
     CompletedModule,
     CompletedWork,
+    CompletedWorkStatus,
+    DailyVisitCount,
     DeliverUnit,
     DeliverUnitFlagRules,
     DeliveryType,
+    EntityVisitCount,
     FormJsonValidationRules,
     LearnModule,
     Opportunity,
@@ -16,9 +19,11 @@ from commcare_connect.opportunity.models import (
     OpportunityClaim,
     OpportunityClaimLimit,
     Payment,
+    PaymentAccrual,
     PaymentUnit,
     UserInvite,
     UserVisit,
+    accrue_payments,
 )
 from commcare_connect.opportunity.tasks import create_learn_modules_and_deliver_units
 
@@ -60,12 +65,20 @@ class OpportunityAccessAdmin(admin.ModelAdmin):
     @admin.action(description="Clear User Progress")
     def clear_user_progress(self, request, queryset):
         for access in queryset:
+            completed_works = CompletedWork.objects.filter(opportunity_access=access)
+            # reverse the payments accrued for the work in the ledger rather than deleting its entries
+            completed_works.update(status=CompletedWorkStatus.incomplete, approved_count=0)
+            accrue_payments(completed_works)
             UserVisit.objects.filter(opportunity_access=access).delete()
+            DailyVisitCount.objects.filter(opportunity_access=access).delete()
+            EntityVisitCount.objects.filter(opportunity_access=access).delete()
             Payment.objects.filter(opportunity_access=access).delete()
             OpportunityClaim.objects.filter(opportunity_access=access).delete()
             CompletedModule.objects.filter(opportunity_access=access).delete()
             Assessment.objects.filter(opportunity_access=access).delete()
-            CompletedWork.objects.filter(opportunity_access=access).delete()
+            completed_works.delete()
+            access.payment_accrued = 0
+            access.save(update_fields=["payment_accrued"])
 
 
 @admin.register(LearnModule)
@@ -109,6 +122,18 @@ class AssessmentAdmin(admin.ModelAdmin):
     list_display = ["app", "user", "opportunity", "date", "passed"]
 
 
+@admin.register(PaymentAccrual)
+class PaymentAccrualAdmin(admin.ModelAdmin):
+    list_display = ["opportunity_access", "completed_work", "amount", "status", "approved_count", "date_created"]
+    readonly_fields = ["opportunity_access", "completed_work", "amount", "status", "approved_count", "date_created"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(CompletedWork)
 class CompletedWorkAdmin(admin.ModelAdmin):
     list_display = ["get_username", "get_opp_name", "opportunity_access", "payment_unit", "status"]
@@ -77,12 +77,11 @@ class OpportunityClaimSerializer(serializers.ModelSerializer):
 
     def get_max_payments(self, obj):
         # return 1 for old opportunities
-        return obj.opportunityclaimlimit_set.aggregate(max_visits=Sum("max_visits")).get("max_visits", 0) or -1
+        return sum(claim_limit.max_visits for claim_limit in obj.opportunityclaimlimit_set.all()) or -1
 
     def get_payment_units(self, obj):
-        return OpportunityClaimLimitSerializer(
-            obj.opportunityclaimlimit_set.order_by("payment_unit_id"), many=True
-        ).data
+        claim_limits = sorted(obj.opportunityclaimlimit_set.all(), key=lambda claim_limit: claim_limit.payment_unit_id)
+        return OpportunityClaimLimitSerializer(claim_limits, many=True).data
 
 
 class CatchmentAreaSerializer(serializers.ModelSerializer):
@@ -136,25 +135,29 @@ class OpportunitySerializer(serializers.ModelSerializer):
         ]
 
     def get_claim(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        claim = OpportunityClaim.objects.filter(opportunity_access=opp_access)
-        if claim.exists():
-            return OpportunityClaimSerializer(claim.first()).data
+        opp_access = self._get_opp_access(obj)
+        claim = getattr(opp_access, "opportunityclaim", None)
+        if claim:
+            return OpportunityClaimSerializer(claim).data
         return None
 
     def get_learn_progress(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        total_modules = LearnModule.objects.filter(app=opp_access.opportunity.learn_app)
+        opp_access = self._get_opp_access(obj)
+        total_modules = obj.learn_app.learn_modules.all()
         completed_modules = opp_access.completedmodule_set.all()
-        return {"total_modules": total_modules.count(), "completed_modules": completed_modules.count()}
+        return {"total_modules": len(total_modules), "completed_modules": len(completed_modules)}
 
     def get_deliver_progress(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        return opp_access.visit_count
+        opp_access = self._get_opp_access(obj)
+        return sum(
+            completed_work.completed
+            for completed_work in opp_access.completedwork_set.all()
+            if completed_work.status != CompletedWorkStatus.over_limit
+        )
 
     def get_max_visits_per_user(self, obj):
         # return 1 for older opportunities
-        return obj.max_visits_per_user_new or -1
+        return sum(payment_unit.max_total or 0 for payment_unit in obj.paymentunit_set.all()) or -1
 
     def get_daily_max_visits_per_user(self, obj):
         return obj.daily_max_visits_per_user_new or -1
@@ -163,20 +166,25 @@ class OpportunitySerializer(serializers.ModelSerializer):
         return obj.budget_per_visit_new or -1
 
     def get_budget_per_user(self, obj):
-        return obj.budget_per_user
+        return sum((payment_unit.max_total or 0) * payment_unit.amount for payment_unit in obj.paymentunit_set.all())
 
     def get_payment_units(self, obj):
-        payment_units = PaymentUnit.objects.filter(opportunity=obj).order_by("pk")
+        payment_units = sorted(obj.paymentunit_set.all(), key=lambda payment_unit: payment_unit.pk)
         return PaymentUnitSerializer(payment_units, many=True).data
 
     def get_is_user_suspended(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
+        opp_access = self._get_opp_access(obj)
         return opp_access.suspended
 
     def get_catchment_areas(self, obj):
-        opp_access = _get_opp_access(self.context.get("request").user, obj)
-        catchments = CatchmentArea.objects.filter(opportunity_access=opp_access)
-        return CatchmentAreaSerializer(catchments, many=True).data
+        opp_access = self._get_opp_access(obj)
+        return CatchmentAreaSerializer(opp_access.catchmentarea_set.all(), many=True).data
+
+    def _get_opp_access(self, obj):
+        # the user's access is prefetched by ``OpportunityViewSet``
+        if hasattr(obj, "user_accesses"):
+            return obj.user_accesses[0]
+        return _get_opp_access(self.context.get("request").user, obj)
 
 
 @quickcache(vary_on=["user.pk", "opportunity.pk"], timeout=60 * 60)
@@ -1,6 +1,7 @@
 import datetime
 
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils.timezone import now
 from rest_framework import viewsets
 from rest_framework.generics import RetrieveAPIView, get_object_or_404
@@ -31,7 +32,27 @@ class OpportunityViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Opportunity.objects.filter(opportunityaccess__user=self.request.user)
+        # the user's access and its progress, see ``OpportunitySerializer``
+        user_accesses = (
+            OpportunityAccess.objects.filter(user=self.request.user)
+            .select_related("opportunityclaim")
+            .prefetch_related(
+                "opportunityclaim__opportunityclaimlimit_set",
+                "completedmodule_set",
+                "completedwork_set",
+                "catchmentarea_set",
+            )
+        )
+        return (
+            Opportunity.objects.filter(opportunityaccess__user=self.request.user)
+            .select_related("organization", "learn_app__organization", "deliver_app__organization")
+            .prefetch_related(
+                "learn_app__learn_modules",
+                "deliver_app__learn_modules",
+                "paymentunit_set",
+                Prefetch("opportunityaccess_set", queryset=user_accesses, to_attr="user_accesses"),
+            )
+        )
 
 
 class UserLearnProgressView(RetrieveAPIView):
@@ -76,8 +97,6 @@ class ClaimOpportunityView(APIView):
 
         if OpportunityClaim.objects.filter(opportunity_access=opportunity_access).exists():
             return Response(status=200, data="Opportunity is already claimed")
-        if opportunity.remaining_budget < opportunity.minimum_budget_per_visit:
-            return Response(status=400, data="Opportunity cannot be claimed. (Budget Exhausted)")
         if opportunity.end_date < datetime.date.today():
             return Response(status=400, data="Opportunity cannot be claimed. (End date reached)")
 
@@ -92,7 +111,9 @@ class ClaimOpportunityView(APIView):
             if not created:
                 return Response(status=200, data="Opportunity is already claimed")
 
-            OpportunityClaimLimit.create_claim_limits(opportunity, claim)
+            if not OpportunityClaimLimit.create_claim_limits(opportunity, claim):
+                transaction.set_rollback(True)
+                return Response(status=400, data="Opportunity cannot be claimed. (Budget Exhausted)")
 
         domain = opportunity.deliver_app.cc_domain
         if not ConnectIDUserLink.objects.filter(user=self.request.user, domain=domain).exists():
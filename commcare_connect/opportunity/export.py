@@ -1,7 +1,9 @@
 import datetime
 import json
+from collections.abc import Iterable, Iterator
 
 from django.utils.encoding import force_str
+from django_tables2.rows import BoundRow
 from flatten_dict import flatten
 from tablib import Dataset
 
@@ -26,11 +28,28 @@ from commcare_connect.opportunity.tables import (
     UserVisitTable,
 )
 
+USER_VISIT_EXPORT_CHUNK_SIZE = 2000
+
 
 def export_user_visit_data(
     opportunity: Opportunity, date_range: DateRanges, status: list[VisitValidationStatus], flatten: bool
 ) -> Dataset:
     """Export all user visits for an opportunity."""
+    headers, rows = get_user_visit_export_rows(opportunity, date_range, status, flatten)
+    dataset = Dataset(title="Export", headers=headers)
+    for row in rows:
+        dataset.append(row)
+    return dataset
+
+
+def get_user_visit_export_rows(
+    opportunity: Opportunity, date_range: DateRanges, status: list[VisitValidationStatus], flatten: bool
+) -> tuple[list[str], Iterator[list]]:
+    """Return the headers of the user visit export and an iterator over its rows.
+
+    The visits are read from the database in chunks as the rows are iterated, so that large exports
+    can be written out without holding all the visits in memory. When ``flatten`` is set, the form
+    JSON of all visits is read once beforehand to get the headers of the flattened columns."""
     user_visits = UserVisit.objects.filter(opportunity=opportunity)
     if date_range.get_cutoff_date():
         user_visits = user_visits.filter(visit_date__gte=date_range.get_cutoff_date())
@@ -46,23 +65,29 @@ def export_user_visit_data(
         for column in table.columns.iterall()
         if not (column.column.exclude_from_export or column.name in exclude_columns)
     ]
-    base_data = [
-        # form_json must be the last column in the row
-        [row.get_cell_value(column.name) for column in columns] + [row.get_cell_value("form_json")]
-        for row in table.rows
-    ]
-    base_headers = [force_str(column.header, strings_only=True) for column in columns]
+    headers = [force_str(column.header, strings_only=True) for column in columns]
+    schema = None
     if flatten:
-        return get_flattened_dataset(base_headers, base_data)
+        schema = _get_form_json_schema(
+            user_visits.values_list("form_json", flat=True).iterator(chunk_size=USER_VISIT_EXPORT_CHUNK_SIZE)
+        )
+        headers += schema
     else:
-        base_headers.append("form_json")
-        dataset = Dataset(title="Export", headers=base_headers)
-        for row in base_data:
-            form_json = json.dumps(row.pop())
-            row.append(form_json)
-            row_data = [force_str(col, strings_only=True) for col in row]
-            dataset.append(row_data)
-        return dataset
+        headers.append("form_json")
+
+    def rows():
+        visits = user_visits.select_related("user", "deliver_unit").order_by("pk")
+        for user_visit in visits.iterator(chunk_size=USER_VISIT_EXPORT_CHUNK_SIZE):
+            bound_row = BoundRow(user_visit, table)
+            row = [bound_row.get_cell_value(column.name) for column in columns]
+            if schema is not None:
+                flat_json = _flatten_form_json(user_visit.form_json)
+                row.extend(flat_json.get(key, "") for key in schema)
+            else:
+                row.append(json.dumps(user_visit.form_json))
+            yield [force_str(col, strings_only=True) for col in row]
+
+    return headers, rows()
 
 
 def get_flattened_dataset(headers: list[str], data: list[list]) -> Dataset:
@@ -72,26 +97,30 @@ def get_flattened_dataset(headers: list[str], data: list[list]) -> Dataset:
     :param data: The data for the dataset. It is expected that the last column in each row
         is the form JSON data.
     """
-    schema = set()
-    flat_data = []
-    for row in data:
-        form_json = row.pop()
-        form_json.pop("attachments", None)
-        flat_json = flatten(form_json, reducer="dot", enumerate_types=(list,))
-        flat_data.append(flat_json)
-        schema.update(flat_json.keys())
-
-    schema = sorted(schema, key=_schema_sort)
-    headers = headers + schema
-    dataset = Dataset(title="Export", headers=headers)
+    form_jsons = [row.pop() for row in data]
+    schema = _get_form_json_schema(form_jsons)
+    dataset = Dataset(title="Export", headers=headers + schema)
 
-    for row, flat_json in zip(data, flat_data):
+    for row, form_json in zip(data, form_jsons):
+        flat_json = _flatten_form_json(form_json)
         row.extend(flat_json.get(key, "") for key in schema)
         dataset.append([force_str(col, strings_only=True) for col in row])
 
     return dataset
 
 
+def _flatten_form_json(form_json: dict) -> dict:
+    form_json = {key: value for key, value in form_json.items() if key != "attachments"}
+    return flatten(form_json, reducer="dot", enumerate_types=(list,))
+
+
+def _get_form_json_schema(form_jsons: Iterable[dict]) -> list[str]:
+    schema = set()
+    for form_json in form_jsons:
+        schema.update(_flatten_form_json(form_json).keys())
+    return sorted(schema, key=_schema_sort)
+
+
 def _schema_sort(item):
     return len(item.split(".")), item
 
@@ -121,14 +150,9 @@ def export_deliver_status_table(opportunity: Opportunity) -> Dataset:
 
 def export_work_status_table(opportunity: Opportunity) -> Dataset:
     access_objects = OpportunityAccess.objects.filter(opportunity=opportunity, suspended=False)
-    completed_works = []
-    for completed_work in CompletedWork.objects.filter(opportunity_access__in=access_objects):
-        completed = completed_work.completed
-        if opportunity.auto_approve_payments and completed and completed_work.flags:
-            completed_works.append(completed_work)
-            continue
-        if completed:
-            completed_works.append(completed_work)
+    completed_works = CompletedWork.objects.filter(
+        opportunity_access__in=access_objects, completed_count__gt=0
+    ).select_related("opportunity_access__user", "payment_unit")
     table = CompletedWorkTable(completed_works, exclude=("date_popup"))
     return get_dataset(table, export_title="Payment Verification export")
 
@@ -1,7 +1,8 @@
 from django.core.management import BaseCommand
+from django.utils.timezone import now
 
-from commcare_connect.opportunity.models import CompletedWorkStatus, Opportunity, OpportunityAccess
-from commcare_connect.opportunity.utils.completed_work import update_status
+from commcare_connect.opportunity.models import Opportunity
+from commcare_connect.opportunity.utils.completed_work import get_auto_approval_accesses, update_opportunity_status
 
 
 class Command(BaseCommand):
@@ -11,18 +12,21 @@ class Command(BaseCommand):
         parser.add_argument(
             "--opp", type=int, required=True, help="ID of the opportunity to run auto-approval logic on"
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only process users with changes since the last successful auto-approval run",
+        )
 
-    def handle(self, *args, opp: int, **options):
+    def handle(self, *args, opp: int, incremental: bool = False, **options):
         try:
             opportunity = Opportunity.objects.get(id=opp)
-            access_objects = OpportunityAccess.objects.filter(
-                opportunity=opportunity, suspended=False, opportunity__auto_approve_payments=True
-            )
-            for access in access_objects:
-                completed_works = access.completedwork_set.exclude(
-                    status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
-                )
-                update_status(completed_works, access, False)
+            if opportunity.auto_approve_payments:
+                run_started = now()
+                access_objects = get_auto_approval_accesses(opportunity, incremental)
+                update_opportunity_status(opportunity, access_objects)
+                # approval accrues payments as it goes, so this run is as complete as a scheduled one
+                Opportunity.objects.filter(id=opp).update(auto_approval_watermark=run_started)
 
             self.stdout.write(self.style.SUCCESS(f"Successfully processed opportunity with id {opp}"))
 
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from commcare_connect.opportunity.models import BlobContent
+
+# content is created before the attachments that reference it, so recent content is kept
+GRACE_PERIOD = timedelta(days=1)
+
+
+class Command(BaseCommand):
+    help = "Deletes stored attachment content that is no longer referenced by any attachment"
+
+    def handle(self, *args, **options):
+        deleted = 0
+        created_before = now() - GRACE_PERIOD
+        unreferenced = BlobContent.objects.filter(ref_count__lte=0, date_created__lt=created_before)
+        for content in unreferenced.iterator():
+            # the ref count is checked again in case the content was referenced since it was queried
+            count, _ = unreferenced.filter(pk=content.pk).delete()
+            if count:
+                default_storage.delete(content.storage_name)
+                deleted += 1
+        self.stdout.write(f"Deleted {deleted} unreferenced blobs")
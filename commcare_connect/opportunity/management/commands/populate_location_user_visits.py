@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand
 
 from commcare_connect.opportunity.models import UserVisit
+from commcare_connect.utils.itertools import batched
+
+BATCH_SIZE = 1000
 
 
 class Command(BaseCommand):
@@ -12,7 +15,11 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         opp_id = options.get("opp")
         filter_kwargs = {"opportunity": opp_id} if opp_id else {}
-        user_visits = UserVisit.objects.filter(**filter_kwargs)
-        for visit in user_visits:
-            visit.location = visit.form_json.get("metadata", {}).get("location")
-            visit.save()
+        user_visits = UserVisit.objects.filter(**filter_kwargs).only("id", "form_json")
+        for batch in batched(user_visits.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+            for visit in batch:
+                visit.location = visit.form_json.get("metadata", {}).get("location")
+                visit.update_location_fields()
+            UserVisit.objects.bulk_update(
+                batch, ["location", "latitude", "longitude", "accuracy", "location_cell"], batch_size=BATCH_SIZE
+            )
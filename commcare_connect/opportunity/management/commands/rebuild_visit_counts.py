@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from commcare_connect.opportunity.models import (
+    VISIT_COUNT_FIELDS,
+    DailyVisitCount,
+    EntityVisitCount,
+    UserVisit,
+    get_visit_count_key,
+    update_visit_counts,
+)
+from commcare_connect.utils.itertools import batched
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily and per-entity visit counters used for the visit limit checks"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+
+    def handle(self, *args, **options):
+        opp_id = options.get("opp")
+        filter_kwargs = {"opportunity_access__opportunity": opp_id} if opp_id else {}
+        with transaction.atomic():
+            DailyVisitCount.objects.filter(**filter_kwargs).delete()
+            EntityVisitCount.objects.filter(**filter_kwargs).delete()
+            user_visits = UserVisit.objects.filter(**filter_kwargs).values(*VISIT_COUNT_FIELDS)
+            for batch in batched(user_visits.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+                update_visit_counts([(None, get_visit_count_key(**visit)) for visit in batch])
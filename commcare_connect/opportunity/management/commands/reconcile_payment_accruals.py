@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from commcare_connect.opportunity.models import OpportunityAccess
+from commcare_connect.opportunity.utils.completed_work import reconcile_payment_accruals
+from commcare_connect.utils.itertools import batched
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconciles the payment accrual ledger with the current status and approved counts of completed work, "
+        "and resets the payment accrued of each access to its ledger total"
+    )
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+        parser.add_argument("--workers", type=int, default=4, help="Number of chunks reconciled in parallel")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Number of accesses per chunk")
+
+    def handle(self, *args, **options):
+        opp_id = options.get("opp")
+        filter_kwargs = {"opportunity": opp_id} if opp_id else {}
+        access_ids = OpportunityAccess.objects.filter(**filter_kwargs).order_by("id").values_list("id", flat=True)
+        chunks = batched(access_ids, options["chunk_size"])
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            entries = sum(executor.map(_reconcile_chunk, chunks))
+        self.stdout.write(f"Added {entries} ledger entries for {len(access_ids)} accesses")
+
+
+def _reconcile_chunk(access_ids):
+    try:
+        return reconcile_payment_accruals(access_ids)
+    finally:
+        connection.close()
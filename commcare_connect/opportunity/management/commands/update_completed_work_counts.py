@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from commcare_connect.opportunity.models import CompletedWork
+from commcare_connect.opportunity.utils.completed_work import recalculate_completed_work_counts
+
+
+class Command(BaseCommand):
+    help = "Recalculates the stored completed and approved counts of completed works"
+
+    def add_arguments(self, parser, *args, **kwargs):
+        parser.add_argument("--opp", type=int)
+
+    def handle(self, *args, **options):
+        opp_id = options.get("opp")
+        filter_kwargs = {"opportunity_access__opportunity": opp_id} if opp_id else {}
+        recalculate_completed_work_counts(CompletedWork.objects.filter(**filter_kwargs))
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.5 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0058_paymentinvoice_payment_invoice"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="assessment",
+            name="xform_id",
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="completedmodule",
+            name="xform_id",
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="uservisit",
+            name="xform_id",
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+    ]
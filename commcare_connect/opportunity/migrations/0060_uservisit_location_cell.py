@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+from commcare_connect.utils.geo import get_grid_cell
+from commcare_connect.utils.itertools import batched
+
+
+def populate_location_cell(apps, schema_editor):
+    UserVisit = apps.get_model("opportunity.UserVisit")
+    user_visits = UserVisit.objects.filter(location__isnull=False).only("id", "location")
+    for batch in batched(user_visits.iterator(chunk_size=1000), 1000):
+        for visit in batch:
+            visit.location_cell = get_grid_cell(visit.location)
+        UserVisit.objects.bulk_update(batch, ["location_cell"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0059_xform_id_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uservisit",
+            name="location_cell",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="uservisit",
+            index=models.Index(
+                fields=["opportunity", "deliver_unit", "location_cell"], name="opportunity_opportu_a6c0f5_idx"
+            ),
+        ),
+        migrations.RunPython(populate_location_cell, migrations.RunPython.noop),
+    ]
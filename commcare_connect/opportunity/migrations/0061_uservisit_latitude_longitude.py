@@ -0,0 +1,46 @@
+# Generated by Django 4.2.5 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+from commcare_connect.utils.geo import parse_location
+from commcare_connect.utils.itertools import batched
+
+
+def populate_coordinates(apps, schema_editor):
+    UserVisit = apps.get_model("opportunity.UserVisit")
+    user_visits = UserVisit.objects.filter(location__isnull=False).only("id", "location")
+    for batch in batched(user_visits.iterator(chunk_size=1000), 1000):
+        for visit in batch:
+            location = parse_location(visit.location)
+            if location:
+                visit.latitude, visit.longitude, _, visit.accuracy = location
+        UserVisit.objects.bulk_update(batch, ["latitude", "longitude", "accuracy"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0060_uservisit_location_cell"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uservisit",
+            name="accuracy",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uservisit",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uservisit",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="uservisit",
+            index=models.Index(fields=["opportunity", "latitude", "longitude"], name="opportunity_opportu_cef4af_idx"),
+        ),
+        migrations.RunPython(populate_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+UNCOUNTED_VISIT_STATUSES = ("over_limit", "trial")
+
+
+def populate_visit_counts(apps, schema_editor):
+    UserVisit = apps.get_model("opportunity.UserVisit")
+    DailyVisitCount = apps.get_model("opportunity.DailyVisitCount")
+    EntityVisitCount = apps.get_model("opportunity.EntityVisitCount")
+    user_visits = UserVisit.objects.filter(opportunity_access__isnull=False).exclude(
+        status__in=UNCOUNTED_VISIT_STATUSES
+    )
+    daily_counts = (
+        user_visits.annotate(day=TruncDate("visit_date"))
+        .values("opportunity_access_id", "deliver_unit_id", "day")
+        .annotate(count=Count("*"))
+        .order_by()
+    )
+    DailyVisitCount.objects.bulk_create(
+        (
+            DailyVisitCount(
+                opportunity_access_id=row["opportunity_access_id"],
+                deliver_unit_id=row["deliver_unit_id"],
+                visit_date=row["day"],
+                count=row["count"],
+            )
+            for row in daily_counts.iterator()
+        ),
+        batch_size=1000,
+    )
+    entity_counts = (
+        user_visits.annotate(entity=Coalesce("entity_id", Value("")))
+        .values("opportunity_access_id", "deliver_unit_id", "entity")
+        .annotate(count=Count("*"))
+        .order_by()
+    )
+    EntityVisitCount.objects.bulk_create(
+        (
+            EntityVisitCount(
+                opportunity_access_id=row["opportunity_access_id"],
+                deliver_unit_id=row["deliver_unit_id"],
+                entity_id=row["entity"],
+                count=row["count"],
+            )
+            for row in entity_counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0061_uservisit_latitude_longitude"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EntityVisitCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("count", models.IntegerField(default=0)),
+                ("entity_id", models.CharField(max_length=255)),
+                (
+                    "deliver_unit",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="opportunity.deliverunit"),
+                ),
+                (
+                    "opportunity_access",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="opportunity.opportunityaccess"),
+                ),
+            ],
+            options={
+                "unique_together": {("opportunity_access", "deliver_unit", "entity_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyVisitCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("count", models.IntegerField(default=0)),
+                ("visit_date", models.DateField()),
+                (
+                    "deliver_unit",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="opportunity.deliverunit"),
+                ),
+                (
+                    "opportunity_access",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="opportunity.opportunityaccess"),
+                ),
+            ],
+            options={
+                "unique_together": {("opportunity_access", "deliver_unit", "visit_date")},
+            },
+        ),
+        migrations.RunPython(populate_visit_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0062_visit_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlobContent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("content_hash", models.CharField(help_text="SHA-256 of the content", max_length=64, unique=True)),
+                ("content_length", models.BigIntegerField()),
+                ("storage_name", models.CharField(max_length=255)),
+                (
+                    "etag",
+                    models.CharField(
+                        blank=True, help_text="ETag of the content on CommCare HQ", max_length=255, null=True
+                    ),
+                ),
+                ("ref_count", models.IntegerField(default=0)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["etag"], name="opportunity_etag_feedb9_idx")],
+            },
+        ),
+        migrations.AddField(
+            model_name="blobmeta",
+            name="content",
+            field=models.ForeignKey(
+                blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to="opportunity.blobcontent"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+from commcare_connect.opportunity.utils.completed_work import calculate_completed_work_counts
+from commcare_connect.utils.itertools import batched
+
+
+def populate_completed_work_counts(apps, schema_editor):
+    CompletedWork = apps.get_model("opportunity.CompletedWork")
+    work_ids = CompletedWork.objects.order_by("id").values_list("id", flat=True)
+    for batch in batched(work_ids.iterator(chunk_size=1000), 1000):
+        batch_works = CompletedWork.objects.filter(id__in=batch)
+        counts = calculate_completed_work_counts(batch_works)
+        batch_works = list(batch_works.only("id"))
+        for completed_work in batch_works:
+            completed_work.completed_count, completed_work.approved_count = counts[completed_work.id]
+        CompletedWork.objects.bulk_update(batch_works, ["completed_count", "approved_count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0063_blob_content"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="completedwork",
+            name="approved_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="completedwork",
+            name="completed_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_completed_work_counts, migrations.RunPython.noop),
+    ]
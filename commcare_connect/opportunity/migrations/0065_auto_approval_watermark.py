@@ -0,0 +1,29 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0064_completed_work_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opportunity",
+            name="auto_approval_watermark",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="completedwork",
+            index=models.Index(fields=["last_modified"], name="opportunity_last_mo_e9f1a5_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="completedwork",
+            index=models.Index(fields=["status_modified_date"], name="opportunity_status__e0ff0d_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="uservisit",
+            index=models.Index(fields=["opportunity", "status_modified_date"], name="opportunity_opportu_e8a327_idx"),
+        ),
+    ]
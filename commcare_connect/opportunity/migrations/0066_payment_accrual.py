@@ -0,0 +1,73 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F
+
+from commcare_connect.utils.itertools import batched
+
+
+def create_opening_entries(apps, schema_editor):
+    """Record the payment already accrued for approved work, without changing the payment accrued of the
+    accesses, so that later changes are accrued relative to it."""
+    CompletedWork = apps.get_model("opportunity.CompletedWork")
+    PaymentAccrual = apps.get_model("opportunity.PaymentAccrual")
+    approved_works = (
+        CompletedWork.objects.filter(status="approved", approved_count__gt=0, payment_unit__amount__gt=0)
+        .annotate(amount=F("approved_count") * F("payment_unit__amount"))
+        .order_by("id")
+        .values_list("id", "opportunity_access_id", "approved_count", "amount")
+    )
+    for batch in batched(approved_works.iterator(chunk_size=1000), 1000):
+        PaymentAccrual.objects.bulk_create(
+            PaymentAccrual(
+                opportunity_access_id=access_id,
+                completed_work_id=work_id,
+                amount=amount,
+                status="approved",
+                approved_count=approved_count,
+            )
+            for work_id, access_id, approved_count, amount in batch
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0065_auto_approval_watermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentAccrual",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("amount", models.IntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                            ("over_limit", "Over Limit"),
+                            ("incomplete", "Incomplete"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("approved_count", models.IntegerField()),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "completed_work",
+                    models.ForeignKey(
+                        null=True, on_delete=django.db.models.deletion.SET_NULL, to="opportunity.completedwork"
+                    ),
+                ),
+                (
+                    "opportunity_access",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="opportunity.opportunityaccess"),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_opening_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_claimed_visits(apps, schema_editor):
+    PaymentUnit = apps.get_model("opportunity.PaymentUnit")
+    OpportunityClaimLimit = apps.get_model("opportunity.OpportunityClaimLimit")
+    claimed_visits = (
+        OpportunityClaimLimit.objects.filter(payment_unit=OuterRef("pk"))
+        .order_by()
+        .values("payment_unit")
+        .annotate(total=Sum("max_visits"))
+        .values("total")
+    )
+    PaymentUnit.objects.update(claimed_visits=Coalesce(Subquery(claimed_visits), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0066_payment_accrual"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentunit",
+            name="claimed_visits",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_claimed_visits, migrations.RunPython.noop),
+    ]
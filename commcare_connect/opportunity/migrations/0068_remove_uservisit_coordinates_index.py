@@ -0,0 +1,16 @@
+# Generated by Django 4.2.5 on 2026-10-18 06:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0067_payment_unit_claimed_visits"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="uservisit",
+            name="opportunity_opportu_cef4af_idx",
+        ),
+    ]
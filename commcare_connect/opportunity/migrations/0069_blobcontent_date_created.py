@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0068_remove_uservisit_coordinates_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blobcontent",
+            name="date_created",
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
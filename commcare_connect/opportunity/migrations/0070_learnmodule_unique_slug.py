@@ -0,0 +1,35 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:05
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_learn_modules(apps, schema_editor):
+    LearnModule = apps.get_model("opportunity.LearnModule")
+    CompletedModule = apps.get_model("opportunity.CompletedModule")
+    duplicates = (
+        LearnModule.objects.values("app_id", "slug")
+        .annotate(count=Count("id"), first_id=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        others = LearnModule.objects.filter(app_id=duplicate["app_id"], slug=duplicate["slug"]).exclude(
+            id=duplicate["first_id"]
+        )
+        CompletedModule.objects.filter(module__in=others).update(module_id=duplicate["first_id"])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0069_blobcontent_date_created"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_learn_modules, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="learnmodule",
+            unique_together={("app", "slug")},
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opportunity", "0070_learnmodule_unique_slug"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="uservisit",
+            index=models.Index(fields=["opportunity", "latitude", "longitude"], name="opportunity_opportu_cef4af_idx"),
+        ),
+    ]
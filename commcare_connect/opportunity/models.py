@@ -1,17 +1,23 @@
 import datetime
 from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import NamedTuple
 from uuid import uuid4
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Count, F, Max, Q, Sum
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.utils.translation import gettext
 
+from commcare_connect.cache import quickcache
 from commcare_connect.organization.models import Organization
 from commcare_connect.users.models import User
 from commcare_connect.utils.db import BaseModel, slugify_uniquely
+from commcare_connect.utils.geo import get_bounding_box, get_grid_cell, get_neighboring_cells, parse_location
 
 
 class CommCareApp(BaseModel):
@@ -52,6 +58,46 @@ class DeliveryType(models.Model):
         return self.name
 
 
+class OpportunityQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Annotate each opportunity with its visit and budget totals, so that a page of opportunities
+        can be rendered without a query per opportunity:
+
+        * ``total_claimed_visits``: visits claimed by all users
+        * ``total_approved_visits``: approved completed work
+        * ``total_utilised_budget``: the amount of all completed work
+        * ``active_workers``: users that have accepted the opportunity and are not suspended
+        * ``last_visit_date``: the date of the latest visit, excluding trial and over limit visits
+        """
+        claim_limits = OpportunityClaimLimit.objects.filter(
+            opportunity_claim__opportunity_access__opportunity=OuterRef("pk")
+        )
+        completed_works = CompletedWork.objects.filter(opportunity_access__opportunity=OuterRef("pk"))
+        accesses = OpportunityAccess.objects.filter(opportunity=OuterRef("pk"), accepted=True, suspended=False)
+        visits = UserVisit.objects.filter(opportunity=OuterRef("pk")).exclude(
+            status__in=[VisitValidationStatus.over_limit, VisitValidationStatus.trial]
+        )
+        return self.annotate(
+            total_claimed_visits=_aggregate_subquery(claim_limits, Sum("max_visits"), default=0),
+            total_approved_visits=_aggregate_subquery(
+                completed_works.filter(status=CompletedWorkStatus.approved), Count("id"), default=0
+            ),
+            total_utilised_budget=_aggregate_subquery(completed_works, Sum("payment_unit__amount"), default=0),
+            active_workers=_aggregate_subquery(accesses, Count("id"), default=0),
+            last_visit_date=_aggregate_subquery(visits, Max("visit_date")),
+        )
+
+
+def _aggregate_subquery(queryset, aggregate, default=None):
+    """Aggregate ``queryset``, which is filtered on an ``OuterRef``, as a scalar subquery."""
+    subquery = Subquery(
+        queryset.order_by().annotate(group=Value(1)).values("group").annotate(value=aggregate).values("value")
+    )
+    if default is not None:
+        return Coalesce(subquery, default)
+    return subquery
+
+
 class Opportunity(BaseModel):
     organization = models.ForeignKey(
         Organization,
@@ -89,15 +135,20 @@ class Opportunity(BaseModel):
     is_test = models.BooleanField(default=True)
     delivery_type = models.ForeignKey(DeliveryType, null=True, blank=True, on_delete=models.DO_NOTHING)
     managed = models.BooleanField(default=False)
+    # start of the last successful auto-approval run, see ``get_auto_approval_accesses``
+    auto_approval_watermark = models.DateTimeField(null=True, blank=True)
+
+    objects = OpportunityQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     @property
     def is_setup_complete(self):
-        if not (self.paymentunit_set.count() > 0 and self.total_budget and self.start_date and self.end_date):
+        payment_units = self.paymentunit_set.all()
+        if not (payment_units and self.total_budget and self.start_date and self.end_date):
             return False
-        for pu in self.paymentunit_set.all():
+        for pu in payment_units:
             if not (pu.max_total and pu.max_daily):
                 return False
         return True
@@ -106,56 +157,29 @@ class Opportunity(BaseModel):
     def minimum_budget_per_visit(self):
         return min(self.paymentunit_set.all().values_list("amount", flat=True))
 
+    @property
+    def budget(self) -> "OpportunityBudgetSnapshot":
+        return get_opportunity_budget_snapshot(self.id)
+
     @property
     def remaining_budget(self) -> int:
         return self.total_budget - self.claimed_budget
 
     @property
     def claimed_budget(self):
-        opp_access = OpportunityAccess.objects.filter(opportunity=self)
-        opportunity_claim = OpportunityClaim.objects.filter(opportunity_access__in=opp_access)
-        claim_limits = OpportunityClaimLimit.objects.filter(opportunity_claim__in=opportunity_claim)
-
-        payment_unit_counts = claim_limits.values("payment_unit").annotate(
-            visits_count=Sum("max_visits"), amount=F("payment_unit__amount")
-        )
-        claimed = 0
-        for count in payment_unit_counts:
-            visits_count = count["visits_count"]
-            amount = count["amount"]
-            claimed += visits_count * amount
-
-        return claimed
+        return self.budget.claimed_budget
 
     @property
     def utilised_budget(self):
-        completed_works = CompletedWork.objects.filter(opportunity_access__opportunity=self)
-        payment_unit_counts = completed_works.values("payment_unit").annotate(
-            completed_count=Count("id"), amount=F("payment_unit__amount")
-        )
-        utilised = 0
-        for payment_unit_count in payment_unit_counts:
-            completed_count = payment_unit_count["completed_count"]
-            amount = payment_unit_count["amount"]
-            utilised += completed_count * amount
-        return utilised
+        return self.budget.utilised_budget
 
     @property
     def claimed_visits(self):
-        opp_access = OpportunityAccess.objects.filter(opportunity=self)
-        opportunity_claim = OpportunityClaim.objects.filter(opportunity_access__in=opp_access)
-        used_budget = OpportunityClaimLimit.objects.filter(opportunity_claim__in=opportunity_claim).aggregate(
-            Sum("max_visits")
-        )["max_visits__sum"]
-        if used_budget is None:
-            used_budget = 0
-        return used_budget
+        return self.budget.claimed_visits
 
     @property
     def approved_visits(self):
-        return CompletedWork.objects.filter(
-            opportunity_access__opportunity=self, status=CompletedWorkStatus.approved
-        ).count()
+        return self.budget.approved_visits
 
     @property
     def number_of_users(self):
@@ -167,29 +191,67 @@ class Opportunity(BaseModel):
 
     @property
     def max_visits_per_user_new(self):
-        return self.paymentunit_set.aggregate(max_total=Sum("max_total")).get("max_total", 0)
+        return self.budget.max_visits_per_user
 
     @property
     def daily_max_visits_per_user_new(self):
-        return self.paymentunit_set.aggregate(max_daily=Sum("max_daily")).get("max_daily", 0)
+        return sum(payment_unit.max_daily for payment_unit in self.paymentunit_set.all())
 
     @property
     def budget_per_visit_new(self):
-        return self.paymentunit_set.aggregate(amount=Max("amount")).get("amount", 0)
+        return max((payment_unit.amount for payment_unit in self.paymentunit_set.all()), default=None)
 
     @property
     def budget_per_user(self):
-        payment_units = self.paymentunit_set.all()
-        budget = 0
-        for pu in payment_units:
-            budget += pu.max_total * pu.amount
-        return budget
+        return self.budget.budget_per_user
 
     @property
     def is_active(self):
         return self.active and self.end_date and self.end_date >= now().date()
 
 
+@dataclass(frozen=True)
+class OpportunityBudgetSnapshot:
+    """The budget and visit totals of an opportunity, see ``get_opportunity_budget_snapshot``."""
+
+    claimed_budget: int
+    claimed_visits: int
+    utilised_budget: int
+    approved_visits: int
+    budget_per_user: int
+    max_visits_per_user: int | None
+
+
+@quickcache(vary_on=["opportunity_id"], timeout=60 * 60)
+def get_opportunity_budget_snapshot(opportunity_id) -> OpportunityBudgetSnapshot:
+    """Calculate the budget and visit totals of an opportunity in one query per table.
+
+    The snapshot is cached, and cleared by ``clear_opportunity_budget_snapshot`` when claims, claim
+    limits, payment units or completed work of the opportunity change."""
+    claims = OpportunityClaimLimit.objects.filter(
+        opportunity_claim__opportunity_access__opportunity=opportunity_id
+    ).aggregate(
+        claimed_visits=Coalesce(Sum("max_visits"), 0),
+        claimed_budget=Coalesce(Sum(F("max_visits") * F("payment_unit__amount")), 0),
+    )
+    completed_works = CompletedWork.objects.filter(opportunity_access__opportunity=opportunity_id).aggregate(
+        utilised_budget=Coalesce(Sum("payment_unit__amount"), 0),
+        approved_visits=Count("id", filter=Q(status=CompletedWorkStatus.approved)),
+    )
+    payment_units = PaymentUnit.objects.filter(opportunity=opportunity_id).aggregate(
+        budget_per_user=Coalesce(Sum(F("max_total") * F("amount")), 0),
+        max_visits_per_user=Sum("max_total"),
+    )
+    return OpportunityBudgetSnapshot(**claims, **completed_works, **payment_units)
+
+
+def clear_opportunity_budget_snapshot(opportunity_id):
+    """Clear the snapshot now and again once the transaction is committed so that a snapshot
+    cached from the old state in the meantime is not reused."""
+    get_opportunity_budget_snapshot.clear(opportunity_id)
+    transaction.on_commit(lambda: get_opportunity_budget_snapshot.clear(opportunity_id))
+
+
 class OpportunityVerificationFlags(models.Model):
     opportunity = models.OneToOneField(Opportunity, on_delete=models.CASCADE)
     duration = models.PositiveIntegerField(default=1)
@@ -212,12 +274,15 @@ class LearnModule(models.Model):
     description = models.TextField()
     time_estimate = models.IntegerField(help_text="Estimated hours to complete the module")
 
+    class Meta:
+        unique_together = [("app", "slug")]
+
     def __str__(self):
         return self.name
 
 
 class XFormBaseModel(models.Model):
-    xform_id = models.CharField(max_length=50)
+    xform_id = models.CharField(max_length=50, db_index=True)
     app_build_id = models.CharField(max_length=50, null=True, blank=True)
     app_build_version = models.IntegerField(null=True, blank=True)
 
@@ -354,6 +419,9 @@ class PaymentUnit(models.Model):
         blank=True,
         null=True,
     )
+    # sum of max_visits of the claim limits of this payment unit, maintained by signals in
+    # ``opportunity.signals`` and used to reserve visits in ``OpportunityClaimLimit.create_claim_limits``
+    claimed_visits = models.IntegerField(default=0)
 
 
 class DeliverUnit(models.Model):
@@ -423,6 +491,9 @@ class CompletedWorkStatus(models.TextChoices):
     incomplete = "incomplete", gettext("Incomplete")
 
 
+COMPLETED_WORK_COUNT_FIELDS = ("completed_count", "approved_count")
+
+
 class CompletedWork(models.Model):
     opportunity_access = models.ForeignKey(OpportunityAccess, on_delete=models.CASCADE)
     payment_unit = models.ForeignKey(PaymentUnit, on_delete=models.DO_NOTHING)
@@ -434,6 +505,13 @@ class CompletedWork(models.Model):
     entity_name = models.CharField(max_length=255, null=True, blank=True)
     reason = models.CharField(max_length=300, null=True, blank=True)
     status_modified_date = models.DateTimeField(null=True)
+    # number of completions of this work, including duplicate submissions, and the number of those
+    # that are approved. Kept up to date by ``update_completed_work_counts``.
+    completed_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["last_modified"]), models.Index(fields=["status_modified_date"])]
 
     def __init__(self, *args, **kwargs):
         self.status = CompletedWorkStatus.incomplete
@@ -446,19 +524,42 @@ class CompletedWork(models.Model):
                 self.status_modified_date = now()
         super().__setattr__(name, value)
 
-    # TODO: add caching on this property
-    @property
-    def completed_count(self):
-        """Returns the no of completion of this work. Includes duplicate submissions."""
-        visits = self.uservisit_set.values_list("deliver_unit_id", flat=True)
-        return self.calculate_completed(visits)
-
-    @property
-    def approved_count(self):
-        visits = self.uservisit_set.filter(status=VisitValidationStatus.approved).values_list(
-            "deliver_unit_id", flat=True
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get("update_fields") is None:
+            # the counts are only written by ``update_counts``, so that saving an instance
+            # loaded before visits were added doesn't write back stale counts
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COMPLETED_WORK_COUNT_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding or self.payable_amount:
+                accrue_payments([self])
+
+    def get_counts(self) -> tuple[int, int]:
+        """Calculate the completed and approved counts from the work's visits. The counts of the
+        completed works for child payment units must already be up to date."""
+        visits = list(self.uservisit_set.values_list("deliver_unit_id", "status"))
+        completed_count = self.calculate_completed([deliver_unit_id for deliver_unit_id, _ in visits])
+        approved_count = self.calculate_completed(
+            [deliver_unit_id for deliver_unit_id, status in visits if status == VisitValidationStatus.approved],
+            approved=True,
         )
-        return self.calculate_completed(visits, approved=True)
+        return completed_count, approved_count
+
+    def update_counts(self):
+        with transaction.atomic():
+            # lock the work so that concurrent recounts are serialized and each sees the visits
+            # committed by the others
+            list(CompletedWork.objects.select_for_update().filter(pk=self.pk).values_list("pk"))
+            self.completed_count, self.approved_count = self.get_counts()
+            CompletedWork.objects.filter(pk=self.pk).update(
+                completed_count=self.completed_count, approved_count=self.approved_count
+            )
+            accrue_payments([self])
 
     def calculate_completed(self, visits, approved=False):
         unit_counts = Counter(visits)
@@ -467,28 +568,15 @@ class CompletedWork(models.Model):
             du["id"] for du in filter(lambda du: not du.get("optional", False), deliver_units)
         )
         optional_deliver_units = list(du["id"] for du in filter(lambda du: du.get("optional", False), deliver_units))
-        # NOTE: The min unit count is the completed required deliver units for an entity_id
-        number_completed = min(unit_counts[deliver_id] for deliver_id in required_deliver_units)
-        if optional_deliver_units:
-            # The sum calculates the number of optional deliver units completed and to process
-            # duplicates with extra optional deliver units
-            optional_completed = sum(unit_counts[deliver_id] for deliver_id in optional_deliver_units)
-            number_completed = min(number_completed, optional_completed)
+        child_completed_work_count = None
         child_payment_units = self.payment_unit.child_payment_units.all()
         if child_payment_units:
-            child_completed_works = CompletedWork.objects.filter(
+            child_completed_work_count = CompletedWork.objects.filter(
                 opportunity_access=self.opportunity_access,
                 payment_unit__in=child_payment_units,
                 entity_id=self.entity_id,
-            )
-            child_completed_work_count = 0
-            for completed_work in child_completed_works:
-                if approved:
-                    child_completed_work_count += completed_work.approved_count
-                else:
-                    child_completed_work_count += completed_work.completed_count
-            number_completed = min(number_completed, child_completed_work_count)
-        return number_completed
+            ).aggregate(count=Coalesce(Sum("approved_count" if approved else "completed_count"), 0))["count"]
+        return count_completed(unit_counts, required_deliver_units, optional_deliver_units, child_completed_work_count)
 
     @property
     def completed(self):
@@ -499,6 +587,11 @@ class CompletedWork(models.Model):
         """Returns the total payment accrued for this completed work. Includes duplicates"""
         return self.approved_count * self.payment_unit.amount
 
+    @property
+    def payable_amount(self):
+        """The payment accrued for this work once it is approved, and nothing before then"""
+        return self.payment_accrued if self.status == CompletedWorkStatus.approved else 0
+
     @property
     def flags(self):
         visits = self.uservisit_set.exclude(status=VisitValidationStatus.approved).values_list(
@@ -518,6 +611,139 @@ class CompletedWork(models.Model):
         return visit.visit_date if visit else None
 
 
+def count_completed(unit_counts, required_deliver_units, optional_deliver_units, child_completed=None):
+    """Count the completions of a payment unit from the number of visits to each of its deliver units
+    and, if it has child payment units, the number of completions of those."""
+    # NOTE: The min unit count is the completed required deliver units for an entity_id
+    number_completed = min((unit_counts[deliver_id] for deliver_id in required_deliver_units), default=0)
+    if optional_deliver_units:
+        # The sum calculates the number of optional deliver units completed and to process
+        # duplicates with extra optional deliver units
+        optional_completed = sum(unit_counts[deliver_id] for deliver_id in optional_deliver_units)
+        number_completed = min(number_completed, optional_completed)
+    if child_completed is not None:
+        number_completed = min(number_completed, child_completed)
+    return number_completed
+
+
+def get_payment_unit_ancestors(payment_unit_ids) -> dict[int, list[int]]:
+    """Map each of the payment units to its ancestors, nearest first, in a single recursive query."""
+    table = PaymentUnit._meta.db_table
+    sql = f"""
+        WITH RECURSIVE ancestors(payment_unit_id, ancestor_id, depth, path) AS (
+            SELECT id, parent_payment_unit_id, 1, ARRAY[id]
+            FROM {table}
+            WHERE id = ANY(%s) AND parent_payment_unit_id IS NOT NULL
+          UNION ALL
+            SELECT a.payment_unit_id, p.parent_payment_unit_id, a.depth + 1, a.path || p.id
+            FROM ancestors a JOIN {table} p ON p.id = a.ancestor_id
+            WHERE p.parent_payment_unit_id IS NOT NULL AND NOT p.parent_payment_unit_id = ANY(a.path)
+        )
+        SELECT payment_unit_id, ancestor_id FROM ancestors ORDER BY payment_unit_id, depth
+    """
+    ancestors = defaultdict(list)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(payment_unit_ids)])
+        for payment_unit_id, ancestor_id in cursor.fetchall():
+            ancestors[payment_unit_id].append(ancestor_id)
+    return ancestors
+
+
+def update_completed_work_counts(completed_works):
+    """Recalculate the counts of the completed works, and then of the completed works for the same
+    user and entity that belong to any of their ancestor payment units, nearest first."""
+    completed_works = list(completed_works)
+    if not completed_works:
+        return
+    for completed_work in completed_works:
+        completed_work.update_counts()
+
+    ancestors = get_payment_unit_ancestors({completed_work.payment_unit_id for completed_work in completed_works})
+    # the greatest distance from an updated payment unit, so that each ancestor is updated after all
+    # of its descendants
+    ancestor_depths = {}
+    ancestor_keys = set()
+    for completed_work in completed_works:
+        for depth, ancestor_id in enumerate(ancestors[completed_work.payment_unit_id]):
+            ancestor_depths[ancestor_id] = max(depth, ancestor_depths.get(ancestor_id, 0))
+            ancestor_keys.add((completed_work.opportunity_access_id, completed_work.entity_id, ancestor_id))
+    if not ancestor_keys:
+        return
+    ancestor_works = [
+        completed_work
+        for completed_work in CompletedWork.objects.filter(
+            opportunity_access_id__in={access_id for access_id, _, _ in ancestor_keys},
+            payment_unit_id__in=ancestor_depths,
+        ).select_related("payment_unit")
+        if (completed_work.opportunity_access_id, completed_work.entity_id, completed_work.payment_unit_id)
+        in ancestor_keys
+    ]
+    for completed_work in sorted(ancestor_works, key=lambda work: ancestor_depths[work.payment_unit_id]):
+        completed_work.update_counts()
+
+
+class PaymentAccrual(models.Model):
+    """An append-only ledger of changes to the payment accrued for completed work. The ``payment_accrued``
+    of an access is the sum of the amounts of its entries. Entries are written by ``accrue_payments``, and
+    are kept when their completed work is deleted, so payments are reversed by a new entry."""
+
+    opportunity_access = models.ForeignKey(OpportunityAccess, on_delete=models.CASCADE)
+    completed_work = models.ForeignKey(CompletedWork, on_delete=models.SET_NULL, null=True)
+    amount = models.IntegerField()
+    # the state of the completed work that resulted in this change
+    status = models.CharField(max_length=50, choices=CompletedWorkStatus.choices)
+    approved_count = models.IntegerField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+
+def accrue_payments(completed_works):
+    """Record the changes to the payable amount of the completed works since their last ledger entries,
+    and add them to the payment accrued of their accesses.
+
+    Only the given completed works are read, so the cost does not depend on the rest of the accesses'
+    work. Call whenever the status or approved count of completed work changes, after saving the change.
+    The payable amounts are read from the locked rows rather than the given instances, which may be stale.
+    Returns the new entries."""
+    completed_work_ids = {completed_work.pk for completed_work in completed_works}
+    if not completed_work_ids:
+        return []
+    with transaction.atomic():
+        # serialize concurrent changes to the same completed work
+        locked_works = list(
+            CompletedWork.objects.select_for_update(of=("self",))
+            .filter(pk__in=completed_work_ids)
+            .values("pk", "opportunity_access_id", "status", "approved_count", "payment_unit__amount")
+        )
+        accrued = dict(
+            PaymentAccrual.objects.filter(completed_work__in=completed_work_ids)
+            .values("completed_work")
+            .annotate(total=Sum("amount"))
+            .values_list("completed_work", "total")
+        )
+        entries = []
+        access_deltas = defaultdict(int)
+        for work in locked_works:
+            payable_amount = 0
+            if work["status"] == CompletedWorkStatus.approved:
+                payable_amount = work["approved_count"] * work["payment_unit__amount"]
+            amount = payable_amount - accrued.get(work["pk"], 0)
+            if amount:
+                entries.append(
+                    PaymentAccrual(
+                        opportunity_access_id=work["opportunity_access_id"],
+                        completed_work_id=work["pk"],
+                        amount=amount,
+                        status=work["status"],
+                        approved_count=work["approved_count"],
+                    )
+                )
+                access_deltas[work["opportunity_access_id"]] += amount
+        PaymentAccrual.objects.bulk_create(entries)
+        for access_id, amount in access_deltas.items():
+            OpportunityAccess.objects.filter(pk=access_id).update(payment_accrued=F("payment_accrued") + amount)
+    return entries
+
+
 class VisitReviewStatus(models.TextChoices):
     pending = "pending", gettext("Pending Review")
     agree = "agree", gettext("Agree")
@@ -544,6 +770,12 @@ class UserVisit(XFormBaseModel):
     form_json = models.JSONField()
     reason = models.CharField(max_length=300, null=True, blank=True)
     location = models.CharField(null=True)
+    # parsed from location
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    accuracy = models.FloatField(null=True, blank=True)
+    # grid cell of the location, used to find nearby visits (see commcare_connect.utils.geo)
+    location_cell = models.CharField(max_length=50, null=True, blank=True)
     flagged = models.BooleanField(default=False)
     flag_reason = models.JSONField(null=True, blank=True)
     completed_work = models.ForeignKey(CompletedWork, on_delete=models.DO_NOTHING, null=True, blank=True)
@@ -554,11 +786,49 @@ class UserVisit(XFormBaseModel):
     review_created_on = models.DateTimeField(blank=True, null=True)
     justification = models.CharField(max_length=300, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["opportunity", "latitude", "longitude"]),
+            models.Index(fields=["opportunity", "deliver_unit", "location_cell"]),
+            models.Index(fields=["opportunity", "status_modified_date"]),
+        ]
+
     def __init__(self, *args, **kwargs):
         self.status = VisitValidationStatus.pending
         self.status_modified_date = now()
         super().__init__(*args, **kwargs)
 
+    def save(self, *args, **kwargs):
+        self.update_location_fields()
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    UserVisit.objects.filter(pk=self.pk).values(*VISIT_COUNT_FIELDS, "completed_work_id").first()
+                )
+            previous_key = previous and get_visit_count_key(**{field: previous[field] for field in VISIT_COUNT_FIELDS})
+            super().save(*args, **kwargs)
+            update_visit_counts([(previous_key, self.visit_count_key)])
+            if previous is None or any(
+                previous[field] != getattr(self, field) for field in ("status", "deliver_unit_id", "completed_work_id")
+            ):
+                completed_works = [self.completed_work] if self.completed_work_id else []
+                if previous and previous["completed_work_id"] not in (None, self.completed_work_id):
+                    completed_works.extend(CompletedWork.objects.filter(pk=previous["completed_work_id"]))
+                update_completed_work_counts(completed_works)
+
+    @property
+    def visit_count_key(self):
+        return get_visit_count_key(**{field: getattr(self, field) for field in VISIT_COUNT_FIELDS})
+
+    def update_location_fields(self):
+        """Update the fields derived from ``location``. Call before ``bulk_update`` / ``bulk_create``."""
+        location = parse_location(self.location)
+        self.latitude = location.latitude if location else None
+        self.longitude = location.longitude if location else None
+        self.accuracy = location.accuracy if location else None
+        self.location_cell = get_grid_cell(self.location)
+
     def __setattr__(self, name, value):
         if name == "status":
             if getattr(self, "status", None) != value:
@@ -570,6 +840,120 @@ class UserVisit(XFormBaseModel):
         return BlobMeta.objects.filter(parent_id=self.xform_id, content_type__startswith="image/")
 
 
+# visits with these statuses don't count towards the visit limits
+UNCOUNTED_VISIT_STATUSES = (VisitValidationStatus.over_limit, VisitValidationStatus.trial)
+VISIT_COUNT_FIELDS = ("opportunity_access_id", "deliver_unit_id", "visit_date", "entity_id", "status")
+
+
+def filter_nearby_visits(user_visits, latitude: float, longitude: float, radius: float):
+    """Filter visits to those that may be within ``radius`` meters of the given point, using the
+    grid cells of the visits. Exact distances still need to be checked by the caller.
+
+    Falls back to a bounding box on the coordinates when the area covers too many grid cells."""
+    cells = get_neighboring_cells(latitude, longitude, radius)
+    if cells is not None:
+        return user_visits.filter(location_cell__in=cells)
+    min_lat, max_lat, min_lon, max_lon = get_bounding_box(latitude, longitude, radius)
+    return user_visits.filter(latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon))
+
+
+class VisitCountKey(NamedTuple):
+    opportunity_access_id: int
+    deliver_unit_id: int
+    visit_date: datetime.date
+    entity_id: str
+
+
+def get_visit_count_key(opportunity_access_id, deliver_unit_id, visit_date, entity_id, status) -> VisitCountKey | None:
+    """The counters a visit is included in, or ``None`` if the visit does not count towards the visit limits."""
+    if opportunity_access_id is None or status in UNCOUNTED_VISIT_STATUSES:
+        return None
+    return VisitCountKey(opportunity_access_id, deliver_unit_id, _get_local_date(visit_date), entity_id or "")
+
+
+def _get_local_date(value: datetime.datetime) -> datetime.date:
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def get_visit_counts(opportunity_access_id, deliver_unit_id, visit_date, entity_id) -> dict[str, int]:
+    """Return the daily, total and per-entity number of visits that count towards the visit limits."""
+    counts = DailyVisitCount.objects.filter(
+        opportunity_access_id=opportunity_access_id, deliver_unit_id=deliver_unit_id
+    ).aggregate(total=Sum("count"), daily=Sum("count", filter=Q(visit_date=_get_local_date(visit_date))))
+    entity = (
+        EntityVisitCount.objects.filter(
+            opportunity_access_id=opportunity_access_id, deliver_unit_id=deliver_unit_id, entity_id=entity_id or ""
+        )
+        .values_list("count", flat=True)
+        .first()
+    )
+    return {"daily": counts["daily"] or 0, "total": counts["total"] or 0, "entity": entity or 0}
+
+
+def update_visit_counts(changes: list[tuple[VisitCountKey | None, VisitCountKey | None]]):
+    """Update the visit counters for a list of ``(previous_key, new_key)`` visit changes."""
+    daily = Counter()
+    entity = Counter()
+    for previous_key, new_key in changes:
+        if previous_key == new_key:
+            continue
+        for key, delta in ((previous_key, -1), (new_key, 1)):
+            if key is not None:
+                daily[(key.opportunity_access_id, key.deliver_unit_id, key.visit_date)] += delta
+                entity[(key.opportunity_access_id, key.deliver_unit_id, key.entity_id)] += delta
+
+    for (access_id, deliver_unit_id, visit_date), delta in daily.items():
+        DailyVisitCount.increment(
+            delta, opportunity_access_id=access_id, deliver_unit_id=deliver_unit_id, visit_date=visit_date
+        )
+    for (access_id, deliver_unit_id, entity_id), delta in entity.items():
+        EntityVisitCount.increment(
+            delta, opportunity_access_id=access_id, deliver_unit_id=deliver_unit_id, entity_id=entity_id
+        )
+
+
+class VisitCount(models.Model):
+    opportunity_access = models.ForeignKey(OpportunityAccess, on_delete=models.CASCADE)
+    deliver_unit = models.ForeignKey(DeliverUnit, on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def increment(cls, delta, **keys):
+        if not delta or cls.objects.filter(**keys).update(count=F("count") + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(count=delta, **keys)
+        except IntegrityError:
+            # created concurrently
+            cls.objects.filter(**keys).update(count=F("count") + delta)
+
+
+class DailyVisitCount(VisitCount):
+    """Number of a user's visits for a deliver unit on a day that count towards the visit limits.
+    Maintained by ``UserVisit.save`` and ``update_visit_counts``."""
+
+    visit_date = models.DateField()
+
+    class Meta:
+        unique_together = ("opportunity_access", "deliver_unit", "visit_date")
+
+
+class EntityVisitCount(VisitCount):
+    """Number of a user's visits for a deliver unit and entity that count towards the visit limits.
+    Maintained by ``UserVisit.save`` and ``update_visit_counts``."""
+
+    entity_id = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ("opportunity_access", "deliver_unit", "entity_id")
+
+
 class OpportunityClaim(models.Model):
     opportunity_access = models.OneToOneField(OpportunityAccess, on_delete=models.CASCADE)
     # to be removed
@@ -589,29 +973,64 @@ class OpportunityClaimLimit(models.Model):
         ]
 
     @classmethod
-    def create_claim_limits(cls, opportunity: Opportunity, claim: OpportunityClaim):
-        claim_limits_by_payment_unit = defaultdict(list)
-        claim_limits = OpportunityClaimLimit.objects.filter(
-            opportunity_claim__opportunity_access__opportunity=opportunity
-        )
-        for claim_limit in claim_limits:
-            claim_limits_by_payment_unit[claim_limit.payment_unit].append(claim_limit)
-
-        for payment_unit in opportunity.paymentunit_set.all():
-            claim_limits = claim_limits_by_payment_unit.get(payment_unit, [])
-            total_claimed_visits = 0
-            for claim_limit in claim_limits:
-                total_claimed_visits += claim_limit.max_visits
-
-            remaining = (payment_unit.max_total) * opportunity.number_of_users - total_claimed_visits
-            if remaining < 1:
-                # claimed limit exceeded for this paymentunit
-                continue
-            OpportunityClaimLimit.objects.get_or_create(
-                opportunity_claim=claim,
-                payment_unit=payment_unit,
-                defaults={"max_visits": min(remaining, payment_unit.max_total)},
+    def create_claim_limits(cls, opportunity: Opportunity, claim: OpportunityClaim) -> list["OpportunityClaimLimit"]:
+        """Reserve visits of each payment unit of the opportunity for the claim and return the new claim limits.
+
+        The payment units are locked while their ``claimed_visits`` are checked and updated, so that
+        simultaneous claims cannot reserve more visits than the budget allows."""
+        claim_limits = []
+        with transaction.atomic():
+            payment_units = list(
+                PaymentUnit.objects.select_for_update().filter(opportunity=opportunity).order_by("pk")
             )
+            budget_per_user = sum(payment_unit.max_total * payment_unit.amount for payment_unit in payment_units)
+            if not budget_per_user:
+                return claim_limits
+            number_of_users = opportunity.total_budget / budget_per_user
+            for payment_unit in payment_units:
+                remaining = int(payment_unit.max_total * number_of_users) - payment_unit.claimed_visits
+                if remaining < 1:
+                    # claimed limit exceeded for this paymentunit
+                    continue
+                claim_limit, created = OpportunityClaimLimit.objects.get_or_create(
+                    opportunity_claim=claim,
+                    payment_unit=payment_unit,
+                    defaults={"max_visits": min(remaining, payment_unit.max_total)},
+                )
+                if created:
+                    claim_limits.append(claim_limit)
+        return claim_limits
+
+
+def update_payment_unit_claimed_visits(payment_unit_ids):
+    """Recalculate ``PaymentUnit.claimed_visits`` from the claim limits of the payment units."""
+    claimed_visits = (
+        OpportunityClaimLimit.objects.filter(payment_unit=OuterRef("pk"))
+        .order_by()
+        .values("payment_unit")
+        .annotate(total=Sum("max_visits"))
+        .values("total")
+    )
+    PaymentUnit.objects.filter(pk__in=payment_unit_ids).update(claimed_visits=Coalesce(Subquery(claimed_visits), 0))
+
+
+class BlobContent(models.Model):
+    """Attachment content, stored once for all attachments with the same content.
+
+    ``ref_count`` is the number of ``BlobMeta`` rows referencing the content and is maintained
+    by signals in ``opportunity.signals``. Content that is no longer referenced is removed by the
+    ``delete_unreferenced_blobs`` command, which skips recently created content that may not have
+    been referenced yet."""
+
+    content_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the content")
+    content_length = models.BigIntegerField()
+    storage_name = models.CharField(max_length=255)
+    etag = models.CharField(max_length=255, null=True, blank=True, help_text="ETag of the content on CommCare HQ")
+    ref_count = models.IntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["etag"])]
 
 
 class BlobMeta(models.Model):
@@ -623,6 +1042,8 @@ class BlobMeta(models.Model):
     blob_id = models.CharField(max_length=255, default=uuid4)
     content_length = models.IntegerField()
     content_type = models.CharField(max_length=255, null=True)
+    # null for attachments stored under blob_id before content was deduplicated
+    content = models.ForeignKey(BlobContent, on_delete=models.PROTECT, null=True, blank=True)
 
     class Meta:
         unique_together = [
@@ -630,6 +1051,10 @@ class BlobMeta(models.Model):
         ]
         indexes = [models.Index(fields=["blob_id"])]
 
+    @property
+    def storage_name(self):
+        return self.content.storage_name if self.content_id else self.blob_id
+
 
 class UserInviteStatus(models.TextChoices):
     sms_delivered = "sms_delivered", gettext("SMS Delivered")
@@ -0,0 +1,75 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from commcare_connect.opportunity.models import (
+    BlobContent,
+    BlobMeta,
+    CompletedWork,
+    OpportunityAccess,
+    OpportunityClaim,
+    OpportunityClaimLimit,
+    PaymentUnit,
+    clear_opportunity_budget_snapshot,
+    update_payment_unit_claimed_visits,
+)
+
+
+@receiver(post_save, sender=BlobMeta)
+def add_blob_content_reference(sender, instance, created, **kwargs):
+    if created and instance.content_id:
+        BlobContent.objects.filter(pk=instance.content_id).update(ref_count=F("ref_count") + 1)
+
+
+@receiver(post_delete, sender=BlobMeta)
+def remove_blob_content_reference(sender, instance, **kwargs):
+    if instance.content_id:
+        BlobContent.objects.filter(pk=instance.content_id).update(ref_count=F("ref_count") - 1)
+
+
+@receiver(post_save, sender=OpportunityClaimLimit)
+def add_payment_unit_claimed_visits(sender, instance, created, **kwargs):
+    if created:
+        PaymentUnit.objects.filter(pk=instance.payment_unit_id).update(
+            claimed_visits=F("claimed_visits") + instance.max_visits
+        )
+    else:
+        update_payment_unit_claimed_visits([instance.payment_unit_id])
+
+
+@receiver(post_delete, sender=OpportunityClaimLimit)
+def remove_payment_unit_claimed_visits(sender, instance, **kwargs):
+    PaymentUnit.objects.filter(pk=instance.payment_unit_id).update(
+        claimed_visits=F("claimed_visits") - instance.max_visits
+    )
+
+
+@receiver([post_save, post_delete], sender=PaymentUnit)
+def clear_payment_unit_budget_snapshot(sender, instance, **kwargs):
+    clear_opportunity_budget_snapshot(instance.opportunity_id)
+
+
+@receiver([post_save, post_delete], sender=OpportunityClaimLimit)
+@receiver([post_save, post_delete], sender=CompletedWork)
+def clear_payment_unit_work_budget_snapshot(sender, instance, **kwargs):
+    _clear_related_budget_snapshot(instance, "payment_unit", PaymentUnit)
+
+
+@receiver([post_save, post_delete], sender=OpportunityClaim)
+def clear_claim_budget_snapshot(sender, instance, **kwargs):
+    _clear_related_budget_snapshot(instance, "opportunity_access", OpportunityAccess)
+
+
+def _clear_related_budget_snapshot(instance, field_name, model):
+    """Clear the budget snapshot of the opportunity of the instance's related object, using the
+    related object if it is already loaded and otherwise only querying its opportunity id."""
+    if getattr(type(instance), field_name).is_cached(instance):
+        opportunity_id = getattr(instance, field_name).opportunity_id
+    else:
+        opportunity_id = (
+            model.objects.filter(pk=getattr(instance, f"{field_name}_id"))
+            .values_list("opportunity_id", flat=True)
+            .first()
+        )
+    if opportunity_id:
+        clear_opportunity_budget_snapshot(opportunity_id)
@@ -1,9 +1,19 @@
+import csv
 import datetime
+import hashlib
+import io
 import logging
+import tempfile
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
 
 import httpx
 from allauth.utils import build_absolute_uri
+from celery import chord
 from django.conf import settings
+from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.db import transaction
@@ -22,11 +32,13 @@ from commcare_connect.opportunity.export import (
     export_user_status_table,
     export_user_visit_data,
     export_work_status_table,
+    get_user_visit_export_rows,
 )
 from commcare_connect.opportunity.forms import DateRanges
 from commcare_connect.opportunity.models import (
+    BlobContent,
     BlobMeta,
-    CompletedWorkStatus,
+    CompletedWork,
     DeliverUnit,
     LearnModule,
     Opportunity,
@@ -38,14 +50,31 @@ from commcare_connect.opportunity.models import (
     UserVisit,
     VisitValidationStatus,
 )
-from commcare_connect.opportunity.utils.completed_work import update_status
+from commcare_connect.opportunity.utils.completed_work import (
+    get_auto_approval_accesses,
+    recalculate_completed_work_counts,
+    update_opportunity_status,
+)
 from commcare_connect.users.models import User
+from commcare_connect.utils import metrics
+from commcare_connect.utils.commcarehq_api import get_commcarehq_client
 from commcare_connect.utils.datetime import is_date_before
+from commcare_connect.utils.itertools import batched
 from commcare_connect.utils.sms import send_sms
 from config import celery_app
 
 logger = logging.getLogger(__name__)
 
+ATTACHMENT_DOWNLOAD_WORKERS = 4
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+# attachments larger than this are written to disk while they are downloaded
+ATTACHMENT_SPOOL_SIZE = 1024 * 1024
+# size above which CSV exports are written to disk rather than kept in memory
+EXPORT_SPOOL_SIZE = 10 * 1024 * 1024
+# number of accesses auto-approved by each subtask of bulk_approve_completed_work
+BULK_APPROVE_CHUNK_SIZE = 200
+BULK_APPROVE_CHUNK_METRIC = "opportunity.bulk_approve.chunk.duration"
+
 
 @celery_app.task()
 def create_learn_modules_and_deliver_units(opportunity_id):
@@ -138,11 +167,15 @@ def invite_user(user_id, opportunity_access_id):
 def generate_visit_export(opportunity_id: int, date_range: str, status: list[str], export_format: str, flatten: bool):
     opportunity = Opportunity.objects.get(id=opportunity_id)
     logger.info(f"Export for {opportunity.name} with date range {date_range} and status {','.join(status)}")
-    dataset = export_user_visit_data(
-        opportunity, DateRanges(date_range), [VisitValidationStatus(s) for s in status], flatten
-    )
+    date_range = DateRanges(date_range)
+    status = [VisitValidationStatus(s) for s in status]
     export_tmp_name = f"{now().isoformat()}_{opportunity.name}_visit_export.{export_format}"
-    save_export(dataset, export_tmp_name, export_format)
+    if export_format == "csv":
+        headers, rows = get_user_visit_export_rows(opportunity, date_range, status, flatten)
+        save_csv_export(headers, rows, export_tmp_name)
+    else:
+        dataset = export_user_visit_data(opportunity, date_range, status, flatten)
+        save_export(dataset, export_tmp_name, export_format)
     return export_tmp_name
 
 
@@ -180,6 +213,20 @@ def save_export(dataset: Dataset, file_name: str, export_format: str):
     default_storage.save(file_name, ContentFile(content))
 
 
+def save_csv_export(headers: list[str], rows: Iterable[list], file_name: str):
+    """Write the rows to a CSV file as they are iterated and save it to the default storage."""
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as file:
+        text_file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        writer = csv.writer(text_file)
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
+        text_file.flush()
+        text_file.detach()
+        file.seek(0)
+        default_storage.save(file_name, File(file))
+
+
 @celery_app.task()
 def send_notification_inactive_users():
     opportunity_accesses = OpportunityAccess.objects.filter(
@@ -284,28 +331,173 @@ def send_sms_task(user_ids: list[int], body: str):
 
 @celery_app.task()
 def download_user_visit_attachments(user_visit_id: id):
-    user_visit = UserVisit.objects.get(id=user_visit_id)
+    """Download the attachments of a visit's form from CommCare HQ.
+
+    Attachment content is deduplicated by its hash (see ``BlobContent``). Before downloading an
+    attachment its ETag is fetched with a HEAD request, and the download is skipped if content
+    with the same ETag has already been stored."""
+    user_visit = UserVisit.objects.select_related("opportunity__api_key__user", "opportunity__deliver_app").get(
+        id=user_visit_id
+    )
     api_key = user_visit.opportunity.api_key
-    blobs = user_visit.form_json.get("attachments", {})
     domain = user_visit.opportunity.deliver_app.cc_domain
     form_id = user_visit.xform_id
-    for name, blob in blobs.items():
-        if name == "form.xml":
-            continue
-        url = f"{settings.COMMCARE_HQ_URL}/a/{domain}/api/form/attachment/{user_visit.xform_id}/{name}"
-
-        with transaction.atomic():
-            blob_meta, created = BlobMeta.objects.get_or_create(
-                name=name, parent_id=form_id, content_length=blob["length"], content_type=blob["content_type"]
+    existing = set(BlobMeta.objects.filter(parent_id=form_id).values_list("name", flat=True))
+    blobs = {
+        name: blob
+        for name, blob in user_visit.form_json.get("attachments", {}).items()
+        if name != "form.xml" and name not in existing
+    }
+    if not blobs:
+        return
+
+    headers = {"Authorization": f"ApiKey {api_key.user.email}:{api_key.api_key}"}
+    urls = {name: f"{settings.COMMCARE_HQ_URL}/a/{domain}/api/form/attachment/{form_id}/{name}" for name in blobs}
+    downloads = {}
+    try:
+        with ThreadPoolExecutor(max_workers=min(ATTACHMENT_DOWNLOAD_WORKERS, len(blobs))) as executor:
+            etags, _ = _map_concurrently(executor, lambda name: _get_attachment_etag(urls[name], headers), blobs)
+            stored = set()
+            contents = _get_blob_contents_by_etag(etags.values())
+            for name, etag in etags.items():
+                content = contents.get(etag)
+                if content and content.content_length == blobs[name]["length"]:
+                    if _create_blob_meta(name, form_id, blobs[name], content.pk):
+                        stored.add(name)
+
+            downloads, errors = _map_concurrently(
+                executor,
+                lambda name: _download_attachment(urls[name], headers),
+                [name for name in blobs if name not in stored],
             )
-            if not created:
-                # attachment already exists
-                continue
-            response = httpx.get(
-                url,
-                headers={"Authorization": f"ApiKey {api_key.user.email}:{api_key.api_key}"},
+            content_ids = dict(
+                BlobContent.objects.filter(
+                    content_hash__in=[download.content_hash for download in downloads.values()]
+                ).values_list("content_hash", "pk")
             )
-            default_storage.save(str(blob_meta.blob_id), ContentFile(response.content, name))
+            # store each new content once
+            new_contents = {
+                download.content_hash: name
+                for name, download in downloads.items()
+                if download.content_hash not in content_ids
+            }
+            storage_names, save_errors = _map_concurrently(
+                executor,
+                lambda content_hash: _save_blob_content(downloads[new_contents[content_hash]]),
+                new_contents,
+            )
+            errors.extend(save_errors)
+
+        for content_hash, storage_name in storage_names.items():
+            name = new_contents[content_hash]
+            content_ids[content_hash] = _get_or_create_blob_content(downloads[name], storage_name, etags.get(name))
+        for name, download in downloads.items():
+            content_hash = download.content_hash
+            if content_hash in content_ids and not _create_blob_meta(
+                name, form_id, blobs[name], content_ids[content_hash]
+            ):
+                # the content was deleted after it was looked up, so store it again
+                download.file.seek(0)
+                storage_name = _save_blob_content(download)
+                content_ids[content_hash] = _get_or_create_blob_content(download, storage_name, etags.get(name))
+                _create_blob_meta(name, form_id, blobs[name], content_ids[content_hash])
+    finally:
+        for download in downloads.values():
+            download.file.close()
+    if errors:
+        raise errors[0]
+
+
+def _map_concurrently(executor, func, items):
+    """Call ``func`` for each item using the executor, returning a mapping of item to result and a
+    list of the HTTP errors raised."""
+    futures = {executor.submit(func, item): item for item in items}
+    results = {}
+    errors = []
+    for future in as_completed(futures):
+        try:
+            results[futures[future]] = future.result()
+        except httpx.HTTPError as e:
+            errors.append(e)
+    return results, errors
+
+
+def _get_attachment_etag(url, headers):
+    try:
+        response = get_commcarehq_client().head(url, headers=headers)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        # the ETag is only used to skip downloads, so carry on without it
+        return None
+    etag = response.headers.get("ETag")
+    if not etag or etag.startswith("W/"):
+        # weak ETags don't identify the content
+        return None
+    return etag
+
+
+def _get_blob_contents_by_etag(etags):
+    etags = [etag for etag in etags if etag]
+    if not etags:
+        return {}
+    return {content.etag: content for content in BlobContent.objects.filter(etag__in=etags)}
+
+
+class DownloadedAttachment(NamedTuple):
+    file: File
+    content_hash: str
+    size: int
+
+
+def _download_attachment(url, headers) -> DownloadedAttachment:
+    """Download an attachment into a temporary file, which is kept in memory if it is small."""
+    file = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_SIZE)
+    content_hash = hashlib.sha256()
+    try:
+        with get_commcarehq_client().stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(ATTACHMENT_CHUNK_SIZE):
+                content_hash.update(chunk)
+                file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    size = file.tell()
+    file.seek(0)
+    return DownloadedAttachment(File(file), content_hash.hexdigest(), size)
+
+
+def _save_blob_content(download: DownloadedAttachment):
+    return default_storage.save(f"blobs/{download.content_hash[:2]}/{download.content_hash}", download.file)
+
+
+def _get_or_create_blob_content(download: DownloadedAttachment, storage_name, etag):
+    content, created = BlobContent.objects.get_or_create(
+        content_hash=download.content_hash,
+        defaults={"content_length": download.size, "storage_name": storage_name, "etag": etag},
+    )
+    if not created and content.storage_name != storage_name:
+        # stored concurrently by another task
+        default_storage.delete(storage_name)
+    return content.pk
+
+
+def _create_blob_meta(name, form_id, blob, content_id):
+    """Reference the content from the attachment, returning False if the content no longer exists."""
+    with transaction.atomic():
+        # lock the content so that it isn't removed while a reference to it is added
+        if not BlobContent.objects.select_for_update().filter(pk=content_id).exists():
+            return False
+        BlobMeta.objects.get_or_create(
+            name=name,
+            parent_id=form_id,
+            defaults={
+                "content_id": content_id,
+                "content_length": blob["length"],
+                "content_type": blob["content_type"],
+            },
+        )
+    return True
 
 
 @celery_app.task()
@@ -318,18 +510,62 @@ def generate_work_status_export(opportunity_id: int, export_format: str):
 
 
 @celery_app.task()
-def bulk_approve_completed_work():
-    access_objects = OpportunityAccess.objects.filter(
-        opportunity__active=True,
-        opportunity__end_date__gte=datetime.date.today(),
-        opportunity__auto_approve_payments=True,
-        suspended=False,
+def bulk_approve_completed_work(incremental: bool = True):
+    """Run auto-approval for the accesses of all active auto-approve opportunities, in parallel chunks
+    of accesses to a single opportunity, and summarize the results once all chunks are done.
+
+    In incremental mode only the accesses with changes since the last successful run are processed (see
+    ``get_auto_approval_accesses``). The watermark of each opportunity is advanced once all chunks succeed.
+    """
+    run_started = now()
+    opportunities = Opportunity.objects.filter(
+        active=True, end_date__gte=datetime.date.today(), auto_approve_payments=True
     )
-    for access in access_objects:
-        completed_works = access.completedwork_set.exclude(
-            status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
-        )
-        update_status(completed_works, access, True)
+    chunks = []
+    for opportunity in opportunities:
+        access_ids = get_auto_approval_accesses(opportunity, incremental).order_by("id").values_list("id", flat=True)
+        for chunk in batched(access_ids, BULK_APPROVE_CHUNK_SIZE):
+            chunks.append(bulk_approve_completed_work_chunk.s(opportunity.id, list(chunk)))
+
+    opportunity_ids = [opportunity.id for opportunity in opportunities]
+    summary = summarize_bulk_approve_completed_work.s(
+        opportunity_ids=opportunity_ids, run_started=run_started.isoformat()
+    )
+    if not chunks:
+        summary.delay([])
+        return
+    return chord(chunks)(summary).id
+
+
+@celery_app.task()
+def bulk_approve_completed_work_chunk(opportunity_id: int, access_ids: list[int]):
+    start = time.perf_counter()
+    opportunity = Opportunity.objects.get(id=opportunity_id)
+    update_opportunity_status(opportunity, OpportunityAccess.objects.filter(id__in=access_ids))
+    duration = time.perf_counter() - start
+    metrics.histogram(BULK_APPROVE_CHUNK_METRIC, round(duration * 1000, 3), {"opportunity": opportunity_id})
+    logger.info(f"Auto-approved {len(access_ids)} accesses for opportunity {opportunity_id} in {duration:.2f}s")
+    return {"opportunity": opportunity_id, "accesses": len(access_ids), "duration": duration}
+
+
+@celery_app.task()
+def summarize_bulk_approve_completed_work(chunk_results: list[dict], opportunity_ids: list[int], run_started: str):
+    Opportunity.objects.filter(id__in=opportunity_ids).update(
+        auto_approval_watermark=datetime.datetime.fromisoformat(run_started)
+    )
+    summary = {
+        "opportunities": len({result["opportunity"] for result in chunk_results}),
+        "chunks": len(chunk_results),
+        "accesses": sum(result["accesses"] for result in chunk_results),
+        "duration": sum(result["duration"] for result in chunk_results),
+        "max_chunk_duration": max((result["duration"] for result in chunk_results), default=0),
+    }
+    logger.info(
+        f"Auto-approved {summary['accesses']} accesses to {summary['opportunities']} opportunities "
+        f"in {summary['chunks']} chunks taking {summary['duration']:.2f}s "
+        f"(slowest chunk {summary['max_chunk_duration']:.2f}s)"
+    )
+    return summary
 
 
 @celery_app.task()
@@ -339,3 +575,9 @@ def generate_catchment_area_export(opportunity_id: int, export_format: str):
     export_tmp_name = f"{now().isoformat()}_{opportunity.name}_catchment_area.{export_format}"
     save_export(dataset, export_tmp_name, export_format)
     return export_tmp_name
+
+
+@celery_app.task()
+def update_completed_work_counts_task(opportunity_id: int):
+    completed_works = CompletedWork.objects.filter(opportunity_access__opportunity_id=opportunity_id)
+    recalculate_completed_work_counts(completed_works)
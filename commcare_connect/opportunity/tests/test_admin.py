@@ -0,0 +1,51 @@
+import pytest
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.urls import reverse
+
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkStatus,
+    Opportunity,
+    PaymentAccrual,
+    VisitValidationStatus,
+)
+from commcare_connect.opportunity.tests.factories import (
+    CompletedWorkFactory,
+    DeliverUnitFactory,
+    OpportunityAccessFactory,
+    PaymentUnitFactory,
+    UserVisitFactory,
+)
+
+
+@pytest.mark.django_db
+def test_clear_user_progress_reverses_payment_accrued(admin_client, opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    completed_work = CompletedWorkFactory(
+        opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.approved
+    )
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit),
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+    )
+    access.refresh_from_db()
+    assert access.payment_accrued == 5
+
+    response = admin_client.post(
+        reverse("admin:opportunity_opportunityaccess_changelist"),
+        {"action": "clear_user_progress", ACTION_CHECKBOX_NAME: [access.pk]},
+    )
+    assert response.status_code == 302
+    access.refresh_from_db()
+    assert access.payment_accrued == 0
+    assert not CompletedWork.objects.exists()
+    # the ledger keeps the accrued payment and its reversal
+    assert list(PaymentAccrual.objects.order_by("id").values_list("amount", "completed_work")) == [
+        (5, None),
+        (-5, None),
+    ]
@@ -1,6 +1,10 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 from commcare_connect.opportunity.api.serializers import (
@@ -24,12 +28,14 @@ from commcare_connect.opportunity.tests.factories import (
     CompletedWorkFactory,
     LearnModuleFactory,
     OpportunityAccessFactory,
+    OpportunityClaimFactory,
+    OpportunityClaimLimitFactory,
     OpportunityFactory,
     PaymentUnitFactory,
     UserVisitFactory,
 )
 from commcare_connect.users.models import User
-from commcare_connect.users.tests.factories import ConnectIdUserLinkFactory
+from commcare_connect.users.tests.factories import ConnectIdUserLinkFactory, MobileUserFactory
 
 
 def _setup_opportunity_and_access(mobile_user: User, total_budget, end_date, budget_per_visit=10):
@@ -118,6 +124,60 @@ def test_claim_endpoint_uneven_visits(mobile_user: User, api_client: APIClient):
     assert claim.opportunityclaimlimit_set.first().max_visits == 1
 
 
+def _setup_claimable_opportunity(users, budget_users):
+    """Create an opportunity with enough budget for ``budget_users`` users and ``users`` users that can claim it."""
+    opportunity = OpportunityFactory(end_date=datetime.date.today() + datetime.timedelta(days=100))
+    payment_units = PaymentUnitFactory.create_batch(2, opportunity=opportunity, amount=2, max_total=10)
+    opportunity.total_budget = sum(p.max_total * p.amount for p in payment_units) * budget_users
+    opportunity.save()
+    mobile_users = []
+    for _ in range(users):
+        mobile_user = MobileUserFactory(username=f"claim-{uuid4().hex[:12]}")
+        OpportunityAccessFactory(opportunity=opportunity, user=mobile_user, accepted=True)
+        ConnectIdUserLinkFactory(
+            user=mobile_user,
+            commcare_username=f"{mobile_user.username}@ccc-test.commcarehq.org",
+            domain=opportunity.deliver_app.cc_domain,
+        )
+        mobile_users.append(mobile_user)
+    return opportunity, mobile_users
+
+
+def _claim_concurrently(opportunity, mobile_users, concurrency):
+    def claim(mobile_user):
+        client = APIClient()
+        client.force_authenticate(mobile_user)
+        try:
+            return client.post(f"/api/opportunity/{opportunity.id}/claim").status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(claim, mobile_users))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_claim_endpoint_concurrent_claims():
+    opportunity, mobile_users = _setup_claimable_opportunity(users=8, budget_users=3)
+    statuses = _claim_concurrently(opportunity, mobile_users, concurrency=8)
+
+    assert statuses.count(201) == 3
+    assert statuses.count(400) == 5
+    assert OpportunityClaim.objects.filter(opportunity_access__opportunity=opportunity).count() == 3
+    for payment_unit in opportunity.paymentunit_set.all():
+        claim_limits = OpportunityClaimLimit.objects.filter(payment_unit=payment_unit)
+        assert payment_unit.claimed_visits == sum(limit.max_visits for limit in claim_limits) == 30
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_claim_endpoint_concurrent_claims(benchmark):
+    def setup():
+        return _setup_claimable_opportunity(users=20, budget_users=10), {"concurrency": 10}
+
+    statuses = benchmark.pedantic(_claim_concurrently, setup=setup, rounds=3)
+    assert statuses.count(201) == 10
+
+
 @pytest.mark.django_db
 def test_learn_progress_endpoint(mobile_user: User, api_client: APIClient):
     opportunity, opportunity_access = _setup_opportunity_and_access(
@@ -162,6 +222,45 @@ def test_opportunity_list_endpoint(
     assert response.data[0]["claim"]["max_payments"] == sum([cl.max_visits for cl in claim_limits])
 
 
+@pytest.mark.django_db
+def test_opportunity_list_endpoint_constant_queries(mobile_user: User, api_client: APIClient):
+    def create_opportunity():
+        opportunity, access = _setup_opportunity_and_access(
+            mobile_user, total_budget=1000, end_date=datetime.date.today() + datetime.timedelta(days=100)
+        )
+        payment_unit = opportunity.paymentunit_set.get()
+        claim = OpportunityClaimFactory(opportunity_access=access)
+        OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=payment_unit, max_visits=5)
+        CompletedModuleFactory(
+            module=LearnModuleFactory(app=opportunity.learn_app),
+            user=mobile_user,
+            opportunity=opportunity,
+            opportunity_access=access,
+        )
+        CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+        return opportunity
+
+    def list_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/api/opportunity/")
+        assert response.status_code == 200
+        return len(queries), response.data
+
+    api_client.force_authenticate(mobile_user)
+    create_opportunity()
+    num_queries, _ = list_queries()
+    for _ in range(3):
+        opportunity = create_opportunity()
+    num_queries_after, data = list_queries()
+    assert num_queries_after == num_queries
+
+    data = next(item for item in data if item["id"] == opportunity.id)
+    assert data["claim"]["max_payments"] == 5
+    assert data["learn_progress"] == {"total_modules": 1, "completed_modules": 1}
+    assert data["budget_per_user"] == 1000
+    assert data["max_visits_per_user"] == 100
+
+
 def test_delivery_progress_endpoint(
     mobile_user_with_connect_link: User, api_client: APIClient, opportunity: Opportunity
 ):
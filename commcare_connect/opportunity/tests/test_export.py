@@ -2,6 +2,7 @@ import random
 from datetime import timedelta
 
 import pytest
+from django.core.files.storage import default_storage
 from django.utils.timezone import now
 from tablib import Dataset
 
@@ -10,9 +11,11 @@ from commcare_connect.opportunity.export import (
     export_user_status_table,
     export_user_visit_data,
     get_flattened_dataset,
+    get_user_visit_export_rows,
 )
 from commcare_connect.opportunity.forms import DateRanges
 from commcare_connect.opportunity.models import Opportunity, UserInviteStatus, UserVisit
+from commcare_connect.opportunity.tasks import save_csv_export
 from commcare_connect.opportunity.tests.factories import (
     AssessmentFactory,
     CatchmentAreaFactory,
@@ -65,6 +68,60 @@ def test_export_user_visit_data(mobile_user_with_connect_link):
     )
 
 
+@pytest.mark.parametrize(
+    "flatten, form_headers, form_values",
+    [
+        (True, "form.name,form.group.q", ["test_form1,", "test_form2,b"]),
+        (
+            False,
+            "form_json",
+            [
+                '"{""form"": {""name"": ""test_form1""}}"',
+                '"{""form"": {""name"": ""test_form2"", ""group"": {""q"": ""b""}}, '
+                '""attachments"": {""a.jpg"": {}}}"',
+            ],
+        ),
+    ],
+)
+def test_save_csv_export_user_visit_data(mobile_user_with_connect_link, flatten, form_headers, form_values):
+    deliver_unit = DeliverUnitFactory()
+    opportunity = OpportunityFactory()
+    date1 = now()
+    date2 = date1 + timedelta(minutes=10)
+    UserVisit.objects.bulk_create(
+        [
+            UserVisit(
+                opportunity=opportunity,
+                user=mobile_user_with_connect_link,
+                visit_date=date1,
+                deliver_unit=deliver_unit,
+                form_json={"form": {"name": "test_form1"}},
+            ),
+            UserVisit(
+                opportunity=opportunity,
+                user=mobile_user_with_connect_link,
+                visit_date=date2,
+                deliver_unit=deliver_unit,
+                entity_id="abc",
+                entity_name="A B C",
+                form_json={"form": {"name": "test_form2", "group": {"q": "b"}}, "attachments": {"a.jpg": {}}},
+            ),
+        ]
+    )
+    headers, rows = get_user_visit_export_rows(opportunity, DateRanges.LAST_30_DAYS, [], flatten)
+    save_csv_export(headers, rows, "visit_export.csv")
+    username = mobile_user_with_connect_link.username
+    name = mobile_user_with_connect_link.name
+
+    with default_storage.open("visit_export.csv") as export_file:
+        assert export_file.read().decode() == (
+            "Visit ID,Visit date,Status,Username,Name of User,Unit Name,Rejected Reason,"
+            f"Entity ID,Entity Name,Flags,{form_headers}\r\n"
+            f",{date1.isoformat()},Pending,{username},{name},{deliver_unit.name},,,,,{form_values[0]}\r\n"
+            f",{date2.isoformat()},Pending,{username},{name},{deliver_unit.name},,abc,A B C,,{form_values[1]}\r\n"
+        )
+
+
 @pytest.mark.parametrize(
     "data, expected",
     [
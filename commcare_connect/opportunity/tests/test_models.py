@@ -1,6 +1,24 @@
+import datetime
+
 import pytest
+from django.core.management import call_command
 
-from commcare_connect.opportunity.models import Opportunity, OpportunityClaimLimit
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkStatus,
+    DailyVisitCount,
+    EntityVisitCount,
+    Opportunity,
+    OpportunityAccess,
+    OpportunityBudgetSnapshot,
+    OpportunityClaimLimit,
+    PaymentAccrual,
+    PaymentUnit,
+    VisitValidationStatus,
+    accrue_payments,
+    get_payment_unit_ancestors,
+    get_visit_counts,
+)
 from commcare_connect.opportunity.tests.factories import (
     CompletedModuleFactory,
     CompletedWorkFactory,
@@ -12,6 +30,7 @@ from commcare_connect.opportunity.tests.factories import (
     PaymentUnitFactory,
     UserVisitFactory,
 )
+from commcare_connect.opportunity.utils.completed_work import calculate_completed_work_counts
 from commcare_connect.users.models import User
 from commcare_connect.users.tests.factories import MobileUserFactory
 
@@ -94,6 +113,92 @@ def test_claim_limits(opportunity: Opportunity):
     # Not enough for 3rd user at all
     assert limit_count(mobile_users[2]) == 0
 
+    def claimed_visits(payment_unit):
+        payment_unit.refresh_from_db()
+        return payment_unit.claimed_visits
+
+    for payment_unit in payment_units:
+        claim_limits = OpportunityClaimLimit.objects.filter(payment_unit=payment_unit)
+        assert claimed_visits(payment_unit) == sum(claim_limit.max_visits for claim_limit in claim_limits)
+    claim_limit = OpportunityClaimLimit.objects.filter(payment_unit=payment_units[0]).first()
+    claimed = claimed_visits(payment_units[0])
+    claim_limit.max_visits += 2
+    claim_limit.save()
+    assert claimed_visits(payment_units[0]) == claimed + 2
+    claim_limit.delete()
+    assert claimed_visits(payment_units[0]) == claimed + 2 - claim_limit.max_visits
+
+
+@pytest.mark.django_db
+def test_opportunity_budget_snapshot(
+    opportunity: Opportunity, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5, max_total=10)
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    claim = OpportunityClaimFactory(opportunity_access=access)
+    OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=payment_unit, max_visits=4)
+    CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.approved)
+
+    with django_assert_num_queries(3):
+        budget = opportunity.budget
+    assert budget == OpportunityBudgetSnapshot(
+        claimed_budget=20,
+        claimed_visits=4,
+        utilised_budget=5,
+        approved_visits=1,
+        budget_per_user=50,
+        max_visits_per_user=10,
+    )
+    with django_assert_num_queries(0):
+        assert Opportunity(id=opportunity.id).budget == budget
+
+    OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=PaymentUnitFactory(opportunity=opportunity))
+    assert opportunity.budget.claimed_visits > 4
+    work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+    assert opportunity.budget.approved_visits == 1
+    work.status = CompletedWorkStatus.approved
+    work.save()
+    assert opportunity.budget.approved_visits == 2
+
+    work = CompletedWork.objects.get(pk=work.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        work.status = CompletedWorkStatus.rejected
+        work.save()
+        # a snapshot cached before the transaction commits is cleared again on commit
+        assert opportunity.budget.approved_visits == 1
+    with django_assert_num_queries(3):
+        assert opportunity.budget.approved_visits == 1
+
+
+@pytest.mark.django_db
+def test_opportunity_with_stats(opportunity: Opportunity):
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    access = OpportunityAccessFactory(opportunity=opportunity, accepted=True)
+    OpportunityAccessFactory(opportunity=opportunity, accepted=True, suspended=True)
+    claim = OpportunityClaimFactory(opportunity_access=access)
+    OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=payment_unit, max_visits=4)
+    CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.approved)
+    CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+    visit = UserVisitFactory(
+        opportunity=opportunity,
+        user=access.user,
+        visit_date=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        status=VisitValidationStatus.approved,
+    )
+    UserVisitFactory(
+        opportunity=opportunity,
+        user=access.user,
+        visit_date=datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc),
+        status=VisitValidationStatus.trial,
+    )
+
+    opportunity = Opportunity.objects.with_stats().get(pk=opportunity.pk)
+    assert opportunity.total_claimed_visits == opportunity.claimed_visits == 4
+    assert opportunity.total_approved_visits == opportunity.approved_visits == 1
+    assert opportunity.total_utilised_budget == opportunity.utilised_budget == 10
+    assert opportunity.active_workers == 1
+    assert opportunity.last_visit_date == visit.visit_date
+
 
 @pytest.mark.django_db
 def test_access_visit_count(opportunity: Opportunity):
@@ -107,3 +212,297 @@ def test_access_visit_count(opportunity: Opportunity):
         completed_work=completed_work, deliver_unit=deliver_unit, user=access.user, opportunity=access.opportunity
     )
     assert access.visit_count == 1
+
+
+@pytest.mark.django_db
+def test_visit_counts(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
+    visit_date = datetime.datetime(2024, 1, 1, 10, tzinfo=datetime.timezone.utc)
+
+    def create_visit(status=VisitValidationStatus.pending, entity_id="e1", day_offset=0):
+        return UserVisitFactory(
+            opportunity=opportunity,
+            opportunity_access=access,
+            user=access.user,
+            deliver_unit=deliver_unit,
+            status=status,
+            entity_id=entity_id,
+            visit_date=visit_date + datetime.timedelta(days=day_offset),
+        )
+
+    def get_counts():
+        return get_visit_counts(access.id, deliver_unit.id, visit_date, "e1")
+
+    visit = create_visit()
+    create_visit(entity_id="e2")
+    create_visit(day_offset=1)
+    create_visit(status=VisitValidationStatus.over_limit)
+    create_visit(status=VisitValidationStatus.trial)
+    assert get_counts() == {"daily": 2, "total": 3, "entity": 2}
+
+    visit.status = VisitValidationStatus.over_limit
+    visit.save()
+    assert get_counts() == {"daily": 1, "total": 2, "entity": 1}
+
+    visit.status = VisitValidationStatus.approved
+    visit.save()
+    visit.entity_id = "e2"
+    visit.save()
+    assert get_counts() == {"daily": 2, "total": 3, "entity": 1}
+
+    DailyVisitCount.objects.all().delete()
+    EntityVisitCount.objects.all().delete()
+    call_command("rebuild_visit_counts", opp=opportunity.id)
+    assert get_counts() == {"daily": 2, "total": 3, "entity": 1}
+
+
+@pytest.mark.django_db
+def test_completed_work_counts(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    parent_payment_unit = PaymentUnitFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, parent_payment_unit=parent_payment_unit)
+    required_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+    optional_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit, optional=True)
+    parent_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=parent_payment_unit)
+    completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, entity_id="e1")
+    parent_work = CompletedWorkFactory(opportunity_access=access, payment_unit=parent_payment_unit, entity_id="e1")
+
+    def create_visit(deliver_unit, work, status=VisitValidationStatus.pending):
+        return UserVisitFactory(
+            opportunity=opportunity,
+            opportunity_access=access,
+            user=access.user,
+            deliver_unit=deliver_unit,
+            completed_work=work,
+            status=status,
+            entity_id="e1",
+        )
+
+    def get_counts(work):
+        work.refresh_from_db()
+        return work.completed_count, work.approved_count
+
+    visit = create_visit(required_unit, completed_work)
+    assert get_counts(completed_work) == (0, 0)
+    create_visit(optional_unit, completed_work)
+    create_visit(parent_unit, parent_work, status=VisitValidationStatus.approved)
+    assert get_counts(completed_work) == (1, 0)
+    assert get_counts(parent_work) == (1, 0)
+
+    visit.status = VisitValidationStatus.approved
+    visit.save()
+    assert get_counts(completed_work) == (1, 0)
+    optional_visit = completed_work.uservisit_set.get(deliver_unit=optional_unit)
+    optional_visit.status = VisitValidationStatus.approved
+    optional_visit.save()
+    assert get_counts(completed_work) == (1, 1)
+    assert get_counts(parent_work) == (1, 1)
+
+    type(completed_work).objects.update(completed_count=0, approved_count=0)
+    call_command("update_completed_work_counts", opp=opportunity.id)
+    assert get_counts(completed_work) == (1, 1)
+    assert get_counts(parent_work) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_completed_work_save_keeps_counts(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+    completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, entity_id="e1")
+    stale_work = CompletedWork.objects.get(pk=completed_work.pk)
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+        entity_id="e1",
+    )
+
+    stale_work.status = CompletedWorkStatus.approved
+    stale_work.save()
+    completed_work.refresh_from_db()
+    assert completed_work.status == CompletedWorkStatus.approved
+    assert (completed_work.completed_count, completed_work.approved_count) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_calculate_completed_work_counts(opportunity: Opportunity, django_assert_num_queries):
+    parent_payment_unit = PaymentUnitFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, parent_payment_unit=parent_payment_unit)
+    deliver_units = [
+        DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit),
+        DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit, optional=True),
+        DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=parent_payment_unit),
+    ]
+    statuses = [VisitValidationStatus.approved, VisitValidationStatus.pending, VisitValidationStatus.approved]
+    for i, access in enumerate(OpportunityAccessFactory.create_batch(3, opportunity=opportunity)):
+        for entity_id in ["e1", "e2"]:
+            works = {
+                payment_unit.id: CompletedWorkFactory(
+                    opportunity_access=access, payment_unit=payment_unit, entity_id=entity_id
+                ),
+                parent_payment_unit.id: CompletedWorkFactory(
+                    opportunity_access=access, payment_unit=parent_payment_unit, entity_id=entity_id
+                ),
+            }
+            for j, deliver_unit in enumerate(deliver_units[: i + 1] * 2):
+                UserVisitFactory(
+                    opportunity=opportunity,
+                    opportunity_access=access,
+                    user=access.user,
+                    deliver_unit=deliver_unit,
+                    completed_work=works[deliver_unit.payment_unit_id],
+                    status=statuses[(i + j) % len(statuses)],
+                    entity_id=entity_id,
+                )
+
+    completed_works = CompletedWork.objects.filter(opportunity_access__opportunity=opportunity)
+    with django_assert_num_queries(5):
+        counts = calculate_completed_work_counts(completed_works)
+    assert counts == {work.id: (work.completed_count, work.approved_count) for work in completed_works}
+    assert any(work_counts.approved for work_counts in counts.values())
+
+
+@pytest.mark.django_db
+def test_calculate_completed_work_counts_payment_unit_cycle(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    parent_payment_unit = PaymentUnitFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, parent_payment_unit=parent_payment_unit)
+    PaymentUnit.objects.filter(pk=parent_payment_unit.pk).update(parent_payment_unit=payment_unit)
+    for unit in (payment_unit, parent_payment_unit):
+        UserVisitFactory(
+            opportunity=opportunity,
+            opportunity_access=access,
+            user=access.user,
+            deliver_unit=DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=unit),
+            completed_work=CompletedWorkFactory(opportunity_access=access, payment_unit=unit, entity_id="e1"),
+            status=VisitValidationStatus.approved,
+            entity_id="e1",
+        )
+
+    counts = calculate_completed_work_counts(CompletedWork.objects.filter(opportunity_access=access))
+    assert sorted(counts.values()) == [(1, 1), (1, 1)]
+
+
+@pytest.mark.django_db
+def test_completed_work_counts_nested_payment_units(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_units = [PaymentUnitFactory(opportunity=opportunity)]
+    for _ in range(3):
+        payment_units.append(PaymentUnitFactory(opportunity=opportunity, parent_payment_unit=payment_units[-1]))
+    root, *_, leaf = payment_units
+    assert get_payment_unit_ancestors([leaf.id, root.id]) == {leaf.id: [unit.id for unit in payment_units[-2::-1]]}
+
+    works = []
+    for payment_unit in payment_units:
+        deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+        work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit, entity_id="e1")
+        UserVisitFactory(
+            opportunity=opportunity,
+            opportunity_access=access,
+            user=access.user,
+            deliver_unit=deliver_unit,
+            completed_work=work,
+            status=VisitValidationStatus.pending,
+            entity_id="e1",
+        )
+        works.append(work)
+
+    visit = works[-1].uservisit_set.get()
+    visit.status = VisitValidationStatus.approved
+    visit.save()
+    for work in works:
+        work.refresh_from_db()
+    assert [work.completed_count for work in works] == [1, 1, 1, 1]
+    assert [work.approved_count for work in works] == [0, 0, 0, 1]
+
+
+@pytest.mark.django_db
+def test_payment_accrual_ledger(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+    completed_work = CompletedWorkFactory(
+        opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.approved
+    )
+    visits = UserVisitFactory.create_batch(
+        2,
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+    )
+    access.refresh_from_db()
+    assert access.payment_accrued == 10
+    assert list(PaymentAccrual.objects.values_list("amount", "approved_count")) == [(5, 1), (5, 2)]
+
+    visits[0].status = VisitValidationStatus.rejected
+    visits[0].save()
+    completed_work.refresh_from_db()
+    completed_work.status = CompletedWorkStatus.rejected
+    completed_work.save()
+    access.refresh_from_db()
+    assert access.payment_accrued == 0
+    assert list(PaymentAccrual.objects.order_by("id").values_list("amount", "status")) == [
+        (5, CompletedWorkStatus.approved),
+        (5, CompletedWorkStatus.approved),
+        (-5, CompletedWorkStatus.approved),
+        (-5, CompletedWorkStatus.rejected),
+    ]
+
+
+@pytest.mark.django_db
+def test_payment_accrual_stale_instance(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+    completed_work = CompletedWorkFactory(
+        opportunity_access=access, payment_unit=payment_unit, status=CompletedWorkStatus.approved
+    )
+    stale_work = CompletedWork.objects.select_related("payment_unit").get(pk=completed_work.pk)
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+    )
+
+    # the amount is calculated from the stored work, not the stale instance
+    stale_work.save()
+    assert accrue_payments([stale_work]) == []
+    type(payment_unit).objects.filter(pk=payment_unit.pk).update(amount=7)
+    assert [entry.amount for entry in accrue_payments([stale_work])] == [2]
+    access.refresh_from_db()
+    assert access.payment_accrued == 7
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reconcile_payment_accruals(opportunity: Opportunity):
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit)
+    completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+    )
+    # changes that bypass the ledger
+    CompletedWork.objects.update(status=CompletedWorkStatus.approved)
+    OpportunityAccess.objects.update(payment_accrued=100)
+
+    call_command("reconcile_payment_accruals", opp=opportunity.id, workers=2, chunk_size=1)
+    access.refresh_from_db()
+    assert access.payment_accrued == 5
+    assert PaymentAccrual.objects.get().amount == 5
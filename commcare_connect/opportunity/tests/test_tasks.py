@@ -1,11 +1,26 @@
 import datetime
+import hashlib
+import re
 from unittest import mock
 
+import httpx
 import pytest
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.utils.timezone import now
 
 from commcare_connect.connect_id_client.models import ConnectIdUser
-from commcare_connect.opportunity.models import BlobMeta, Opportunity, OpportunityAccess
+from commcare_connect.opportunity import tasks
+from commcare_connect.opportunity.models import (
+    BlobContent,
+    BlobMeta,
+    CompletedWork,
+    CompletedWorkStatus,
+    Opportunity,
+    OpportunityAccess,
+    UserVisit,
+    VisitValidationStatus,
+)
 from commcare_connect.opportunity.tasks import (
     _get_inactive_message,
     add_connect_users,
@@ -13,11 +28,16 @@ from commcare_connect.opportunity.tasks import (
 )
 from commcare_connect.opportunity.tests.factories import (
     CompletedModuleFactory,
+    CompletedWorkFactory,
+    DeliverUnitFactory,
     LearnModuleFactory,
+    OpportunityAccessFactory,
     OpportunityClaimFactory,
     OpportunityFactory,
+    PaymentUnitFactory,
     UserVisitFactory,
 )
+from commcare_connect.opportunity.utils.completed_work import get_auto_approval_accesses
 from commcare_connect.users.models import User
 
 
@@ -130,7 +150,7 @@ def test_send_inactive_notification_active_user(mobile_user: User, opportunity:
     assert message is None
 
 
-def test_download_attachments(mobile_user: User, opportunity: Opportunity):
+def test_download_attachments(mobile_user: User, opportunity: Opportunity, httpx_mock):
     learn_modules = LearnModuleFactory.create_batch(2, app=opportunity.learn_app)
     for learn_module in learn_modules:
         CompletedModuleFactory.create(
@@ -144,19 +164,189 @@ def test_download_attachments(mobile_user: User, opportunity: Opportunity):
     user_visit = UserVisitFactory.create(
         user=mobile_user,
         opportunity=opportunity,
-        form_json={"attachments": {"myimage.jpg": {"content_type": "image/jpeg", "length": 20}}},
+        form_json={
+            "attachments": {
+                "form.xml": {"content_type": "text/xml", "length": 100},
+                "myimage.jpg": {"content_type": "image/jpeg", "length": 20},
+                "other.jpg": {"content_type": "image/jpeg", "length": 30},
+            }
+        },
+    )
+    httpx_mock.add_response(url=re.compile(r".*/myimage\.jpg$"), content=b"asdas")
+    httpx_mock.add_response(url=re.compile(r".*/other\.jpg$"), content=b"x" * 200_000)
+    download_user_visit_attachments(user_visit.id)
+
+    blob_metas = {blob_meta.name: blob_meta for blob_meta in BlobMeta.objects.all()}
+    assert set(blob_metas) == {"myimage.jpg", "other.jpg"}
+    blob_meta = blob_metas["myimage.jpg"]
+    assert blob_meta.parent_id == user_visit.xform_id
+    assert blob_meta.content_length == 20
+    assert blob_meta.content_type == "image/jpeg"
+    assert blob_meta.content.content_hash == hashlib.sha256(b"asdas").hexdigest()
+    assert blob_meta.content.ref_count == 1
+    with default_storage.open(blob_meta.storage_name) as f:
+        assert f.read() == b"asdas"
+    with default_storage.open(blob_metas["other.jpg"].storage_name) as f:
+        assert f.read() == b"x" * 200_000
+
+    # attachments that were already downloaded are skipped
+    download_user_visit_attachments(user_visit.id)
+    assert BlobMeta.objects.count() == 2
+    assert len(httpx_mock.get_requests(method="GET")) == 2
+
+
+def test_download_attachments_deduplicated(mobile_user: User, opportunity: Opportunity, httpx_mock):
+    def create_visit():
+        return UserVisitFactory.create(
+            user=mobile_user,
+            opportunity=opportunity,
+            form_json={"attachments": {"myimage.jpg": {"content_type": "image/jpeg", "length": 5}}},
+        )
+
+    first_visit, second_visit, third_visit = create_visit(), create_visit(), create_visit()
+    for visit, etag in [(first_visit, '"abc"'), (second_visit, '"abc"'), (third_visit, 'W/"xyz"')]:
+        url = re.compile(rf".*/{visit.xform_id}/myimage\.jpg$")
+        httpx_mock.add_response(method="HEAD", url=url, headers={"ETag": etag})
+        if visit != second_visit:
+            httpx_mock.add_response(method="GET", url=url, content=b"asdas")
+
+    download_user_visit_attachments(first_visit.id)
+    # same ETag, so the content is not downloaded again
+    download_user_visit_attachments(second_visit.id)
+    assert len(httpx_mock.get_requests(method="GET")) == 1
+    # weak ETag, so the content is downloaded but not stored again
+    download_user_visit_attachments(third_visit.id)
+    assert len(httpx_mock.get_requests(method="GET")) == 2
+
+    content = BlobContent.objects.get()
+    assert content.etag == '"abc"'
+    assert content.ref_count == 3
+    assert set(BlobMeta.objects.values_list("content_id", flat=True)) == {content.id}
+
+    BlobMeta.objects.filter(parent_id=first_visit.xform_id).delete()
+    call_command("delete_unreferenced_blobs")
+    content.refresh_from_db()
+    assert content.ref_count == 2
+
+    BlobMeta.objects.all().delete()
+    # recently created content may not have been referenced yet, so it is kept
+    BlobContent.objects.create(content_hash="new", content_length=1, storage_name="blobs/ne/new")
+    BlobContent.objects.filter(pk=content.pk).update(date_created=now() - datetime.timedelta(days=2))
+    call_command("delete_unreferenced_blobs")
+    assert list(BlobContent.objects.values_list("content_hash", flat=True)) == ["new"]
+    assert not default_storage.exists(content.storage_name)
+
+
+def test_download_attachments_content_deleted(mobile_user: User, opportunity: Opportunity, httpx_mock):
+    user_visit = UserVisitFactory.create(
+        user=mobile_user,
+        opportunity=opportunity,
+        form_json={"attachments": {"myimage.jpg": {"content_type": "image/jpeg", "length": 5}}},
+    )
+    BlobContent.objects.create(
+        content_hash=hashlib.sha256(b"asdas").hexdigest(), content_length=5, storage_name="deleted"
+    )
+    httpx_mock.add_response(url=re.compile(r".*/myimage\.jpg$"), content=b"asdas")
+
+    create_blob_meta = tasks._create_blob_meta
+
+    def delete_content_and_create_blob_meta(*args):
+        # the unreferenced content is deleted after it was looked up
+        BlobContent.objects.filter(storage_name="deleted").delete()
+        return create_blob_meta(*args)
+
+    with mock.patch.object(tasks, "_create_blob_meta", side_effect=delete_content_and_create_blob_meta):
+        download_user_visit_attachments(user_visit.id)
+
+    blob_meta = BlobMeta.objects.get()
+    assert blob_meta.content.ref_count == 1
+    with default_storage.open(blob_meta.storage_name) as f:
+        assert f.read() == b"asdas"
+
+
+def test_download_attachments_error(mobile_user: User, opportunity: Opportunity, httpx_mock):
+    user_visit = UserVisitFactory.create(
+        user=mobile_user,
+        opportunity=opportunity,
+        form_json={
+            "attachments": {
+                "myimage.jpg": {"content_type": "image/jpeg", "length": 20},
+                "missing.jpg": {"content_type": "image/jpeg", "length": 20},
+            }
+        },
     )
-    with mock.patch("commcare_connect.opportunity.tasks.httpx.get") as get_response, mock.patch(
-        "commcare_connect.opportunity.tasks.default_storage.save"
-    ) as save_blob:
-        get_response.return_value.content = b"asdas"
+    httpx_mock.add_response(url=re.compile(r".*/myimage\.jpg$"), content=b"asdas")
+    httpx_mock.add_response(url=re.compile(r".*/missing\.jpg$"), status_code=404)
+    with pytest.raises(httpx.HTTPStatusError):
         download_user_visit_attachments(user_visit.id)
-        blob_meta = BlobMeta.objects.first()
-
-        assert blob_meta.name == "myimage.jpg"
-        assert blob_meta.parent_id == user_visit.xform_id
-        assert blob_meta.content_length == 20
-        assert blob_meta.content_type == "image/jpeg"
-        blob_id, content_file = save_blob.call_args_list[0].args
-        assert str(blob_id) == blob_meta.blob_id
-        assert content_file.read() == b"asdas"
+    assert list(BlobMeta.objects.values_list("name", flat=True)) == ["myimage.jpg"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("celery_eager")
+def test_bulk_approve_completed_work_chunks(monkeypatch):
+    opportunities = OpportunityFactory.create_batch(
+        2, auto_approve_payments=True, end_date=datetime.date.today() + datetime.timedelta(days=1)
+    )
+    for opportunity in opportunities:
+        OpportunityAccessFactory.create_batch(3, opportunity=opportunity)
+    ids = [opportunity.id for opportunity in opportunities]
+    monkeypatch.setattr(tasks, "BULK_APPROVE_CHUNK_SIZE", 2)
+    with (
+        mock.patch.object(tasks, "update_opportunity_status") as update_opportunity_status,
+        mock.patch.object(tasks.logger, "info") as log_info,
+    ):
+        tasks.bulk_approve_completed_work()
+
+    assert update_opportunity_status.call_count == 4
+    updated_access_ids = [access.id for call in update_opportunity_status.call_args_list for access in call.args[1]]
+    assert sorted(updated_access_ids) == sorted(
+        OpportunityAccess.objects.filter(opportunity__in=opportunities).values_list("id", flat=True)
+    )
+    assert "Auto-approved 6 accesses to 2 opportunities in 4 chunks" in log_info.call_args.args[0]
+    assert all(opportunity.auto_approval_watermark for opportunity in Opportunity.objects.filter(id__in=ids))
+
+
+@pytest.mark.django_db
+def test_get_auto_approval_accesses_incremental(opportunity: Opportunity):
+    access_1, access_2 = OpportunityAccessFactory.create_batch(2, opportunity=opportunity)
+    _, visit_2 = (
+        UserVisitFactory(opportunity=opportunity, opportunity_access=access, status=VisitValidationStatus.pending)
+        for access in [access_1, access_2]
+    )
+    two_days_ago = now() - datetime.timedelta(days=2)
+    UserVisit.objects.update(status_modified_date=two_days_ago)
+    CompletedWork.objects.update(last_modified=two_days_ago, status_modified_date=two_days_ago)
+    assert set(get_auto_approval_accesses(opportunity, incremental=True)) == {access_1, access_2}
+
+    opportunity.auto_approval_watermark = now() - datetime.timedelta(days=1)
+    assert set(get_auto_approval_accesses(opportunity)) == {access_1, access_2}
+
+    visit_2.status = VisitValidationStatus.approved
+    visit_2.save()
+    assert list(get_auto_approval_accesses(opportunity, incremental=True)) == [access_2]
+
+
+@pytest.mark.django_db
+def test_auto_approval_opportunities_command(opportunity: Opportunity):
+    opportunity.auto_approve_payments = True
+    opportunity.save()
+    access = OpportunityAccessFactory(opportunity=opportunity)
+    payment_unit = PaymentUnitFactory(opportunity=opportunity, amount=5)
+    completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=access.user,
+        deliver_unit=DeliverUnitFactory(app=opportunity.deliver_app, payment_unit=payment_unit),
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+    )
+
+    call_command("auto_approval_opportunities", opp=opportunity.id, incremental=True)
+    completed_work.refresh_from_db()
+    assert completed_work.status == CompletedWorkStatus.approved
+    access.refresh_from_db()
+    assert access.payment_accrued == 5
+    opportunity.refresh_from_db()
+    assert opportunity.auto_approval_watermark
@@ -1,14 +1,26 @@
 import pytest
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from commcare_connect.opportunity.models import Opportunity, OpportunityAccess, OpportunityClaimLimit
+from commcare_connect.form_receiver.tests.xforms import get_form_json
+from commcare_connect.opportunity.models import (
+    Opportunity,
+    OpportunityAccess,
+    OpportunityClaimLimit,
+    VisitValidationStatus,
+)
 from commcare_connect.opportunity.tests.factories import (
+    OpportunityAccessFactory,
     OpportunityClaimFactory,
     OpportunityClaimLimitFactory,
+    OpportunityFactory,
     PaymentUnitFactory,
+    UserVisitFactory,
 )
 from commcare_connect.organization.models import Organization
+from commcare_connect.program.tests.factories import ManagedOpportunityFactory
 from commcare_connect.users.models import User
 
 
@@ -38,3 +50,59 @@ def test_add_budget_existing_users(
     assert opportunity.total_budget == 205
     assert opportunity.claimed_budget == 15
     assert OpportunityClaimLimit.objects.get(pk=ocl.pk).max_visits == 15
+
+
+@pytest.mark.django_db
+def test_visit_verification_nearby_visits(
+    organization: Organization, org_user_member: User, opportunity: Opportunity, mobile_user: User, client: Client
+):
+    opportunity.organization = organization
+    opportunity.save()
+    visit = UserVisitFactory(
+        opportunity=opportunity, user=mobile_user, location="20.090209 40.0932 0 10", form_json=get_form_json()
+    )
+    near = UserVisitFactory(opportunity=opportunity, user=mobile_user, location="20.0906 40.0932 0 5")
+    other_user_near = UserVisitFactory(opportunity=opportunity, location="20.0902 40.0941 0 5")
+    UserVisitFactory(opportunity=opportunity, user=mobile_user, location="20.0934 40.0932 0 5")
+    UserVisitFactory(opportunity=opportunity, user=mobile_user, location=None)
+
+    url = reverse("opportunity:visit_verification", args=(organization.slug, visit.pk))
+    client.force_login(org_user_member)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert [form[0] for form in response.context["user_forms"]] == [near]
+    assert [form[0] for form in response.context["other_forms"]] == [other_user_near]
+    assert response.context["user_forms"][0][2:] == ("20.0906", "40.0932", "5.0")
+
+
+@pytest.mark.django_db
+def test_opportunity_list_constant_queries(organization: Organization, org_user_member: User, client: Client):
+    def create_opportunity(factory=OpportunityFactory):
+        opportunity = factory(organization=organization)
+        payment_unit = PaymentUnitFactory(opportunity=opportunity)
+        access = OpportunityAccessFactory(opportunity=opportunity, accepted=True)
+        claim = OpportunityClaimFactory(opportunity_access=access)
+        OpportunityClaimLimitFactory(opportunity_claim=claim, payment_unit=payment_unit, max_visits=5)
+        UserVisitFactory(
+            opportunity=opportunity,
+            user=access.user,
+            opportunity_access=access,
+            status=VisitValidationStatus.approved,
+        )
+
+    def list_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(queries)
+
+    url = reverse("opportunity:list", args=(organization.slug,))
+    client.force_login(org_user_member)
+    create_opportunity()
+    create_opportunity(ManagedOpportunityFactory)
+    num_queries = list_queries()
+
+    for _ in range(3):
+        create_opportunity()
+    create_opportunity(ManagedOpportunityFactory)
+    assert list_queries() == num_queries
@@ -4,6 +4,7 @@ from decimal import Decimal
 from itertools import chain
 
 import pytest
+from django.db import transaction
 from django.utils.timezone import now
 from tablib import Dataset
 
@@ -17,7 +18,9 @@ from commcare_connect.opportunity.models import (
     Payment,
     PaymentUnit,
     UserVisit,
+    VisitReviewStatus,
     VisitValidationStatus,
+    get_visit_counts,
 )
 from commcare_connect.opportunity.tests.factories import (
     CatchmentAreaFactory,
@@ -66,6 +69,27 @@ def test_bulk_update_visit_status(opportunity: Opportunity, mobile_user: User):
         assert before_update <= visit.status_modified_date <= after_update
 
 
+@pytest.mark.django_db
+def test_bulk_update_visit_status_visit_counts(opportunity: Opportunity, mobile_user: User):
+    access = OpportunityAccess.objects.get(user=mobile_user, opportunity=opportunity)
+    deliver_unit = DeliverUnitFactory(app=opportunity.deliver_app)
+    visits = UserVisitFactory.create_batch(
+        3,
+        opportunity=opportunity,
+        status=VisitValidationStatus.over_limit.value,
+        user=mobile_user,
+        opportunity_access=access,
+        deliver_unit=deliver_unit,
+    )
+    visit = visits[0]
+    assert get_visit_counts(access.id, deliver_unit.id, visit.visit_date, visit.entity_id)["total"] == 0
+
+    dataset = Dataset(headers=["visit id", "status", "rejected reason"])
+    dataset.extend([[visit.xform_id, VisitValidationStatus.approved.value, ""] for visit in visits])
+    _bulk_update_visit_status(opportunity, dataset)
+    assert get_visit_counts(access.id, deliver_unit.id, visit.visit_date, visit.entity_id)["total"] == 3
+
+
 @pytest.mark.django_db
 def test_bulk_update_completed_work_status(opportunity: Opportunity, mobile_user: User):
     access = OpportunityAccess.objects.get(user=mobile_user, opportunity=opportunity)
@@ -244,6 +268,123 @@ def test_payment_accrued_asymmetric_optional_deliver_units(opportunity: Opportun
     assert access.payment_accrued == payment_unit.amount * 2
 
 
+def _legacy_update_status(completed_works, opportunity_access, compute_payment=True):
+    """The per-row implementation that ``update_status`` replaced, for opportunities that are not managed."""
+    payment_accrued = 0
+    for completed_work in completed_works:
+        if completed_work.completed_count < 1:
+            continue
+
+        if opportunity_access.opportunity.auto_approve_payments:
+            visits = completed_work.uservisit_set.order_by("id").values_list("status", "reason")
+            if any(status == "rejected" for status, _ in visits):
+                completed_work.status = CompletedWorkStatus.rejected
+                completed_work.reason = "\n".join(reason for _, reason in visits if reason)
+            elif all(status == "approved" for status, _ in visits):
+                completed_work.status = CompletedWorkStatus.approved
+            completed_work.save()
+
+        if compute_payment:
+            approved_count = completed_work.approved_count
+            if approved_count > 0 and completed_work.status == CompletedWorkStatus.approved:
+                payment_accrued += approved_count * completed_work.payment_unit.amount
+
+    if compute_payment:
+        opportunity_access.payment_accrued = payment_accrued
+        opportunity_access.save()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("auto_approve_payments", [True, False])
+def test_update_payment_accrued_matches_legacy(opportunity: Opportunity, auto_approve_payments):
+    opportunity.auto_approve_payments = auto_approve_payments
+    opportunity.save()
+    payment_units = PaymentUnitFactory.create_batch(2, opportunity=opportunity)
+    for payment_unit in payment_units:
+        DeliverUnitFactory(payment_unit=payment_unit, app=opportunity.deliver_app)
+        DeliverUnitFactory(payment_unit=payment_unit, app=opportunity.deliver_app, optional=True)
+    access_objects = OpportunityAccessFactory.create_batch(4, opportunity=opportunity, accepted=True)
+    rng = random.Random(0)
+    statuses = [VisitValidationStatus.approved, VisitValidationStatus.pending, VisitValidationStatus.rejected]
+    for access in access_objects:
+        for payment_unit in payment_units:
+            for entity_id in ["e1", "e2", "e3"]:
+                completed_work = CompletedWorkFactory(
+                    opportunity_access=access,
+                    payment_unit=payment_unit,
+                    entity_id=entity_id,
+                    status=rng.choice([CompletedWorkStatus.pending, CompletedWorkStatus.approved]),
+                )
+                for deliver_unit in payment_unit.deliver_units.all():
+                    for _ in range(rng.randint(0, 2)):
+                        status = rng.choices(statuses, weights=[6, 3, 1])[0]
+                        UserVisitFactory(
+                            opportunity=opportunity,
+                            opportunity_access=access,
+                            user=access.user,
+                            deliver_unit=deliver_unit,
+                            completed_work=completed_work,
+                            entity_id=entity_id,
+                            status=status,
+                            reason=rng.choice(["", None, "duplicate", "out of area"]),
+                        )
+
+    def get_results():
+        work = CompletedWork.objects.filter(opportunity_access__opportunity=opportunity)
+        access = OpportunityAccess.objects.filter(opportunity=opportunity)
+        return (
+            {completed_work.id: (completed_work.status, completed_work.reason) for completed_work in work},
+            dict(access.values_list("id", "payment_accrued")),
+        )
+
+    with transaction.atomic():
+        for access in access_objects:
+            completed_works = access.completedwork_set.exclude(
+                status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
+            ).select_related("payment_unit")
+            _legacy_update_status(completed_works, access, True)
+        expected = get_results()
+        transaction.set_rollback(True)
+
+    update_payment_accrued(opportunity, {access.user.id for access in access_objects})
+    assert get_results() == expected
+    assert any(payment_accrued for payment_accrued in expected[1].values())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "review_status,expected_status",
+    [
+        (VisitReviewStatus.pending, CompletedWorkStatus.pending),
+        (VisitReviewStatus.agree, CompletedWorkStatus.approved),
+    ],
+)
+def test_update_payment_accrued_managed_opportunity(
+    opportunity: Opportunity, mobile_user: User, review_status, expected_status
+):
+    opportunity.auto_approve_payments = True
+    opportunity.managed = True
+    opportunity.save()
+    payment_unit = PaymentUnitFactory(opportunity=opportunity)
+    deliver_unit = DeliverUnitFactory(payment_unit=payment_unit, app=opportunity.deliver_app)
+    access = OpportunityAccess.objects.get(user=mobile_user, opportunity=opportunity)
+    completed_work = CompletedWorkFactory(opportunity_access=access, payment_unit=payment_unit)
+    UserVisitFactory(
+        opportunity=opportunity,
+        opportunity_access=access,
+        user=mobile_user,
+        deliver_unit=deliver_unit,
+        completed_work=completed_work,
+        status=VisitValidationStatus.approved,
+        review_status=review_status,
+    )
+    update_payment_accrued(opportunity, {mobile_user.id})
+    completed_work.refresh_from_db()
+    access.refresh_from_db()
+    assert completed_work.status == expected_status
+    assert access.payment_accrued == (payment_unit.amount if expected_status == CompletedWorkStatus.approved else 0)
+
+
 @pytest.mark.parametrize(
     "headers,rows,expected",
     [
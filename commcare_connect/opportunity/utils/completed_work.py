@@ -1,37 +1,239 @@
-from commcare_connect.opportunity.models import CompletedWorkStatus
+import datetime
+from collections import Counter, defaultdict
+from typing import NamedTuple
 
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils.timezone import now
 
-def update_status(completed_works, opportunity_access, compute_payment=True):
+from commcare_connect.opportunity.models import (
+    CompletedWork,
+    CompletedWorkStatus,
+    DeliverUnit,
+    OpportunityAccess,
+    PaymentAccrual,
+    PaymentUnit,
+    UserVisit,
+    VisitReviewStatus,
+    VisitValidationStatus,
+    accrue_payments,
+    clear_opportunity_budget_snapshot,
+    count_completed,
+)
+from commcare_connect.utils.itertools import batched
+
+# changes committed shortly after an auto-approval run started can have earlier timestamps
+AUTO_APPROVAL_WATERMARK_OVERLAP = datetime.timedelta(minutes=10)
+
+
+def update_status(completed_works, opportunity_access):
+    """
+    Updates the status of completed works. The payment_accrued of the access is kept up to date by
+    ``accrue_payments`` as statuses change.
+    """
+    _update_status(completed_works, opportunity_access.opportunity)
+
+
+def update_opportunity_status(opportunity, access_objects):
+    """
+    Updates the status of the completed works of all the given accesses to an opportunity, excluding
+    rejected and over limit work.
+    """
+    completed_works = CompletedWork.objects.filter(opportunity_access__in=access_objects).exclude(
+        status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
+    )
+    _update_status(completed_works, opportunity)
+
+
+def reconcile_payment_accruals(access_ids) -> int:
+    """
+    Adds ledger entries for any completed work of the accesses whose payable amount differs from its
+    ledger total, and resets the payment_accrued of the accesses to their ledger totals. Returns the
+    number of entries added.
     """
-    Updates the status of completed works and optionally calculates & update total payment_accrued.
+    with transaction.atomic():
+        access_objects = list(OpportunityAccess.objects.select_for_update().filter(id__in=access_ids))
+        entries = accrue_payments(CompletedWork.objects.filter(opportunity_access__in=access_objects))
+        totals = dict(
+            PaymentAccrual.objects.filter(opportunity_access__in=access_objects)
+            .values("opportunity_access")
+            .annotate(total=Sum("amount"))
+            .values_list("opportunity_access", "total")
+        )
+        for access in access_objects:
+            access.payment_accrued = totals.get(access.id, 0)
+        OpportunityAccess.objects.bulk_update(access_objects, ["payment_accrued"])
+    return len(entries)
+
+
+def get_auto_approval_accesses(opportunity, incremental=False):
     """
-    payment_accrued = 0
+    Returns the accesses to an opportunity that auto-approval should process. In incremental mode, once
+    the opportunity has a watermark, only accesses with completed work or visits whose status changed
+    since the watermark are returned.
+    """
+    access_objects = OpportunityAccess.objects.filter(opportunity=opportunity, suspended=False)
+    if not incremental or opportunity.auto_approval_watermark is None:
+        return access_objects
+    since = opportunity.auto_approval_watermark - AUTO_APPROVAL_WATERMARK_OVERLAP
+    changed_works = CompletedWork.objects.filter(
+        Q(last_modified__gte=since) | Q(status_modified_date__gte=since), opportunity_access__opportunity=opportunity
+    )
+    changed_visits = UserVisit.objects.filter(
+        Q(status_modified_date__gte=since) | Q(review_created_on__gte=since), opportunity=opportunity
+    )
+    return access_objects.filter(
+        Q(id__in=changed_works.values("opportunity_access_id"))
+        | Q(id__in=changed_visits.values("opportunity_access_id"))
+    )
+
+
+def _update_status(completed_works, opportunity):
+    """Update the status of completed works from the statuses of their visits, if the opportunity
+    auto approves payments."""
+    if opportunity.auto_approve_payments:
+        _auto_approve(list(completed_works.filter(completed_count__gt=0).select_related("payment_unit")), opportunity)
+
+
+def _auto_approve(completed_works, opportunity):
+    """Reject completed works with any rejected visit and approve those with only approved visits.
+    Work for managed opportunities stays pending until all its visits have been reviewed as agreed."""
+    visit_counts = {
+        row["completed_work_id"]: row
+        for row in UserVisit.objects.filter(completed_work__in=completed_works)
+        .values("completed_work_id")
+        .annotate(
+            total=Count("id"),
+            rejected=Count("id", filter=Q(status=VisitValidationStatus.rejected)),
+            approved=Count("id", filter=Q(status=VisitValidationStatus.approved)),
+            agreed=Count("id", filter=Q(review_status=VisitReviewStatus.agree)),
+        )
+    }
+    rejected_work_ids = [work_id for work_id, counts in visit_counts.items() if counts["rejected"]]
+    reasons = defaultdict(list)
+    for work_id, reason in (
+        UserVisit.objects.filter(completed_work__in=rejected_work_ids)
+        .exclude(reason__isnull=True)
+        .exclude(reason="")
+        .order_by("id")
+        .values_list("completed_work_id", "reason")
+    ):
+        reasons[work_id].append(reason)
+
+    to_update = []
     for completed_work in completed_works:
-        if completed_work.completed_count < 1:
-            continue
-
-        if opportunity_access.opportunity.auto_approve_payments:
-            visits = completed_work.uservisit_set.values_list("status", "reason")
-            if any(status == "rejected" for status, _ in visits):
-                completed_work.status = CompletedWorkStatus.rejected
-                completed_work.reason = "\n".join(reason for _, reason in visits if reason)
-            elif all(status == "approved" for status, _ in visits):
-                completed_work.status = CompletedWorkStatus.approved
-
-            if (
-                opportunity_access.opportunity.managed
-                and not all(review_status == "agree" for *_, review_status in visits)
-                and completed_work.status == CompletedWorkStatus.approved
-            ):
-                completed_work.update_status(CompletedWorkStatus.pending)
-
-            completed_work.save()
-
-        if compute_payment:
-            approved_count = completed_work.approved_count
-            if approved_count > 0 and completed_work.status == CompletedWorkStatus.approved:
-                payment_accrued += approved_count * completed_work.payment_unit.amount
-
-    if compute_payment:
-        opportunity_access.payment_accrued = payment_accrued
-        opportunity_access.save()
+        counts = visit_counts.get(completed_work.id, {"total": 0, "rejected": 0, "approved": 0, "agreed": 0})
+        status, reason = completed_work.status, completed_work.reason
+        if counts["rejected"]:
+            completed_work.status = CompletedWorkStatus.rejected
+            completed_work.reason = "\n".join(reasons[completed_work.id])
+        elif counts["approved"] == counts["total"]:
+            completed_work.status = CompletedWorkStatus.approved
+
+        if (
+            opportunity.managed
+            and counts["agreed"] != counts["total"]
+            and completed_work.status == CompletedWorkStatus.approved
+        ):
+            completed_work.status = CompletedWorkStatus.pending
+
+        if (completed_work.status, completed_work.reason) != (status, reason):
+            completed_work.last_modified = now()
+            to_update.append(completed_work)
+    with transaction.atomic():
+        CompletedWork.objects.bulk_update(to_update, ["status", "reason", "status_modified_date", "last_modified"])
+        accrue_payments(to_update)
+    if to_update:
+        clear_opportunity_budget_snapshot(opportunity.id)
+
+
+class CompletedWorkCounts(NamedTuple):
+    completed: int
+    approved: int
+
+
+def calculate_completed_work_counts(completed_works) -> dict[int, CompletedWorkCounts]:
+    """Calculate the completed and approved counts of each of a queryset of completed works from their
+    visits, in a constant number of queries.
+
+    This applies the same rules as ``CompletedWork.calculate_completed`` but does not rely on the stored
+    counts of the completed works for child payment units, which are calculated from their visits as well.
+    """
+    work_ids = set(completed_works.values_list("id", flat=True))
+    if not work_ids:
+        return {}
+    related_works = CompletedWork.objects.filter(opportunity_access__in=completed_works.values("opportunity_access"))
+    works = {
+        work_id: (access_id, entity_id, payment_unit_id)
+        for work_id, access_id, entity_id, payment_unit_id in related_works.values_list(
+            "id", "opportunity_access_id", "entity_id", "payment_unit_id"
+        )
+    }
+    works_by_payment_unit = defaultdict(list)
+    for work_id, (access_id, entity_id, payment_unit_id) in works.items():
+        works_by_payment_unit[access_id, entity_id, payment_unit_id].append(work_id)
+
+    visit_counts = defaultdict(Counter)
+    approved_visit_counts = defaultdict(Counter)
+    for row in (
+        UserVisit.objects.filter(completed_work__in=related_works)
+        .values("completed_work_id", "deliver_unit_id")
+        .annotate(total=Count("id"), approved=Count("id", filter=Q(status=VisitValidationStatus.approved)))
+    ):
+        visit_counts[row["completed_work_id"]][row["deliver_unit_id"]] = row["total"]
+        approved_visit_counts[row["completed_work_id"]][row["deliver_unit_id"]] = row["approved"]
+
+    payment_units = PaymentUnit.objects.filter(opportunity__in=related_works.values("payment_unit__opportunity"))
+    child_payment_units = defaultdict(list)
+    for payment_unit_id, parent_payment_unit_id in payment_units.values_list("id", "parent_payment_unit_id"):
+        if parent_payment_unit_id:
+            child_payment_units[parent_payment_unit_id].append(payment_unit_id)
+    required_deliver_units = defaultdict(list)
+    optional_deliver_units = defaultdict(list)
+    for payment_unit_id, deliver_unit_id, optional in DeliverUnit.objects.filter(
+        payment_unit__in=payment_units
+    ).values_list("payment_unit_id", "id", "optional"):
+        deliver_units = optional_deliver_units if optional else required_deliver_units
+        deliver_units[payment_unit_id].append(deliver_unit_id)
+
+    counts = {}
+
+    def get_counts(work_id, path=()):
+        if work_id not in counts:
+            access_id, entity_id, payment_unit_id = works[work_id]
+            # like ``get_payment_unit_ancestors``, skip payment units already on the path so that a
+            # cycle of parent payment units cannot recurse indefinitely
+            path = (*path, payment_unit_id)
+            children = [child_id for child_id in child_payment_units[payment_unit_id] if child_id not in path]
+            child_completed = child_approved = None
+            if children:
+                child_counts = [
+                    get_counts(child_work_id, path)
+                    for child_payment_unit_id in children
+                    for child_work_id in works_by_payment_unit[access_id, entity_id, child_payment_unit_id]
+                ]
+                child_completed = sum(child.completed for child in child_counts)
+                child_approved = sum(child.approved for child in child_counts)
+            required = required_deliver_units[payment_unit_id]
+            optional = optional_deliver_units[payment_unit_id]
+            counts[work_id] = CompletedWorkCounts(
+                count_completed(visit_counts[work_id], required, optional, child_completed),
+                count_completed(approved_visit_counts[work_id], required, optional, child_approved),
+            )
+        return counts[work_id]
+
+    return {work_id: get_counts(work_id) for work_id in work_ids}
+
+
+def recalculate_completed_work_counts(completed_works, batch_size=1000):
+    """Recalculate the stored counts of completed works in batches."""
+    work_ids = completed_works.order_by("id").values_list("id", flat=True)
+    for batch in batched(work_ids.iterator(chunk_size=batch_size), batch_size):
+        batch_works = CompletedWork.objects.filter(id__in=batch)
+        counts = calculate_completed_work_counts(batch_works)
+        batch_works = list(batch_works.select_related("payment_unit"))
+        for completed_work in batch_works:
+            completed_work.completed_count, completed_work.approved_count = counts[completed_work.id]
+        with transaction.atomic():
+            CompletedWork.objects.bulk_update(batch_works, ["completed_count", "approved_count"])
+            accrue_payments(batch_works)
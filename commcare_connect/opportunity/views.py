@@ -8,6 +8,7 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.files.storage import storages
+from django.db import transaction
 from django.db.models import F, Q, Sum
 from django.forms import modelformset_factory
 from django.http import FileResponse, Http404, HttpResponse
@@ -22,7 +23,6 @@ from django.views.decorators.http import require_GET, require_http_methods, requ
 from django.views.generic import CreateView, DetailView, ListView, UpdateView
 from django_tables2 import SingleTableView
 from django_tables2.export import TableExport
-from geopy import distance
 
 from commcare_connect.form_receiver.serializers import XFormSerializer
 from commcare_connect.opportunity.api.serializers import remove_opportunity_access_cache
@@ -66,6 +66,9 @@ from commcare_connect.opportunity.models import (
     PaymentUnit,
     UserVisit,
     VisitValidationStatus,
+    clear_opportunity_budget_snapshot,
+    filter_nearby_visits,
+    update_payment_unit_claimed_visits,
 )
 from commcare_connect.opportunity.tables import (
     CompletedWorkTable,
@@ -92,7 +95,9 @@ from commcare_connect.opportunity.tasks import (
     generate_work_status_export,
     send_push_notification_task,
     send_sms_task,
+    update_completed_work_counts_task,
 )
+from commcare_connect.opportunity.utils.completed_work import update_status
 from commcare_connect.opportunity.visit_import import (
     ImportException,
     bulk_update_catchments,
@@ -106,6 +111,7 @@ from commcare_connect.program.models import ManagedOpportunity, ProgramApplicati
 from commcare_connect.program.tables import ProgramInvitationTable
 from commcare_connect.users.models import User
 from commcare_connect.utils.commcarehq_api import get_applications_for_user_by_domain, get_domains_for_user
+from commcare_connect.utils.geo import haversine_distances
 
 
 class OrganizationUserMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -148,7 +154,12 @@ class OpportunityList(OrganizationUserMixin, ListView):
         if ordering not in ["name", "-name", "start_date", "-start_date", "end_date", "-end_date"]:
             ordering = "name"
 
-        return Opportunity.objects.filter(organization=self.request.org).order_by(ordering)
+        return (
+            Opportunity.objects.filter(organization=self.request.org)
+            .select_related("managedopportunity__program")
+            .prefetch_related("paymentunit_set")
+            .order_by(ordering)
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -447,9 +458,10 @@ def add_budget_existing_users(request, org_slug=None, pk=None):
             if form.cleaned_data["end_date"]:
                 OpportunityClaim.objects.filter(pk__in=selected_users).update(end_date=form.cleaned_data["end_date"])
             if additional_visits:
-                OpportunityClaimLimit.objects.filter(opportunity_claim__in=selected_users).update(
-                    max_visits=F("max_visits") + additional_visits
-                )
+                claim_limits = OpportunityClaimLimit.objects.filter(opportunity_claim__in=selected_users)
+                claim_limits.update(max_visits=F("max_visits") + additional_visits)
+                update_payment_unit_claimed_visits(claim_limits.values("payment_unit_id"))
+                clear_opportunity_budget_snapshot(opportunity.id)
 
             for ocl in OpportunityClaimLimit.objects.filter(opportunity_claim__in=selected_users).all():
                 opportunity.total_budget += ocl.payment_unit.amount * additional_visits
@@ -606,6 +618,8 @@ def edit_payment_unit(request, org_slug=None, opp_id=None, pk=None):
         PaymentUnit.objects.filter(id__in=removed_payment_units, parent_payment_unit=form.instance.id).update(
             parent_payment_unit=None
         )
+        # the deliver units and child payment units of a payment unit determine its completed work counts
+        transaction.on_commit(lambda: update_completed_work_counts_task.delay(opportunity.id))
         messages.success(request, f"Payment unit {form.instance.name} updated. Please reset the budget")
         return redirect("opportunity:finalize", org_slug=request.org.slug, pk=opportunity.id)
     return render(
@@ -698,20 +712,19 @@ def payment_delete(request, org_slug=None, opp_id=None, access_id=None, pk=None)
 @org_viewer_required
 def user_profile(request, org_slug=None, opp_id=None, pk=None):
     access = get_object_or_404(OpportunityAccess, pk=pk, accepted=True)
-    user_visits = UserVisit.objects.filter(opportunity_access=access)
+    user_visits = UserVisit.objects.filter(opportunity_access=access, latitude__isnull=False).values(
+        "entity_name", "visit_date", "latitude", "longitude", "accuracy"
+    )
     user_catchments = CatchmentArea.objects.filter(opportunity_access=access)
     user_visit_data = []
     for user_visit in user_visits:
-        if not user_visit.location:
-            continue
-        lat, lng, elevation, precision = list(map(float, user_visit.location.split(" ")))
         user_visit_data.append(
             dict(
-                entity_name=user_visit.entity_name,
-                visit_date=user_visit.visit_date.date(),
-                lat=lat,
-                lng=lng,
-                precision=precision,
+                entity_name=user_visit["entity_name"],
+                visit_date=user_visit["visit_date"].date(),
+                lat=user_visit["latitude"],
+                lng=user_visit["longitude"],
+                precision=user_visit["accuracy"],
             )
         )
     # user for centering the User visits map
@@ -826,18 +839,24 @@ def visit_verification(request, org_slug=None, pk=None):
     lon = None
     precision = None
     if user_visit.location:
-        locations = UserVisit.objects.filter(opportunity=user_visit.opportunity).exclude(pk=pk).select_related("user")
         lat, lon, _, precision = user_visit.location.split(" ")
-        for loc in locations:
-            if loc.location is None:
-                continue
-            other_lat, other_lon, _, other_precision = loc.location.split(" ")
-            dist = distance.distance((lat, lon), (other_lat, other_lon))
-            if dist.m <= 250:
+        locations = (
+            filter_nearby_visits(
+                UserVisit.objects.filter(opportunity=user_visit.opportunity), float(lat), float(lon), 250
+            )
+            .exclude(pk=pk)
+            .select_related("user")
+        )
+        distances = haversine_distances(
+            float(lat), float(lon), [loc.latitude for loc in locations], [loc.longitude for loc in locations]
+        )
+        for loc, dist in zip(locations, distances):
+            other_lat, other_lon, other_precision = str(loc.latitude), str(loc.longitude), str(loc.accuracy)
+            if dist <= 250:
                 if user_visit.user_id == loc.user_id:
-                    user_forms.append((loc, dist.m, other_lat, other_lon, other_precision))
+                    user_forms.append((loc, dist, other_lat, other_lon, other_precision))
                 else:
-                    other_forms.append((loc, dist.m, other_lat, other_lon, other_precision))
+                    other_forms.append((loc, dist, other_lat, other_lon, other_precision))
         user_forms.sort(key=lambda x: x[1])
         other_forms.sort(key=lambda x: x[1])
     reason = user_visit.reason
@@ -870,7 +889,7 @@ def approve_visit(request, org_slug=None, pk=None):
     user_visit.save()
     opp_id = user_visit.opportunity_id
     access = OpportunityAccess.objects.get(user_id=user_visit.user_id, opportunity_id=opp_id)
-    update_payment_accrued(opportunity=access.opportunity, users=[access.user])
+    _update_visit_completed_work_status(user_visit, access)
     if user_visit.opportunity.managed:
         return redirect("opportunity:user_visit_review", org_slug, opp_id)
     return redirect("opportunity:user_visits_list", org_slug=org_slug, opp_id=user_visit.opportunity.id, pk=access.id)
@@ -885,14 +904,23 @@ def reject_visit(request, org_slug=None, pk=None):
     user_visit.reason = reason
     user_visit.save()
     access = OpportunityAccess.objects.get(user_id=user_visit.user_id, opportunity_id=user_visit.opportunity_id)
-    update_payment_accrued(opportunity=access.opportunity, users=[access.user])
+    _update_visit_completed_work_status(user_visit, access)
     return redirect("opportunity:user_visits_list", org_slug=org_slug, opp_id=user_visit.opportunity_id, pk=access.id)
 
 
+def _update_visit_completed_work_status(user_visit, access):
+    """Update the status of the completed work of a reviewed visit. Payment accrued is updated along with
+    the status, so the rest of the user's work does not need to be revisited."""
+    completed_works = access.completedwork_set.filter(id=user_visit.completed_work_id).exclude(
+        status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
+    )
+    update_status(completed_works, access)
+
+
 @org_member_required
 def fetch_attachment(self, org_slug, blob_id):
-    blob_meta = BlobMeta.objects.get(blob_id=blob_id)
-    attachment = storages["default"].open(blob_id)
+    blob_meta = BlobMeta.objects.select_related("content").get(blob_id=blob_id)
+    attachment = storages["default"].open(blob_meta.storage_name)
     return FileResponse(attachment, filename=blob_meta.name, content_type=blob_meta.content_type)
 
 
@@ -981,8 +1009,10 @@ class OpportunityCompletedWorkTable(OrganizationUserMixin, SingleTableView):
         org_slug = self.kwargs["org_slug"]
         opportunity = get_opportunity_or_404(org_slug=org_slug, pk=opportunity_id)
         access_objects = OpportunityAccess.objects.filter(opportunity=opportunity)
-        return list(
-            filter(lambda cw: cw.completed, CompletedWork.objects.filter(opportunity_access__in=access_objects))
+        return (
+            CompletedWork.objects.filter(opportunity_access__in=access_objects, completed_count__gt=0)
+            .select_related("opportunity_access__user", "payment_unit")
+            .order_by("id")
         )
 
 
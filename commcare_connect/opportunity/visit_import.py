@@ -17,9 +17,13 @@ from commcare_connect.opportunity.models import (
     Payment,
     UserVisit,
     VisitValidationStatus,
+    accrue_payments,
+    clear_opportunity_budget_snapshot,
+    update_completed_work_counts,
+    update_visit_counts,
 )
 from commcare_connect.opportunity.tasks import send_payment_notification
-from commcare_connect.opportunity.utils.completed_work import update_status
+from commcare_connect.opportunity.utils.completed_work import update_opportunity_status
 from commcare_connect.utils.file import get_file_extension
 from commcare_connect.utils.itertools import batched
 
@@ -132,6 +136,8 @@ def _bulk_update_visit_status(opportunity: Opportunity, dataset: Dataset):
     with transaction.atomic():
         for visit_batch in batched(visit_ids, 100):
             to_update = []
+            visit_count_changes = []
+            completed_work_ids = set()
             visits = UserVisit.objects.filter(xform_id__in=visit_batch, opportunity=opportunity)
             for visit in visits:
                 seen_visits.add(visit.xform_id)
@@ -139,7 +145,11 @@ def _bulk_update_visit_status(opportunity: Opportunity, dataset: Dataset):
                 status, reason, justification = visit_data
                 changed = False
                 if visit.status != status:
+                    previous_visit_count_key = visit.visit_count_key
                     visit.status = status
+                    visit_count_changes.append((previous_visit_count_key, visit.visit_count_key))
+                    if visit.completed_work_id:
+                        completed_work_ids.add(visit.completed_work_id)
                     if opportunity.managed and status == VisitValidationStatus.approved:
                         visit.review_created_on = now()
                     changed = True
@@ -155,6 +165,10 @@ def _bulk_update_visit_status(opportunity: Opportunity, dataset: Dataset):
             UserVisit.objects.bulk_update(
                 to_update, fields=["status", "reason", "review_created_on", "justification", "status_modified_date"]
             )
+            update_visit_counts(visit_count_changes)
+            update_completed_work_counts(
+                CompletedWork.objects.filter(id__in=completed_work_ids).select_related("payment_unit")
+            )
             missing_visits |= set(visit_batch) - seen_visits
     update_payment_accrued(opportunity, users=user_ids)
     return VisitImportStatus(seen_visits, missing_visits)
@@ -163,11 +177,7 @@ def _bulk_update_visit_status(opportunity: Opportunity, dataset: Dataset):
 def update_payment_accrued(opportunity: Opportunity, users):
     """Updates payment accrued for completed and approved CompletedWork instances."""
     access_objects = OpportunityAccess.objects.filter(user__in=users, opportunity=opportunity, suspended=False)
-    for access in access_objects:
-        completed_works = access.completedwork_set.exclude(
-            status__in=[CompletedWorkStatus.rejected, CompletedWorkStatus.over_limit]
-        ).select_related("payment_unit")
-        update_status(completed_works, access, True)
+    update_opportunity_status(opportunity, access_objects)
 
 
 def get_data_by_visit_id(dataset) -> dict[int, VisitData]:
@@ -287,7 +297,7 @@ def _bulk_update_completed_work_status(opportunity: Opportunity, dataset: Datase
             to_update = []
             completed_works = CompletedWork.objects.filter(
                 id__in=work_batch, opportunity_access__opportunity=opportunity
-            )
+            ).select_related("opportunity_access", "payment_unit")
             for completed_work in completed_works:
                 seen_completed_works.add(str(completed_work.id))
                 status = status_by_work_id[str(completed_work.id)]
@@ -305,6 +315,8 @@ def _bulk_update_completed_work_status(opportunity: Opportunity, dataset: Datase
                     to_update.append(completed_work)
                 user_ids.add(completed_work.opportunity_access.user_id)
             CompletedWork.objects.bulk_update(to_update, fields=["status", "reason", "status_modified_date"])
+            accrue_payments(to_update)
+            clear_opportunity_budget_snapshot(opportunity.id)
             missing_completed_works |= set(work_batch) - seen_completed_works
         update_payment_accrued(opportunity, users=user_ids)
     return CompletedWorkImportStatus(seen_completed_works, missing_completed_works)
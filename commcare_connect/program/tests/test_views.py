@@ -9,7 +9,11 @@ from django.urls import reverse
 from commcare_connect.opportunity.tests.factories import DeliveryTypeFactory
 from commcare_connect.organization.models import Organization
 from commcare_connect.program.models import Program, ProgramApplication, ProgramApplicationStatus
-from commcare_connect.program.tests.factories import ProgramApplicationFactory, ProgramFactory
+from commcare_connect.program.tests.factories import (
+    ManagedOpportunityFactory,
+    ProgramApplicationFactory,
+    ProgramFactory,
+)
 from commcare_connect.users.models import User
 from commcare_connect.users.tests.factories import OrganizationFactory
 
@@ -163,6 +167,29 @@ class TestInviteOrganizationView(BaseProgramTest):
         assert response.status_code == HTTPStatus.NOT_FOUND
 
 
+@pytest.mark.django_db
+class TestManagedOpportunityListView(BaseProgramTest):
+    @pytest.fixture(autouse=True)
+    def test_setup(self):
+        self.program = ProgramFactory.create(organization=self.organization)
+        self.opportunities = ManagedOpportunityFactory.create_batch(3, program=self.program)
+        ManagedOpportunityFactory.create()
+        self.list_url = reverse(
+            "program:opportunity_list",
+            kwargs={
+                "org_slug": self.organization.slug,
+                "pk": self.program.pk,
+            },
+        )
+
+    def test_list_opportunities(self):
+        response = self.client.get(self.list_url)
+        assert response.status_code == HTTPStatus.OK
+        opportunities = response.context["page_obj"].object_list
+        assert {opportunity.id for opportunity in opportunities} == {opp.id for opp in self.opportunities}
+        assert self.program.name in response.content.decode()
+
+
 @pytest.mark.django_db
 class TestManagedOpportunityApplicationListView(BaseProgramTest):
     @pytest.fixture(autouse=True)
@@ -90,7 +90,12 @@ class ManagedOpportunityList(ProgramManagerMixin, ListView):
         ordering = self.request.GET.get("sort", self.default_ordering)
         ordering = ALLOWED_ORDERINGS.get(ordering, self.default_ordering)
         program_id = self.kwargs.get("pk")
-        return ManagedOpportunity.objects.filter(program_id=program_id).order_by(ordering)
+        return (
+            ManagedOpportunity.objects.filter(program_id=program_id)
+            .select_related("program")
+            .prefetch_related("paymentunit_set")
+            .order_by(ordering)
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
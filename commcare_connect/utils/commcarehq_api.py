@@ -1,4 +1,5 @@
 import datetime
+from functools import cache
 
 import httpx
 from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
@@ -7,6 +8,15 @@ from django.conf import settings
 from django.utils import timezone
 
 
+@cache
+def get_commcarehq_client() -> httpx.Client:
+    """A client shared by the process, to reuse connections to CommCare HQ."""
+    return httpx.Client(
+        timeout=httpx.Timeout(30, connect=10),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
 class CommCareHQAPIException(Exception):
     pass
 
@@ -0,0 +1,108 @@
+import math
+from collections.abc import Sequence
+from typing import NamedTuple
+
+import numpy as np
+
+# Size of a grid cell in degrees. 0.001 degrees is roughly 110m of latitude.
+GRID_CELL_SIZE = 0.001
+# Shortest length of a degree of latitude (at the equator). Using the lower bound keeps the
+# neighboring cell search conservative.
+METERS_PER_DEGREE = 110_574
+# Mean radius of the earth in meters
+EARTH_RADIUS = 6_371_008.8
+# Above this many cells a grid lookup is no better than a scan
+MAX_NEIGHBORING_CELLS = 400
+
+
+class Location(NamedTuple):
+    latitude: float
+    longitude: float
+    altitude: float | None = None
+    accuracy: float | None = None
+
+
+def parse_location(location: str | None) -> Location | None:
+    """Parse a CommCare location string ("lat lon altitude accuracy")."""
+    if not location:
+        return None
+    try:
+        return Location(*map(float, location.split(" ")[:4]))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_grid_cell(location: str | None) -> str | None:
+    """Return the key of the grid cell that contains a CommCare location string."""
+    coords = parse_location(location)
+    if coords is None:
+        return None
+    return _cell_key(*_cell_index(coords.latitude, coords.longitude))
+
+
+def get_bounding_box(lat: float, lon: float, radius: float) -> tuple[float, float, float, float]:
+    """Return ``(min_lat, max_lat, min_lon, max_lon)`` of a box containing all points within
+    ``radius`` meters of the given point."""
+    lat_delta = radius / METERS_PER_DEGREE
+    min_lat, max_lat = max(lat - lat_delta, -90), min(lat + lat_delta, 90)
+    max_abs_lat = max(abs(min_lat), abs(max_lat))
+    if max_abs_lat >= 90:
+        return min_lat, max_lat, -180, 180
+    lon_delta = radius / (METERS_PER_DEGREE * math.cos(math.radians(max_abs_lat)))
+    if abs(lon) + lon_delta >= 180:
+        return min_lat, max_lat, -180, 180
+    return min_lat, max_lat, lon - lon_delta, lon + lon_delta
+
+
+def get_neighboring_cells(lat: float, lon: float, radius: float) -> list[str] | None:
+    """Return the keys of all grid cells that may contain a point within ``radius`` meters
+    of the given point.
+
+    Returns ``None`` when the search area covers too many cells (or crosses a pole or the
+    antimeridian), in which case callers should fall back to checking all points."""
+    lat_steps = math.ceil(radius / (GRID_CELL_SIZE * METERS_PER_DEGREE))
+    # degrees of longitude are shortest at the latitude furthest from the equator
+    max_lat = abs(lat) + (lat_steps + 1) * GRID_CELL_SIZE
+    if max_lat >= 90:
+        return None
+    lon_steps = math.ceil(radius / (GRID_CELL_SIZE * METERS_PER_DEGREE * math.cos(math.radians(max_lat))))
+    if abs(lon) + (lon_steps + 1) * GRID_CELL_SIZE >= 180:
+        return None
+    if (2 * lat_steps + 1) * (2 * lon_steps + 1) > MAX_NEIGHBORING_CELLS:
+        return None
+
+    lat_index, lon_index = _cell_index(lat, lon)
+    return [
+        _cell_key(lat_index + i, lon_index + j)
+        for i in range(-lat_steps, lat_steps + 1)
+        for j in range(-lon_steps, lon_steps + 1)
+    ]
+
+
+def haversine_distances(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """Return the great-circle distances in meters from one point to each of the given points."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lon2 = np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def points_within_radius(
+    lat: float, lon: float, lats: Sequence[float], lons: Sequence[float], radius: float | Sequence[float]
+) -> np.ndarray:
+    """Return the indexes of the points that are within ``radius`` meters of the given point.
+
+    ``radius`` may also be a sequence with a separate radius for each point."""
+    if not len(lats):
+        return np.array([], dtype=int)
+    distances = haversine_distances(lat, lon, lats, lons)
+    return np.flatnonzero(distances <= np.asarray(radius, dtype=float))
+
+
+def _cell_index(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / GRID_CELL_SIZE), math.floor(lon / GRID_CELL_SIZE)
+
+
+def _cell_key(lat_index: int, lon_index: int) -> str:
+    return f"{lat_index}:{lon_index}"
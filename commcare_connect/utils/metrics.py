@@ -0,0 +1,76 @@
+import logging
+import socket
+from abc import ABC, abstractmethod
+from functools import cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsBackend(ABC):
+    """Base class for metrics backends. Select the backend with the ``METRICS_BACKEND`` setting."""
+
+    @abstractmethod
+    def histogram(self, name: str, value: float, tags: dict = None):
+        pass
+
+
+class NullMetricsBackend(MetricsBackend):
+    def histogram(self, name, value, tags=None):
+        pass
+
+
+class LoggingMetricsBackend(MetricsBackend):
+    """Write metrics to the log at DEBUG level."""
+
+    def histogram(self, name, value, tags=None):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s:%s %s", name, value, _format_tags(tags))
+
+
+class StatsdMetricsBackend(MetricsBackend):
+    """Send metrics over UDP in the statsd format, with tags in the DogStatsD format
+    (``name:value|h|#tag:value``)."""
+
+    def __init__(self):
+        self.address = (settings.STATSD_HOST, settings.STATSD_PORT)
+        self.prefix = settings.STATSD_PREFIX
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def histogram(self, name, value, tags=None):
+        self.send(self.format(name, value, "h", tags))
+
+    def format(self, name, value, type_code, tags):
+        line = f"{self.prefix}.{name}:{value}|{type_code}" if self.prefix else f"{name}:{value}|{type_code}"
+        if tags:
+            line = f"{line}|#{_format_tags(tags)}"
+        return line
+
+    def send(self, line):
+        try:
+            self.socket.sendto(line.encode(), self.address)
+        except OSError:
+            logger.warning("Unable to send metric to statsd", exc_info=True)
+
+
+@cache
+def get_metrics_backend() -> MetricsBackend:
+    return import_string(settings.METRICS_BACKEND)()
+
+
+def histogram(name: str, value: float, tags: dict = None):
+    get_metrics_backend().histogram(name, value, tags)
+
+
+def _format_tags(tags):
+    return ",".join(f"{key}:{value}" for key, value in (tags or {}).items())
+
+
+@receiver(setting_changed)
+def _reset_metrics_backend(setting, **kwargs):
+    if setting == "METRICS_BACKEND":
+        get_metrics_backend.cache_clear()
@@ -0,0 +1,74 @@
+import pytest
+from geopy.distance import distance
+
+from commcare_connect.utils.geo import (
+    Location,
+    get_bounding_box,
+    get_grid_cell,
+    get_neighboring_cells,
+    haversine_distances,
+    parse_location,
+    points_within_radius,
+)
+
+
+@pytest.mark.parametrize(
+    "location, expected",
+    [
+        ("20.090209 40.09320 20 40", Location(20.090209, 40.0932, 20, 40)),
+        ("-1.5 36.8", Location(-1.5, 36.8)),
+        ("", None),
+        (None, None),
+        ("invalid", None),
+    ],
+)
+def test_parse_location(location, expected):
+    assert parse_location(location) == expected
+
+
+@pytest.mark.parametrize("lat, lon", [(0, 0), (20.090209, 40.0932), (-33.9, 18.4), (69.6, 18.9)])
+@pytest.mark.parametrize("radius", [10, 100, 250])
+def test_neighboring_cells_contain_points_within_radius(lat, lon, radius):
+    cells = set(get_neighboring_cells(lat, lon, radius))
+    for bearing in range(0, 360, 15):
+        point = distance(meters=radius).destination((lat, lon), bearing)
+        assert get_grid_cell(f"{point.latitude} {point.longitude}") in cells
+
+
+def test_neighboring_cells_large_radius():
+    assert get_neighboring_cells(20, 40, 10_000) is None
+
+
+def test_neighboring_cells_near_antimeridian():
+    assert get_neighboring_cells(0, 179.9999, 100) is None
+
+
+@pytest.mark.parametrize("lat, lon", [(0, 0), (20.090209, 40.0932), (-33.9, 18.4), (69.6, 18.9)])
+@pytest.mark.parametrize("radius", [10, 250, 5000])
+def test_bounding_box_contains_points_within_radius(lat, lon, radius):
+    min_lat, max_lat, min_lon, max_lon = get_bounding_box(lat, lon, radius)
+    for bearing in range(0, 360, 15):
+        point = distance(meters=radius).destination((lat, lon), bearing)
+        assert min_lat <= point.latitude <= max_lat
+        assert min_lon <= point.longitude <= max_lon
+
+
+def test_bounding_box_near_antimeridian():
+    assert get_bounding_box(0, 179.9999, 100)[2:] == (-180, 180)
+
+
+def test_haversine_distances():
+    points = [(20.0906, 40.0932), (-33.9, 18.4), (20.090209, 40.0932)]
+    lats, lons = zip(*points)
+    distances = haversine_distances(20.090209, 40.0932, lats, lons)
+    for (lat, lon), dist in zip(points, distances):
+        # haversine assumes a spherical earth so allow for a small difference from the geodesic distance
+        assert dist == pytest.approx(distance((20.090209, 40.0932), (lat, lon)).m, rel=0.005)
+
+
+def test_points_within_radius():
+    lats = [20.0906, 20.0919, 20.1, 20.090209]
+    lons = [40.0932, 40.0932, 40.1, 40.0941]
+    assert list(points_within_radius(20.090209, 40.0932, lats, lons, 100)) == [0, 3]
+    assert list(points_within_radius(20.090209, 40.0932, lats, lons, [10, 200, 10, 10])) == [1]
+    assert list(points_within_radius(20.090209, 40.0932, [], [], 100)) == []
@@ -2,7 +2,7 @@ from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter, SimpleRouter
 
-from commcare_connect.form_receiver.views import FormReceiver
+from commcare_connect.form_receiver.views import FormBatchReceiver, FormReceiver
 from commcare_connect.opportunity.api.views import (
     ClaimOpportunityView,
     ConfirmPaymentView,
@@ -26,6 +26,7 @@ app_name = "api"
 urlpatterns = [
     path("", include(router.urls)),
     path("receiver/", FormReceiver.as_view(), name="receiver"),
+    path("receiver/batch/", FormBatchReceiver.as_view(), name="receiver_batch"),
     path("opportunity/<int:pk>/learn_progress", UserLearnProgressView.as_view(), name="learn_progress"),
     path("opportunity/<int:pk>/claim", ClaimOpportunityView.as_view()),
     path("opportunity/<int:pk>/delivery_progress", DeliveryProgressView.as_view(), name="deliver_progress"),
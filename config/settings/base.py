@@ -340,3 +340,12 @@ TWILIO_ACCOUNT_SID = env("TWILIO_SID", default=None)
 TWILIO_AUTH_TOKEN = env("TWILIO_TOKEN", default=None)
 TWILIO_MESSAGING_SERVICE = env("TWILIO_MESSAGING_SERVICE", default=None)
 MAPBOX_TOKEN = env("MAPBOX_TOKEN", default=None)
+
+# Queue received forms for processing by celery and return 202 instead of processing them inline
+FORM_RECEIVER_ASYNC = env.bool("FORM_RECEIVER_ASYNC", default=False)
+
+# Metrics backend, one of commcare_connect.utils.metrics.{Null,Logging,Statsd}MetricsBackend
+METRICS_BACKEND = env("METRICS_BACKEND", default="commcare_connect.utils.metrics.LoggingMetricsBackend")
+STATSD_HOST = env("STATSD_HOST", default="localhost")
+STATSD_PORT = env.int("STATSD_PORT", default=8125)
+STATSD_PREFIX = env("STATSD_PREFIX", default="commcare_connect")